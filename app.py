@@ -3,11 +3,25 @@ import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
 from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 import plotly.graph_objects as go
-import base64
+import os
+import tempfile
+import flask
 import numpy as np
 import pandas as pd
-from sklearn.metrics import mean_squared_error
+
+from cube import RollupCube
+from data_store import data_version, freeze, load_tables
+from downsample import downsample, view_days, window
+from figure_cache import FigureCache, code_version
+from forecast import FEATURE_STORE_DIR
+from forecast_service import ForecastService, register as register_forecast_api
+from http_cache import CallbackHTTPCache, deterministic
+from item_index import ItemIndex
+from metrics import item_metrics, overall
+from prefix_index import PrefixIndex, item_search_index
+from static_layout import StaticLayout
 
 app = dash.Dash('dashboard_app',
                 title='Demand Forecasting',
@@ -15,18 +29,30 @@ app = dash.Dash('dashboard_app',
 
 # Read in global data
 
-infos  = pd.read_csv('data/infos.csv',  sep = '|')
-items  = pd.read_csv('data/items.csv',  sep = '|')
+# Tables are memory-mapped from data/store when it is up to date and loaded
+# once per process; under gunicorn that is the master, before fork (see data_store.py)
+
+tables = load_tables()
+infos  = tables['infos']
+items  = tables['items']
 #orders = pd.read_csv('data/orders.csv', sep = '|')
-orders_day = pd.read_csv('data/orders_day.csv')
-orders_month = pd.read_csv('data/orders_month.csv')
-agg_orders_day = pd.read_csv('data/agg_orders_day.csv')
-agg_orders_month = pd.read_csv('data/agg_orders_month.csv')
-result = pd.read_csv('data/result.csv')
+orders_day = tables['orders_day']
+orders_month = tables['orders_month']
+agg_orders_day = tables['agg_orders_day']
+agg_orders_month = tables['agg_orders_month']
+result = tables['result']
 
-items = pd.merge(infos, items, on = 'itemID', how = 'left')
+items = freeze(pd.merge(infos, items, on = 'itemID', how = 'left'))
 del infos
 
+# Per-item forecast metrics, precomputed by metrics.py
+
+if 'item_metrics' in tables:
+    metrics = tables['item_metrics']
+else:
+    metrics = freeze(item_metrics(result, items))
+metrics_totals = overall(metrics)
+
 # orders['time'] = pd.to_datetime(orders['time'].astype('str'))
 # orders['day_of_year'] = orders['time'].dt.dayofyear
 # orders['month'] = orders['time'].dt.strftime('%m-%Y')
@@ -35,7 +61,6 @@ del infos
 # agg_order_daily = orders.groupby(['day_of_year'])['order'].agg('sum').reset_index()
 # agg_order_monthly = orders.groupby(['month'])['order'].agg('sum').reset_index()
 
-mean_price_daily = agg_orders_day.groupby(['itemID'])['salesPrice'].agg('mean').reset_index()
 # mean_price_monthly = orders.groupby(['month'])['salesPrice'].agg('mean').reset_index()
 
 item_list = items["itemID"].unique()
@@ -44,6 +69,36 @@ item_list.sort()
 manuf_list = items['manufacturer'].unique()
 manuf_list.sort()
 
+# Item-keyed indexes used by the callbacks
+
+day_index = ItemIndex(agg_orders_day)
+month_index = ItemIndex(agg_orders_month)
+result_index = ItemIndex(result)
+item_index = ItemIndex(items)
+manuf_index = ItemIndex(items, key='manufacturer')
+metrics_index = ItemIndex(metrics)
+
+# Prefix indexes of the searchable dropdowns, which start with a page of
+# options and load matches as the user types (see prefix_index.py)
+
+item_search = item_search_index(items)
+manuf_search = PrefixIndex(manuf_list, manuf_list.tolist(), manuf_list.tolist())
+
+# Daily orders rolled up per manufacturer and category, with prefix sums over
+# days so that any window of any group is two lookups (see cube.py)
+
+rollup_items = items[['itemID', 'manufacturer']].assign(
+    category=(items['category1'].astype(str) + items['category2'].astype(str)
+              + items['category3'].astype(str)).astype(int))
+rollup_cube = RollupCube.from_long(agg_orders_day, rollup_items)
+rollup_days = rollup_cube.days
+
+# Figures built by the callbacks, shared by the workers on this host until the data or the figure code changes
+
+figure_cache = FigureCache(
+    '{}-{}'.format(data_version(), code_version(__name__, 'downsample', 'cube')),
+    directory=os.environ.get('FIGURE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'demand-forecasting-figures')))
+
 
 
 # Setup collapse button
@@ -105,90 +160,111 @@ color_b = "#F8F8FF"
 
 # daily
 
-fig_day = go.Figure()
+# The daily charts load the days in view and reduce long windows to a bounded
+# number of points; zooms and pans reload them (see downsample.py)
 
-fig_day.add_trace(go.Bar(
-            x=orders_day['day_of_year'],
-            y=orders_day['order'],
-            marker={"color": color_1},
-            name="Total Orders"
-        ))
+def daily_figure(day, first, last, title, price_name):
+    """
+    Orders and sales prices of the days in view of a daily chart.
+
+    :param day: Columns day_of_year, order and salesPrice
+    :param first: First day in view
+    :param last: Last day in view
+    :param title: Chart title
+    :param price_name: Legend name of the sales price line
+    :return: The figure, with the days in view and a margin on each side
+    """
+    days = np.asarray(day['day_of_year'])
+    order = np.argsort(days, kind='stable')
+    rows = order[window(days[order], first, last)]
+    x_order, y_order = downsample(days[rows], np.asarray(day['order'])[rows], method='min_max')
+    x_price, y_price = downsample(days[rows], np.asarray(day['salesPrice'])[rows], method='lttb')
+
+    fig = go.Figure()
+
+    fig.add_trace(go.Bar(
+                x=x_order,
+                y=y_order,
+                marker={"color": color_1},
+                name="Total Orders"
+            ))
 
-fig_day.add_trace(go.Scatter(
-                x=orders_day['day_of_year'],
-                y=orders_day['salesPrice'],
-                hoverinfo="y",
-                line={
-                    "color": "#e41f23",
-                    "dash": "dot",
-                    "width": 2,
+    fig.add_trace(go.Scatter(
+                    x=x_price,
+                    y=y_price,
+                    hoverinfo="y",
+                    line={
+                        "color": "#e41f23",
+                        "dash": "dot",
+                        "width": 2,
+                    },
+                    marker={
+                        "maxdisplayed": 0,
+                        "opacity": 0,
+                    },
+                    name=price_name,
+                ))
+
+    fig.update_layout(
+                autosize=False,
+                plot_bgcolor="rgb(255, 255, 255, 0)",
+                bargap=0.5,
+                dragmode="pan",
+                height=390,
+                width=1050,
+                hovermode="closest",
+                legend={
+                    "x": 0.1,
+                    "y": -0.08,
+                    "bgcolor": "rgb(255, 255, 255, 0)",
+                    "borderwidth": 0,
+                    "font": {"size": 12},
+                    "orientation": "h",
                 },
-                marker={
-                    "maxdisplayed": 0,
-                    "opacity": 0,
+                margin={
+                    "r": 0,
+                    "t": 50,
+                    "b": 40,
+                    "l": 0,
+                    "pad": 0,
                 },
-                name="Avg. Sales Price",
-            ))
-    
+                showlegend=True,
+                title=title,
+                title_x=0.5,
+                titlefont={"size": 20},
+                # keeps the user's zoom and pan when the figure is reloaded
+                uirevision="daily",
+                xaxis={
+                    "autorange": False,
+                    "nticks": 50,
+                    "range": [first - 0.5, last + 0.5],
+                    "tickangle": -90,
+                    "showgrid": False,
+                    "tickfont": {"size": 10},
+                    "ticks": "",
+                    "title": "Day of Year",
+                    "type": "linear",
+                },
+                yaxis={
+                    "autorange": True,
+                    "linecolor": "rgb(176, 177, 178)",
+                    "nticks": 10,
+                    "showgrid": True,
+                    "gridcolor": "rgb(220, 220, 220)",
+                    "showline": True,
+                    "tickfont": {"size": 12},
+                    "ticks": "outside",
+                    "title": "",
+                    "type": "linear",
+                    "zeroline": True,
+                    "zerolinecolor": "rgb(176, 177, 178)",
+                },
+            )
+    return fig
 
-fig_day.update_layout(
-            autosize=False,
-            plot_bgcolor="rgb(255, 255, 255, 0)",
-            bargap=0.5,
-            dragmode="pan",
-            height=390,
-            width=1050,
-            hovermode="closest",
-            legend={
-                "x": 0.1,
-                "y": -0.08,
-                "bgcolor": "rgb(255, 255, 255, 0)",
-                "borderwidth": 0,
-                "font": {"size": 12},
-                "orientation": "h",
-            },
-            margin={
-                "r": 0,
-                "t": 50,
-                "b": 40,
-                "l": 0,
-                "pad": 0,
-            },
-            showlegend=True,
-            title="Aggregate Orders - Daily ",
-            title_x=0.5,
-            titlefont={"size": 20},
-            xaxis={
-                "autorange": False,
-                "nticks": 50,
-                "range": [-0.5, 60.5],
-                "tickangle": -90,
-                "showgrid": False,
-                "tickfont": {"size": 10},
-                "tickmode": "linear",
-                "ticks": "",
-                "title": "Day of Year",
-                "type": "category",
-            },
-            yaxis={
-                "autorange": True,
-                "linecolor": "rgb(176, 177, 178)",
-                "nticks": 10,
-                "range": [
-                    -1283.8982436029166,
-                    3012.5614936594166,
-                ],
-                "showgrid": True,
-                "gridcolor": "rgb(220, 220, 220)",
-                "showline": True,
-                "tickfont": {"size": 12},
-                "ticks": "outside",
-                "title": "",
-                "type": "linear",
-                "zeroline": True,
-                "zerolinecolor": "rgb(176, 177, 178)",
-            },
-        )
+
+fig_day = daily_figure(orders_day, *view_days(None, orders_day['day_of_year']),
+                       title="Aggregate Orders - Daily ", price_name="Avg. Sales Price")
 
 # monthly
 
@@ -271,7 +347,7 @@ eda_1 =  dbc.Col([
                 dbc.Row(children = [
                     dbc.Col(
                         html.Div([
-                        dcc.Graph(figure=fig_day),
+                        dcc.Graph(id='daily-chart', figure=fig_day),
                         ]),width=9),
                     dbc.Col(
                         html.Div([
@@ -289,8 +365,10 @@ eda_2 = dbc.Col([
                     id='item-id-dropdown',
                     value=item_list[0],
                     multi=False,
-                    options=[{'label': col, 'value': col} for col in item_list]),
-                    dbc.FormText('Select an item to view orders')
+                    clearable=False,
+                    placeholder='Item, manufacturer or brand',
+                    options=item_search.options(None, item_list[0])),
+                    dbc.FormText('Search an item, manufacturer or brand to view orders')
                       ], width=3)),
                 html.Br(),
                 dbc.Row(
@@ -374,7 +452,8 @@ eda_3 =  dbc.Col([
                     id='manuf-id-dropdown',
                     value=manuf_list[0],
                     multi=False,
-                    options=[{'label': col, 'value': col} for col in manuf_list]),
+                    clearable=False,
+                    options=manuf_search.options(None, manuf_list[0])),
                     dbc.FormText('Select manufacturer to view ratings')
                     ], width=4, style={"margin-left": "270px"}),      
                 ]),
@@ -391,6 +470,63 @@ eda_3 =  dbc.Col([
                 ]),
             ])
 
+eda_4 = dbc.Col([
+                dbc.Row(children=[
+                    dbc.Col([
+                    dbc.Label('Rollup Level'),
+                    dcc.Dropdown(
+                    id='rollup-level-dropdown',
+                    value='manufacturer',
+                    multi=False,
+                    clearable=False,
+                    options=[
+                        {'label': 'Manufacturer', 'value': 'manufacturer'},
+                        {'label': 'Category', 'value': 'category'}
+                    ]),
+                    dbc.FormText('Select a level to view demand per group')
+                      ], width=3),
+                    dbc.Col([
+                    dbc.Label('Group'),
+                    dcc.Dropdown(
+                    id='rollup-group-dropdown',
+                    multi=False,
+                    clearable=False),
+                    dbc.FormText('Select a manufacturer or category')
+                      ], width=3),
+                    dbc.Col([
+                    dbc.Label('Moving Window'),
+                    dcc.Dropdown(
+                    id='rollup-window-dropdown',
+                    value=7,
+                    multi=False,
+                    clearable=False,
+                    options=[{'label': f'{days} days', 'value': days} for days in [1, 7, 14, 28]]),
+                    dbc.FormText('Select the days averaged by the trend line')
+                      ], width=3),
+                ]),
+                html.Br(),
+                dbc.Row(children = [
+                    dbc.Col(
+                        html.Div([
+                        dcc.Graph(id='rollup-daily-chart'),
+                        ]),width=9),
+                    dbc.Col(
+                        html.Div([
+                        dcc.Graph(id='rollup-top-chart'),
+                    ]),width=3)
+                ]),
+                dbc.Row(
+                    dbc.Col([
+                    dcc.RangeSlider(
+                    id='rollup-day-slider',
+                    min=int(rollup_days[0]),
+                    max=int(rollup_days[-1]),
+                    value=[int(rollup_days[0]), int(rollup_days[-1])],
+                    marks={int(day): str(day) for day in rollup_days[::14]}),
+                    dbc.FormText('Select the days ranked by the top groups chart')
+                    ])),
+            ])
+
 
 eda_content = dbc.Card(
     dbc.CardBody([
@@ -399,7 +535,9 @@ eda_content = dbc.Card(
         html.Br(),
         eda_2,
         html.Br(),
-        eda_3
+        eda_3,
+        html.Br(),
+        eda_4
     ]),color="primary", outline=True,
 )
 
@@ -506,7 +644,7 @@ forecast_1 = dbc.Col([
                     dbc.Card(
                     dbc.CardBody([
                     html.P("Model RMSE", className="card-title"),
-                    html.H4("69.232", className="card-text"),
+                    html.H4("{:,.3f}".format(metrics_totals['rmse']), className="card-text"),
                 ]),
                 color="primary",
                 outline=True,
@@ -514,7 +652,7 @@ forecast_1 = dbc.Col([
                 dbc.Card(
                     dbc.CardBody([
                     html.P("Model Profit", className="card-title"),
-                    html.H4("4527594.66", className="card-text"),
+                    html.H4("{:,.2f}".format(metrics_totals['profit']), className="card-text"),
                 ]),
                 color="primary",
                 outline=True,
@@ -540,8 +678,10 @@ forecast_2 = dbc.Col([
                     id='item-dropdown',
                     value=item_list[0],
                     multi=False,
-                    options=[{'label': col, 'value': col} for col in item_list]),
-                    dbc.FormText('Select an item to view orders')
+                    clearable=False,
+                    placeholder='Item, manufacturer or brand',
+                    options=item_search.options(None, item_list[0])),
+                    dbc.FormText('Search an item, manufacturer or brand to view orders')
                       ], width=3),
                     dbc.Col([], width=5),
                     dbc.Col([
@@ -586,110 +726,80 @@ model_content = dbc.Card(
 )
 
 
+@app.callback(
+    Output('daily-chart', 'figure'),
+    Input('daily-chart', 'relayoutData'),
+    prevent_initial_call=True)
+@deterministic
+def daily_chart(relayout_data):
+    """
+    Reload the aggregate daily chart for the days in view
+    :param relayout_data: The zoom or pan of the chart
+    :return: The figure of the days in view
+    """
+    view = view_days(relayout_data, orders_day['day_of_year'])
+    if view is None:
+        raise PreventUpdate
+    return total_day_chart(*view)
+
+
+@figure_cache.cached('daily_chart')
+def total_day_chart(first, last):
+    return daily_figure(orders_day, first, last,
+                        title="Aggregate Orders - Daily ", price_name="Avg. Sales Price")
+
+
 @app.callback(
     Output('item-daily-chart', 'figure'),
-    Output('item-month-chart', 'figure'),
-    Input('item-id-dropdown', 'value'))
+    Input('item-id-dropdown', 'value'),
+    Input('item-daily-chart', 'relayoutData'))
+@deterministic
+def item_daily_chart(item_id, relayout_data):
+    """
+    Daily chart of an item for the days in view, kept when another item is selected
+    :param item_id: The selected item
+    :param relayout_data: The zoom or pan of the chart, or the last one when the item changed
+    :return: The figure of the days in view
+    """
+    days = day_index.rows(item_id)['day_of_year']
+    view = view_days(relayout_data, days)
+    if view is None:
+        # relayoutData persists: an event without x range, e.g. {'autosize': True},
+        # only leaves the chart as it is when it is what fired
+        if 'item-daily-chart.relayoutData' in [t['prop_id'] for t in dash.callback_context.triggered]:
+            raise PreventUpdate
+        view = view_days(None, days)
+    return item_day_chart(item_id, *view)
 
-def item_chart(item_id):
 
-    fig_item_day = go.Figure()
+@figure_cache.cached('item_day_chart')
+def item_day_chart(item_id, first, last):
+    return daily_figure(day_index.rows(item_id), first, last,
+                        title=f"Item {item_id}: Aggregate Orders - Daily ", price_name="Sales Price")
 
-    fig_item_day.add_trace(go.Bar(
-                    x=agg_orders_day[agg_orders_day['itemID']==item_id]['day_of_year'],
-                    y=agg_orders_day[agg_orders_day['itemID']==item_id]['order'],
-                    marker={"color": color_1},
-                    name="Total Orders"
-                ))
 
-    fig_item_day.add_trace(go.Scatter(
-                    x=agg_orders_day[agg_orders_day['itemID']==item_id]['day_of_year'],
-                    y=agg_orders_day[agg_orders_day['itemID']==item_id]['salesPrice'],
-                    hoverinfo="y",
-                    line={
-                        "color": "#e41f23",
-                        "dash": "dot",
-                        "width": 2,
-                    },
-                    marker={
-                        "maxdisplayed": 0,
-                        "opacity": 0,
-                    },
-                    name="Sales Price"))
-        
+@app.callback(
+    Output('item-month-chart', 'figure'),
+    Input('item-id-dropdown', 'value'))
+@deterministic
+@figure_cache.cached('item_month_chart')
+def item_month_chart(item_id):
 
-    fig_item_day.update_layout(
-                autosize=False,
-                plot_bgcolor="rgb(255, 255, 255, 0)",
-                bargap=0.5,
-                dragmode="pan",
-                height=390,
-                width=1050,
-                hovermode="closest",
-                legend={
-                    "x": 0.1,
-                    "y": -0.08,
-                    "bgcolor": "rgb(255, 255, 255, 0)",
-                    "borderwidth": 0,
-                    "font": {"size": 12},
-                    "orientation": "h",
-                },
-                margin={
-                    "r": 0,
-                    "t": 50,
-                    "b": 40,
-                    "l": 0,
-                    "pad": 0,
-                },
-                showlegend=True,
-                title=f"Item {item_id}: Aggregate Orders - Daily ",
-                title_x=0.5,
-                titlefont={"size": 20},
-                xaxis={
-                    "autorange": False,
-                    "nticks": 50,
-                    "range": [-0.5, 60.5],
-                    "tickangle": -90,
-                    "showgrid": False,
-                    "tickfont": {"size": 10},
-                    "tickmode": "linear",
-                    "ticks": "",
-                    "title": "Day of Year",
-                    "type": "category",
-                },
-                yaxis={
-                    "autorange": True,
-                    "linecolor": "rgb(176, 177, 178)",
-                    "nticks": 10,
-                    "range": [
-                        -1283.8982436029166,
-                        3012.5614936594166,
-                    ],
-                    "showgrid": True,
-                    "gridcolor": "rgb(220, 220, 220)",
-                    "showline": True,
-                    "tickfont": {"size": 12},
-                    "ticks": "outside",
-                    "title": "",
-                    "type": "linear",
-                    "zeroline": True,
-                    "zerolinecolor": "rgb(176, 177, 178)",
-                },
-            )
+    item_month = month_index.rows(item_id)
 
     # monthly
 
     fig_item_month = go.Figure()
 
     fig_item_month.add_trace(go.Bar(
-                    x=agg_orders_month[agg_orders_month['itemID']==item_id]['month'],
-                    y=agg_orders_month[agg_orders_month['itemID']==item_id]['order'],
+                    x=item_month['month'],
+                    y=item_month['order'],
                     marker={"color": color_1}
                 ))
 
     fig_item_month.add_trace(go.Scatter(
-                    x=agg_orders_month[agg_orders_month['itemID']==item_id]['month'],
-                    y=agg_orders_month[agg_orders_month['itemID']==item_id]['salesPrice'],
+                    x=item_month['month'],
+                    y=item_month['salesPrice'],
                     hoverinfo="y",
                     line={
                         "color": "#e41f23",
@@ -756,7 +866,6 @@ def item_chart(item_id):
             ),
 
     return (
-        fig_item_day,
         fig_item_month
     )
 
@@ -773,14 +882,16 @@ def item_chart(item_id):
 
 # Setup app
 
+@deterministic
 def cards_builder(item_id):
 
     # Cards
-    sales_price = "{:,.2f}".format(mean_price_daily[mean_price_daily['itemID']==item_id]['salesPrice'].mean())                   
-    promotion_price = items[items['itemID']==item_id]['simulationPrice']
-    retail_price = items[items['itemID']==item_id]['recommendedRetailPrice']
-    customer_rating = items[items['itemID']==item_id]['customerRating']
-    manufacturer = items[items['itemID']==item_id]['manufacturer']
+    daily_prices = day_index.rows(item_id)['salesPrice']
+    sales_price = "{:,.2f}".format(daily_prices.mean() if len(daily_prices) else np.nan)
+    promotion_price = item_index.value(item_id, 'simulationPrice')
+    retail_price = item_index.value(item_id, 'recommendedRetailPrice')
+    customer_rating = item_index.value(item_id, 'customerRating')
+    manufacturer = item_index.value(item_id, 'manufacturer')
 
     return (
     sales_price,
@@ -790,12 +901,35 @@ def cards_builder(item_id):
     manufacturer,  
     )
 
+# Dropdown options matching the typed text
+
+def search_options(index, dropdown_id):
+    @app.callback(
+        Output(dropdown_id, 'options'),
+        Input(dropdown_id, 'search_value'),
+        State(dropdown_id, 'value'),
+        prevent_initial_call=True)
+    @deterministic
+    def dropdown_options(search_value, value):
+        """
+        :param search_value: The text typed in the dropdown
+        :param value: The selected option, kept in the options
+        :return: The first options whose item, manufacturer or brand starts with the text
+        """
+        return index.options(search_value, value)
+
+
+search_options(item_search, 'item-id-dropdown')
+search_options(item_search, 'item-dropdown')
+search_options(manuf_search, 'manuf-id-dropdown')
+
 # Price Chart
 
 @app.callback(
     Output('price-chart', 'figure'),
     Input('price-dropdown', 'value'))
-
+@deterministic
+@figure_cache.cached('price_chart')
 def price_chart(price_type):
 
     fig_price = go.Figure()
@@ -877,15 +1011,18 @@ def price_chart(price_type):
 @app.callback(
     Output('fig-rating', 'figure'),
     Input('manuf-id-dropdown', 'value'))
-
+@deterministic
+@figure_cache.cached('rating_chart')
 def price_chart(manuf_id):
 
+    manuf_items = manuf_index.rows(manuf_id)
+
     fig_rating = go.Figure()
 
     fig_rating.add_trace(
         go.Scatter(
-                x=items[items['manufacturer']==manuf_id]['itemID'],
-                y=items[items['manufacturer']==manuf_id]['customerRating'],
+                x=manuf_items['itemID'],
+                y=manuf_items['customerRating'],
                 marker={
                         "color": "rgb(255, 0, 0)",
                         "symbol": "diamond",
@@ -946,27 +1083,194 @@ def price_chart(manuf_id):
         fig_rating
     )
 
+# Manufacturer and Category Demand Charts
+
+@app.callback(
+    Output('rollup-group-dropdown', 'options'),
+    Output('rollup-group-dropdown', 'value'),
+    Input('rollup-level-dropdown', 'value'))
+@deterministic
+def rollup_groups(level):
+    """
+    :param level: manufacturer or category
+    :return: The groups of the level as dropdown options, and the first group
+    """
+    groups = rollup_cube.groups[level].tolist()
+    return [{'label': group, 'value': group} for group in groups], groups[0]
+
+
+@app.callback(
+    Output('rollup-daily-chart', 'figure'),
+    Input('rollup-level-dropdown', 'value'),
+    Input('rollup-group-dropdown', 'value'),
+    Input('rollup-window-dropdown', 'value'))
+@deterministic
+@figure_cache.cached('rollup_chart')
+def rollup_chart(level, group, window):
+
+    fig_rollup = go.Figure()
+
+    daily = rollup_cube.series(level, group, 'order')
+    trailing = rollup_cube.series(level, group, 'order', window)
+    if daily is not None:
+        fig_rollup.add_trace(go.Bar(
+                        x=rollup_days,
+                        y=daily[0],
+                        marker={"color": color_1},
+                        name="Total Orders"
+                    ))
+
+        fig_rollup.add_trace(go.Scatter(
+                        x=rollup_days,
+                        y=trailing[0] / trailing[1],
+                        hoverinfo="y",
+                        line={
+                            "color": "#e41f23",
+                            "dash": "dot",
+                            "width": 2,
+                        },
+                        marker={
+                            "maxdisplayed": 0,
+                            "opacity": 0,
+                        },
+                        name=f"{window}-Day Mean Orders"))
+
+    fig_rollup.update_layout(
+                autosize=False,
+                plot_bgcolor="rgb(255, 255, 255, 0)",
+                bargap=0.5,
+                dragmode="pan",
+                height=390,
+                width=1050,
+                hovermode="closest",
+                legend={
+                    "x": 0.1,
+                    "y": -0.08,
+                    "bgcolor": "rgb(255, 255, 255, 0)",
+                    "borderwidth": 0,
+                    "font": {"size": 12},
+                    "orientation": "h",
+                },
+                margin={
+                    "r": 0,
+                    "t": 50,
+                    "b": 40,
+                    "l": 0,
+                    "pad": 0,
+                },
+                showlegend=True,
+                title=f"{level.capitalize()} {group}: Aggregate Orders - Daily ",
+                title_x=0.5,
+                titlefont={"size": 20},
+                xaxis={
+                    "nticks": 50,
+                    "tickangle": -90,
+                    "showgrid": False,
+                    "tickfont": {"size": 10},
+                    "ticks": "",
+                    "title": "Day of Year",
+                },
+                yaxis={
+                    "autorange": True,
+                    "linecolor": "rgb(176, 177, 178)",
+                    "nticks": 10,
+                    "showgrid": True,
+                    "gridcolor": "rgb(220, 220, 220)",
+                    "showline": True,
+                    "tickfont": {"size": 12},
+                    "ticks": "outside",
+                    "title": "",
+                    "type": "linear",
+                    "zeroline": True,
+                    "zerolinecolor": "rgb(176, 177, 178)",
+                },
+            )
+
+    return (
+        fig_rollup
+    )
+
+
+@app.callback(
+    Output('rollup-top-chart', 'figure'),
+    Input('rollup-level-dropdown', 'value'),
+    Input('rollup-day-slider', 'value'))
+@deterministic
+@figure_cache.cached('rollup_top_chart')
+def rollup_top_chart(level, days):
+
+    first, last = days
+    orders = rollup_cube.window(level, 'order', [first], [last])[0][:, 0]
+    top = np.argsort(-orders, kind='stable')[:15][::-1]
+
+    fig_top = go.Figure()
+
+    fig_top.add_trace(go.Bar(
+                    x=orders[top],
+                    y=[str(group) for group in rollup_cube.groups[level][top]],
+                    orientation='h',
+                    marker={"color": color_1},
+                    name="Total Orders"
+                ))
+
+    fig_top.update_layout(
+                autosize=False,
+                plot_bgcolor="rgb(255, 255, 255, 0)",
+                bargap=0.3,
+                height=400,
+                width=360,
+                hovermode="closest",
+                margin={
+                    "r": 0,
+                    "t": 50,
+                    "b": 40,
+                    "l": 60,
+                    "pad": 0,
+                },
+                showlegend=False,
+                title=f"Top {level.capitalize()}s, Days {first}-{last}",
+                title_x=0.5,
+                titlefont={"size": 20},
+                xaxis={
+                    "showgrid": True,
+                    "gridcolor": "rgb(220, 220, 220)",
+                    "tickfont": {"size": 10},
+                    "title": "Orders",
+                },
+                yaxis={
+                    "showgrid": False,
+                    "tickfont": {"size": 10},
+                    "type": "category",
+                },
+            )
+
+    return (
+        fig_top
+    )
+
 
 @app.callback(
     Output("item-forecast", "figure"),
     Input("item-dropdown", "value"),
 )
-
-
+@deterministic
+@figure_cache.cached('item_forecast_chart')
 def item_forecast_chart(item_id):
 
+    item_result = result_index.rows(item_id)
+
     item_forecast_fig = go.Figure()
 
     item_forecast_fig.add_trace(go.Bar(
                     x=[i for i in range(145, 170)],
-                    y=result[result['itemID']==item_id]['Truth'],
+                    y=item_result['Truth'],
                     name='Actual',
                     marker={"color": color_1}      
                     ))
             
     item_forecast_fig.add_trace(go.Bar(
                     x=[i for i in range(145, 170)],
-                    y=result[result['itemID']==item_id]['Pred'],
+                    y=item_result['Pred'],
                     name='Predicted',
                     marker={"color": color_2}      
                     ))
@@ -1044,25 +1348,11 @@ def item_forecast_chart(item_id):
 )
 
 
+@deterministic
 def item_forecast_chart(item_id):
 
-    truth = result[result['itemID']==item_id]['Truth']
-    pred = result[result['itemID']==item_id]['Pred']
-
-    promotion_price = items[items['itemID']==item_id]['simulationPrice']
-    pred_act = np.where(pred > 0, pred, 0)
-    pred_act = np.round(pred_act).astype('int')
-    sale = np.minimum(truth, pred_act)
-
-    overstock = pred_act - truth
-    overstock[overstock < 0] = 0
-
-    revenue = sale * promotion_price
-    fee     = overstock * promotion_price * 0.6
-    profit  = revenue - fee
-
-    rmse = "{:,.3f}".format(np.sqrt(mean_squared_error(pred, truth)))   
-    profit = "{:,.2f}".format(profit.sum())   
+    rmse = "{:,.3f}".format(metrics_index.value(item_id, 'rmse', np.nan))
+    profit = "{:,.2f}".format(metrics_index.value(item_id, 'profit', np.nan))
 
     return(
         rmse, profit
@@ -1071,18 +1361,47 @@ def item_forecast_chart(item_id):
 
 # Setup app and layout/frontend
 
-dashboard_logo = 'assets/ecological.png'
-encoded_image = base64.b64encode(open(dashboard_logo, 'rb').read())
-
 server = app.server
 
+
+@server.route('/_figure-cache/stats')
+def figure_cache_stats():
+    """
+    Hit and miss counters of the figure cache in the worker serving the request
+    """
+    return flask.jsonify(figure_cache.stats())
+
+
+# Callback responses compressed here, the deterministic ones with ETags so
+# that clients resending them are answered with 304 Not Modified
+
+callback_http = CallbackHTTPCache()
+callback_http.register(app)
+
+
+@server.route('/_http-cache/stats')
+def http_cache_stats():
+    """
+    Compressed body hits, misses and 304 responses in the worker serving the request
+    """
+    return flask.jsonify(callback_http.stats())
+
+
+# Forecasts of single items or batches at /api/forecast, scored from the
+# feature store written by forecast.py; the boosters are loaded once per worker
+
+forecast_service = ForecastService(os.environ.get('FORECAST_MODEL_DIR', '.'),
+                                   os.environ.get('FEATURE_STORE_DIR', FEATURE_STORE_DIR),
+                                   compiled=os.environ.get('FORECAST_COMPILED', '') == '1')
+register_forecast_api(server, forecast_service)
+
 app.layout = dbc.Container([
     dbc.Navbar(
         [
             html.A(
                 dbc.Row(
                     [
-                        dbc.Col(html.Img(src='data:image/png;base64,{}'.format(encoded_image.decode()), height='30px')),
+                        dbc.Col(html.Img(src=app.get_asset_url('ecological.png'), height='30px')),
                         dbc.Col(dbc.NavbarBrand('Demand Forecasting Dashboard', className='ml-2')),
                     ],
                     align='center',
@@ -1114,6 +1433,11 @@ app.layout = dbc.Container([
            style={'font-size': '80%'})
 ], fluid=True, style={'border-width': '10'})
 
+# The layout only changes with the data: rendered and compressed once, from
+# the output of `python static_layout.py` when it is up to date
+
+static_layout = StaticLayout.prepare(app.layout)
+static_layout.register(app)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,104 @@
+"""
+Asymmetric MSE: the notebook's objective and metric versus
+training.AsymmetricMSE.
+
+Gradients and hessians are checked to be identical to the notebook's as
+LightGBM receives them (float32), for the notebook's slopes and other
+ratios, and the metric to agree to rounding. Then both are timed per call
+and over a full LightGBM fit; without sample weights both fits build the
+same trees.
+
+Run from the repository root: python benchmarks/asymmetric_loss.py [n_rows] [n_estimators]
+"""
+
+import os
+import sys
+import time
+
+import lightgbm as lgb
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from training import AsymmetricMSE, NUM_FOLDS
+
+SLOPES = [(2.0, 0.72), (1.0, 3.5), (0.01, 0.07)]
+
+
+def notebook_objective(under=2.0, over=0.72):
+    # The notebook's asymmetric_mse, with its slopes as parameters
+    def asymmetric_mse(y_true, y_pred):
+        residual = (y_true - y_pred).astype('float')
+        grad     = np.where(residual > 0, -under*residual, -over*residual)
+        hess     = np.where(residual > 0,  under, over)
+        return grad, hess
+    return asymmetric_mse
+
+
+def notebook_metric(under=2.0, over=0.72):
+    # The notebook's asymmetric_mse_eval, with its slopes as parameters
+    def asymmetric_mse_eval(y_true, y_pred):
+        residual = (y_true - y_pred).astype('float')
+        loss     = np.where(residual > 0, under*residual**2, over*residual**2)
+        return 'asymmetric_mse_eval', np.mean(loss), False
+    return asymmetric_mse_eval
+
+
+def per_call(func, y_true, y_pred, repeat=20):
+    func(y_true, y_pred)
+    time_start = time.perf_counter()
+    for _ in range(repeat):
+        func(y_true, y_pred)
+    return (time.perf_counter() - time_start) / repeat
+
+
+def fit(objective, metric, X, y, X_valid, y_valid, n_estimators):
+    time_start = time.perf_counter()
+    model = lgb.LGBMRegressor(boosting_type = 'goss', objective = objective, metrics = 'None',
+                              n_estimators = n_estimators, learning_rate = 0.1, num_leaves = 15,
+                              verbosity = -1, random_state = 23)
+    model.fit(X, y, eval_set = [(X, y), (X_valid, y_valid)], eval_metric = metric)
+    return model, time.perf_counter() - time_start
+
+
+def main(n_rows=1000000, n_estimators=100):
+    rng = np.random.default_rng(0)
+    y_true = np.sqrt(rng.poisson(3, n_rows)).astype('float32')
+    y_pred = y_true + rng.normal(0, 0.5, n_rows)
+
+    for under, over in SLOPES:
+        loss = AsymmetricMSE(under, over)
+        grad, hess = notebook_objective(under, over)(y_true, y_pred)
+        fast_grad, fast_hess = loss.objective(y_true, y_pred)
+        np.testing.assert_array_equal(fast_grad, grad.astype('float32'))
+        np.testing.assert_array_equal(fast_hess, hess.astype('float32'))
+        np.testing.assert_allclose(loss.metric(y_true, y_pred)[1], notebook_metric(under, over)(y_true, y_pred)[1], rtol=1e-12)
+
+    loss = AsymmetricMSE()
+    t_objective = per_call(notebook_objective(), y_true, y_pred)
+    t_fast_objective = per_call(loss.objective, y_true, y_pred)
+    t_metric = per_call(notebook_metric(), y_true, y_pred)
+    t_fast_metric = per_call(loss.metric, y_true, y_pred)
+
+    # a fit on the same data with both implementations
+    X = rng.normal(size = (n_rows, 10)).astype('float32')
+    y = np.sqrt(np.maximum(np.round(3 * X[:, 0] + X[:, 1] ** 2 + rng.normal(size = n_rows)), 0))
+    X_valid, y_valid = X[:n_rows // 100], y[:n_rows // 100]
+    model, t_fit = fit(notebook_objective(), notebook_metric(), X, y, X_valid, y_valid, n_estimators)
+    fast_model, t_fast_fit = fit(loss.objective, loss.metric, X, y, X_valid, y_valid, n_estimators)
+    np.testing.assert_array_equal(fast_model.predict(X_valid), model.predict(X_valid))
+
+    # per boosting round: one objective call, and the metric on the training rows
+    # and on the validation rows (a hundredth of them here)
+    saved = (t_objective - t_fast_objective) + (t_metric - t_fast_metric) * 1.01
+    print('{} rows, identical gradients for slopes {}'.format(n_rows, SLOPES))
+    print('{:<28}{:>14}{:>14}'.format('call', 'notebook ms', 'fused ms'))
+    print('{:<28}{:>14.2f}{:>14.2f}'.format('objective', 1000 * t_objective, 1000 * t_fast_objective))
+    print('{:<28}{:>14.2f}{:>14.2f}'.format('metric', 1000 * t_metric, 1000 * t_fast_metric))
+    print('{:<28}{:>14.2f}{:>14.2f}'.format('fit, {} rounds (s)'.format(n_estimators), t_fit, t_fast_fit))
+    print('saved per round: {:.1f} ms, over 1000 rounds x {} folds: {:.0f} s'.format(
+        1000 * saved, NUM_FOLDS, saved * 1000 * NUM_FOLDS))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
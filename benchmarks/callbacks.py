@@ -0,0 +1,136 @@
+"""
+Micro-benchmark of the item-level dashboard callbacks.
+
+Compares the per-selection cost of the old boolean-mask lookups with the
+ItemIndex slices, then times each registered callback end to end, first
+against an empty figure cache and then again once it is warm. Before timing,
+it checks that selecting another item redraws the daily chart even when the
+last relayout event of the chart had no x range.
+
+Run from the repository root: python benchmarks/callbacks.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['FIGURE_CACHE_DIR'] = tempfile.mkdtemp()
+
+import app
+
+
+def timeit(func, args, repeat=5):
+    """
+    :param func: Function to time
+    :param args: List of argument tuples, one call per tuple
+    :param repeat: Number of passes over args
+    :return: Mean latency per call in milliseconds
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for arg in args:
+            func(*arg)
+    return 1000 * (time.perf_counter() - start) / (repeat * len(args))
+
+
+# Lookups as done before the index, one mask per column read
+
+def scan_item_chart(item_id):
+    df, dm = app.agg_orders_day, app.agg_orders_month
+    return [df[df['itemID'] == item_id][c] for c in ['day_of_year', 'order', 'day_of_year', 'salesPrice']] + \
+           [dm[dm['itemID'] == item_id][c] for c in ['month', 'order', 'month', 'salesPrice']]
+
+
+def scan_cards(item_id):
+    items = app.items
+    return [items[items['itemID'] == item_id][c] for c in
+            ['simulationPrice', 'recommendedRetailPrice', 'customerRating', 'manufacturer']]
+
+
+def scan_forecast(item_id):
+    result, items = app.result, app.items
+    return (result[result['itemID'] == item_id]['Truth'], result[result['itemID'] == item_id]['Pred'],
+            items[items['itemID'] == item_id]['simulationPrice'])
+
+
+def scan_rating(manuf_id):
+    items = app.items
+    return items[items['manufacturer'] == manuf_id]['itemID'], items[items['manufacturer'] == manuf_id]['customerRating']
+
+
+# Lookups through the index
+
+def index_item_chart(item_id):
+    return app.day_index.rows(item_id), app.month_index.rows(item_id)
+
+
+def index_cards(item_id):
+    return [app.item_index.value(item_id, c) for c in
+            ['simulationPrice', 'recommendedRetailPrice', 'customerRating', 'manufacturer']]
+
+
+def index_forecast(item_id):
+    return app.result_index.rows(item_id), app.item_index.value(item_id, 'simulationPrice')
+
+
+def index_rating(manuf_id):
+    return app.manuf_index.rows(manuf_id)
+
+
+def callback(output):
+    return app.app.callback_map[output]['callback'].__wrapped__
+
+
+def check_item_change_after_relayout(item_id):
+    """
+    Post the item daily chart callback as dash-renderer does when the dropdown changes after an autosize.
+
+    :param item_id: The newly selected item
+    """
+    body = {
+        'output': 'item-daily-chart.figure',
+        'outputs': {'id': 'item-daily-chart', 'property': 'figure'},
+        'inputs': [{'id': 'item-id-dropdown', 'property': 'value', 'value': item_id},
+                   {'id': 'item-daily-chart', 'property': 'relayoutData', 'value': {'autosize': True}}],
+        'changedPropIds': ['item-id-dropdown.value'],
+    }
+    response = app.server.test_client().post('/_dash-update-component', json=body,
+                                              headers={'Accept-Encoding': 'identity'})
+    assert response.status_code == 200, response.status_code
+    figure = json.loads(response.get_data())['response']['item-daily-chart']['figure']
+    assert 'Item {}'.format(item_id) in figure['layout']['title']['text'], figure['layout']['title']
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    item_args = [(int(i),) for i in rng.choice(app.item_list, 50)]
+    manuf_args = [(int(m),) for m in rng.choice(app.manuf_list, 50)]
+    check_item_change_after_relayout(item_args[0][0])
+
+    print('{:<20}{:>12}{:>12}'.format('lookup', 'scan (ms)', 'index (ms)'))
+    for name, scan, index, args in [('item_chart', scan_item_chart, index_item_chart, item_args),
+                                    ('cards_builder', scan_cards, index_cards, item_args),
+                                    ('item_forecast', scan_forecast, index_forecast, item_args),
+                                    ('ratings', scan_rating, index_rating, manuf_args)]:
+        print('{:<20}{:>12.3f}{:>12.3f}'.format(name, timeit(scan, args), timeit(index, args)))
+
+    print()
+    print('{:<60}{:>12}{:>12}'.format('callback', 'cold (ms)', 'warm (ms)'))
+    for output, args in [('item-daily-chart.figure', [arg + (None,) for arg in item_args]),
+                         ('item-month-chart.figure', item_args),
+                         ('..sales-price.children...promotion-price.children...retail-price.children...'
+                          'customer-rating.children...manufacturer.children..', item_args),
+                         ('item-forecast.figure', item_args),
+                         ('..item-rmse.children...item-profit.children..', item_args),
+                         ('fig-rating.figure', manuf_args)]:
+        cold = timeit(callback(output), list(set(args)), repeat=1)
+        warm = timeit(callback(output), args)
+        print('{:<60}{:>12.3f}{:>12.3f}'.format(output[:58], cold, warm))
+
+    print()
+    print('figure cache:', app.figure_cache.stats())
@@ -0,0 +1,94 @@
+"""
+Manufacturer and category rollups: groupby sums of the long daily orders
+versus RollupCube lookups, for the queries of the dashboard's rollup charts.
+
+- series: daily orders of one group and their 7-day trailing sums.
+- top: total orders of every group within a range of days.
+
+Both ways must give the same sums.
+
+Run from the repository root: python benchmarks/cube.py [n_items]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cube import RollupCube
+
+N_DAYS = 180
+WINDOW = 7
+
+
+def synthetic(n_items, seed=0):
+    # agg_orders_day as the dashboard reads it: only item days with orders
+    rng = np.random.default_rng(seed)
+    orders = rng.poisson(1, (n_items, N_DAYS)) * rng.integers(0, 3, (n_items, N_DAYS))
+    item_codes, days = np.nonzero(orders)
+    agg_orders = pd.DataFrame({'itemID':      item_codes + 1,
+                               'day_of_year': days + 1,
+                               'order':       orders[item_codes, days],
+                               'salesPrice':  np.round(rng.uniform(1, 50, len(days)), 2)})
+    items = pd.DataFrame({'itemID':       np.arange(1, n_items + 1),
+                          'manufacturer': rng.integers(1, 250, n_items),
+                          'category':     rng.integers(1, 75, n_items)})
+    return agg_orders, items
+
+
+def groupby_series(agg_orders, items, level, group):
+    rows = agg_orders.merge(items[['itemID', level]], on='itemID')
+    daily = rows[rows[level] == group].groupby('day_of_year')['order'].sum()
+    daily = daily.reindex(np.arange(1, N_DAYS + 1), fill_value=0)
+    return daily.to_numpy(), daily.rolling(WINDOW, min_periods=1).sum().to_numpy()
+
+
+def cube_series(cube, level, group):
+    return cube.series(level, group, 'order')[0], cube.series(level, group, 'order', WINDOW)[0]
+
+
+def groupby_top(agg_orders, items, level, first, last):
+    rows = agg_orders[agg_orders['day_of_year'].between(first, last)].merge(items[['itemID', level]], on='itemID')
+    return rows.groupby(level)['order'].sum().reindex(np.unique(items[level]), fill_value=0).to_numpy()
+
+
+def cube_top(cube, level, first, last):
+    return cube.window(level, 'order', [first], [last])[0][:, 0]
+
+
+def timeit(func, args, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        out = func(*args)
+    return out, 1000 * (time.perf_counter() - start) / repeat
+
+
+def main(n_items=10463):
+    agg_orders, items = synthetic(n_items)
+    time_start = time.perf_counter()
+    cube = RollupCube.from_long(agg_orders, items)
+    t_build = time.perf_counter() - time_start
+
+    print('{} items, {} order rows, cube built in {:.0f} ms ({:.1f} MiB)'.format(
+        n_items, len(agg_orders), 1000 * t_build,
+        sum(cum.nbytes for cum in cube.cum.values()) / 2 ** 20))
+    print('{:<28}{:>14}{:>14}'.format('', 'groupby ms', 'cube ms'))
+    for level in ['manufacturer', 'category']:
+        group = cube.groups[level][0]
+        old, t_old = timeit(groupby_series, (agg_orders, items, level, group))
+        new, t_new = timeit(cube_series, (cube, level, group))
+        assert all(np.array_equal(a, b) for a, b in zip(old, new))
+        print('{:<28}{:>14.2f}{:>14.3f}'.format(level + ' series', t_old, t_new))
+
+        old, t_old = timeit(groupby_top, (agg_orders, items, level, 60, 120))
+        new, t_new = timeit(cube_top, (cube, level, 60, 120))
+        assert np.array_equal(old, new)
+        print('{:<28}{:>14.2f}{:>14.3f}'.format(level + ' top, days 60-120', t_old, t_new))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
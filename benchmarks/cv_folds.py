@@ -0,0 +1,88 @@
+"""
+Cross-validation: the 20 folds trained one after another versus concurrently
+in a process pool (training.cross_validate with n_workers > 1). The serial
+run gives LightGBM all cores, as the notebook's loop did. LightGBM results
+may change with the number of threads, so the pool's predictions are checked
+to equal those of a serial run with the pool's threads per fold, an extra
+untimed run when that is not all cores.
+
+Run from the repository root: python benchmarks/cv_folds.py [n_workers] [threads] [n_items]
+"""
+
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from training import NUM_FOLDS, asymmetric_mse, cross_validate
+
+N_DAYS = 166
+N_FEATURES = 60
+LGB_PARAMS = {
+    'boosting_type':    'goss',
+    'objective':        asymmetric_mse,
+    'metrics':          'None',
+    'n_estimators':     200,
+    'learning_rate':    0.1,
+    'bagging_fraction': 0.8,
+    'feature_fraction': 0.8,
+    'lambda_l1':        0.1,
+    'lambda_l2':        0.1,
+    'verbosity':        -1,
+    'random_state':     23,
+}
+LGB_CLASSIFIER_PARAMS = dict(LGB_PARAMS, objective = 'binary', metrics = 'logloss')
+
+
+def synthetic(n_items, seed=0):
+    rng = np.random.default_rng(seed)
+    day_of_year = np.repeat(np.arange(36, N_DAYS + 1), n_items)
+    values = rng.normal(size = (len(day_of_year), N_FEATURES))
+    y = np.maximum(np.round(3 * values[:, 0] + values[:, 1] ** 2 + rng.normal(size = len(day_of_year))), 0)
+    features = ['f{}'.format(i) for i in range(N_FEATURES)] + ['simulationPrice']
+    X = pd.DataFrame(values, columns = features[:-1])
+    X['simulationPrice'] = np.tile(rng.uniform(1, 50, n_items), N_DAYS - 35)
+    X.insert(0, 'day_of_year', day_of_year)
+    X.insert(0, 'itemID', np.tile(np.arange(1, n_items + 1), N_DAYS - 35))
+    return X, pd.Series(y), X[X['day_of_year'] == N_DAYS], features
+
+
+def run(X, y, X_test, features, n_workers, threads):
+    time_start = time.perf_counter()
+    cv = cross_validate(X, y, X_test, features, LGB_PARAMS, LGB_CLASSIFIER_PARAMS,
+                        n_workers = n_workers, threads = threads, verbose = 0)
+    return cv, time.perf_counter() - time_start
+
+
+def main(n_workers=4, threads=None, n_items=1000):
+    cores = multiprocessing.cpu_count()
+    threads = threads or max(1, cores // n_workers)
+    X, y, X_test, features = synthetic(n_items)
+
+    # quiet the per-fold lines of all runs
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        serial, t_serial = run(X, y, X_test, features, 1, cores)
+        parallel, t_parallel = run(X, y, X_test, features, n_workers, threads)
+        reference = serial if threads == cores else run(X, y, X_test, features, 1, threads)[0]
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    for key in ['preds_oof', 'reals_oof', 'prices_oof', 'preds_test']:
+        np.testing.assert_array_equal(parallel[key], reference[key])
+    pd.testing.assert_frame_equal(parallel['importances'], reference['importances'])
+
+    print('{} folds, {} rows x {} features, {} cores'.format(NUM_FOLDS, len(X), len(features), cores))
+    print('{:<44}{:>10}'.format('schedule', 'seconds'))
+    print('{:<44}{:>10.2f}'.format('serial, 1 fold x {} threads (all cores)'.format(cores), t_serial))
+    print('{:<44}{:>10.2f}'.format('pool, {} folds x {} threads'.format(n_workers, threads), t_parallel))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:4]])
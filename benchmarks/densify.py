@@ -0,0 +1,96 @@
+"""
+Densification of the item x day grid: the notebook's unique/unstack/stack cells
+versus DenseGrid.from_orders, timed and with peak traced memory.
+
+Run from the repository root: python benchmarks/densify.py [n_items]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grid import DenseGrid
+
+N_DAYS = 180
+
+
+def synthetic(n_items, density=0.3, seed=0):
+    rng = np.random.default_rng(seed)
+    item_ids = np.arange(1, n_items + 1).astype(str).astype(object)
+    sold = rng.random((n_items, N_DAYS)) < density
+    sold[:n_items // 20] = False
+    rows, cols = np.nonzero(sold)
+    orders = pd.DataFrame({'itemID': item_ids[rows], 'day_of_year': cols + 1,
+                           'order': rng.integers(1, 9, len(rows))})
+    orders_price = pd.DataFrame({'itemID': item_ids[rows], 'day_of_year': cols + 1,
+                                 'salesPrice': rng.uniform(0.3, 60, n_items)[rows] * rng.uniform(0.9, 1.1, len(rows))})
+    items = pd.DataFrame({'itemID': item_ids, 'simulationPrice': rng.uniform(1, 60, n_items).round(2)})
+    return orders, orders_price, items
+
+
+def cells(orders, orders_price, items):
+    # The notebook's two cells; unique() yields one-element arrays that the int cast unwraps
+    missing_itemIDs = set(items['itemID'].unique()) - set(orders['itemID'].unique())
+    missing_rows = pd.DataFrame({'itemID':      list(missing_itemIDs),
+                                 'day_of_year': np.ones(len(missing_itemIDs)).astype('int'),
+                                 'order':       np.zeros(len(missing_itemIDs)).astype('int')})
+    orders = pd.concat([orders, missing_rows], axis = 0)
+    agg_orders = orders.groupby(['itemID', 'day_of_year']).order.unique().unstack('day_of_year').stack('day_of_year', future_stack = True)
+    agg_orders = agg_orders.reset_index()
+    agg_orders.columns = ['itemID', 'day_of_year', 'order']
+    agg_orders['order'] = agg_orders['order'].fillna(0).map(lambda v: int(np.asarray(v).ravel()[0])).astype(int)
+
+    missing_rows = pd.DataFrame({'itemID':      list(missing_itemIDs),
+                                 'day_of_year': np.ones(len(missing_itemIDs)).astype('int'),
+                                 'salesPrice':  np.zeros(len(missing_itemIDs)).astype('int')})
+    orders_price = pd.concat([orders_price, missing_rows], axis = 0)
+    agg_orders_price = orders_price.groupby(['itemID', 'day_of_year']).salesPrice.unique().unstack('day_of_year').stack('day_of_year', future_stack = True)
+    agg_orders_price = agg_orders_price.reset_index()
+    agg_orders_price.columns = ['itemID', 'day_of_year', 'salesPrice']
+    agg_orders_price['salesPrice'] = agg_orders_price['salesPrice'].fillna(0).map(lambda v: int(np.asarray(v).ravel()[0])).astype(float)
+    agg_orders_price.loc[agg_orders_price['salesPrice'] == 0, 'salesPrice'] = np.nan
+    agg_orders_price['salesPrice'] = agg_orders_price.groupby(['itemID']).salesPrice.ffill()
+    agg_orders_price['salesPrice'] = agg_orders_price.groupby(['itemID']).salesPrice.bfill()
+    agg_orders_price = agg_orders_price.merge(items[['itemID', 'simulationPrice']], how = 'left', on = 'itemID')
+    missing = agg_orders_price['salesPrice'].isnull()
+    agg_orders_price.loc[missing, 'salesPrice'] = agg_orders_price.loc[missing, 'simulationPrice']
+    del agg_orders_price['simulationPrice']
+    return agg_orders.merge(agg_orders_price, how = 'left', on = ['itemID', 'day_of_year'])
+
+
+def densify(orders, orders_price, items):
+    return DenseGrid.from_orders(orders, orders_price, items).to_long()
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    time_start = time.perf_counter()
+    out = func(*args)
+    elapsed = time.perf_counter() - time_start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, elapsed, peak / 2 ** 20
+
+
+if __name__ == '__main__':
+    n_items = int(sys.argv[1]) if len(sys.argv) > 1 else 10463
+    inputs = synthetic(n_items)
+    print('{} items x {} days, {} sold item-days'.format(n_items, N_DAYS, len(inputs[0])))
+
+    looped, loop_time, loop_peak = measure(cells, *inputs)
+    dense, dense_time, dense_peak = measure(densify, *inputs)
+    grid, grid_time, grid_peak = measure(DenseGrid.from_orders, *inputs)
+
+    assert np.array_equal(looped['order'].values, dense['order'].values)
+    assert np.allclose(looped['salesPrice'].values, dense['salesPrice'].values)
+
+    print('{:<28}{:>10}{:>16}'.format('', 'time (s)', 'peak (MB)'))
+    print('{:<28}{:>10.2f}{:>16.1f}'.format('notebook cells', loop_time, loop_peak))
+    print('{:<28}{:>10.2f}{:>16.1f}'.format('from_orders + to_long', dense_time, dense_peak))
+    print('{:<28}{:>10.2f}{:>16.1f}'.format('from_orders (grid only)', grid_time, grid_peak))
@@ -0,0 +1,63 @@
+"""
+Payload of the daily charts: every day of the history, as the charts were
+sent before, versus daily_figure's window of the days in view, for growing
+histories.
+
+For each history length the default view (the first 61 days) and the whole
+history zoomed out are measured: the number of points sent, the size of
+the figure JSON and the time to build and serialize it.
+
+Run from the repository root: python benchmarks/downsample.py
+"""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from plotly.utils import PlotlyJSONEncoder
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from downsample import view_days
+
+
+def synthetic(n_days, seed=0):
+    rng = np.random.default_rng(seed)
+    days = np.arange(1, n_days + 1)
+    return pd.DataFrame({'day_of_year': days,
+                         'order':       rng.poisson(3000 + 1000 * np.sin(days / 30)),
+                         'salesPrice':  40 + 10 * np.sin(days / 45) + rng.normal(0, 3, n_days)})
+
+
+def every_day(day, first, last):
+    # The figure as sent before: the same layout, all days in the traces
+    fig = app.daily_figure(day.iloc[:1], first, last, '', '')
+    fig.data[0].update(x=day['day_of_year'], y=day['order'])
+    fig.data[1].update(x=day['day_of_year'], y=day['salesPrice'])
+    return fig
+
+
+def measure(build, *args, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        payload = json.dumps(build(*args), cls=PlotlyJSONEncoder)
+    points = sum(len(trace['x']) for trace in json.loads(payload)['data'])
+    return points, len(payload) / 1024, 1000 * (time.perf_counter() - start) / repeat
+
+
+if __name__ == '__main__':
+    import app
+
+    print('{:>8}{:>12}{:>22}{:>22}'.format('days', 'view', 'every day', 'window'))
+    print('{:>8}{:>12}{:>22}{:>22}'.format('', '', 'points / KiB / ms', 'points / KiB / ms'))
+    for n_days in [180, 730, 3650, 18250]:
+        day = synthetic(n_days)
+        for name, relayout_data in [('default', None), ('all', {'xaxis.autorange': True})]:
+            first, last = view_days(relayout_data, day['day_of_year'])
+            old = measure(every_day, day, first, last)
+            new = measure(app.daily_figure, day, first, last, '', '')
+            print('{:>8}{:>12}{:>22}{:>22}'.format(n_days, name, '{} / {:.0f} / {:.1f}'.format(*old),
+                                                   '{} / {:.0f} / {:.1f}'.format(*new)))
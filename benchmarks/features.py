@@ -0,0 +1,120 @@
+"""
+Window features: the notebook's per-day loop versus features.build_features.
+
+The loop is timed on a few days and extrapolated to all feature days; its
+rows are checked against the vectorized ones for those days.
+
+Run from the repository root: python benchmarks/features.py [n_items]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from features import DAYS_INPUT, DAYS_TARGET, build_features, feature_days
+from grid import DenseGrid
+
+N_DAYS = 180
+SAMPLE_DAYS = [1, 40, 120, 166, 180]
+
+
+def synthetic(n_items, seed=0):
+    rng = np.random.default_rng(seed)
+    orders = rng.poisson(1, (n_items, N_DAYS)) * rng.integers(0, 3, (n_items, N_DAYS))
+    prices = np.round(rng.uniform(1, 50, (n_items, 1)) * rng.uniform(0.8, 1.2, (n_items, N_DAYS)), 2)
+    promotion = (rng.random((n_items, N_DAYS)) < 0.02).astype('int8')
+    grid = DenseGrid(np.arange(1, n_items + 1), np.arange(1, N_DAYS + 1), orders, prices, promotion)
+    items = pd.DataFrame({'itemID':          grid.item_ids,
+                          'manufacturer':    rng.integers(1, 200, n_items),
+                          'category':        rng.integers(1, 50, n_items),
+                          'simulationPrice': prices[:, -1]})
+    return grid, items
+
+
+def loop_day(agg_orders, items, day_of_year, days_input=DAYS_INPUT, days_target=DAYS_TARGET):
+    # One iteration of the notebook's loop, without the tsfresh features
+    target_day_min = day_of_year + 1
+    target_day_max = day_of_year + days_target
+    if day_of_year < agg_orders['day_of_year'].max():
+        window = agg_orders[(agg_orders['day_of_year'] >= target_day_min) &
+                            (agg_orders['day_of_year'] <= target_day_max)]
+        tmp_df = window.groupby('itemID')[['order', 'promotion']].agg('sum').reset_index()
+        tmp_df.columns = ['itemID', 'target', 'promo_in_test']
+        tmp_df['mean_price_test'] = window.groupby('itemID')['salesPrice'].agg('mean').reset_index()['salesPrice']
+        tmp_df = tmp_df.merge(items[['itemID', 'manufacturer', 'category']], how = 'left', on = 'itemID')
+        for level in ['manufacturer', 'category']:
+            tmp = window.groupby(level)['salesPrice'].agg('mean').reset_index()
+            tmp.columns = [level, 'mean_price_test_' + level]
+            tmp_df = tmp_df.merge(tmp, how = 'left', on = level)
+        for level in ['manufacturer', 'category']:
+            tmp = window.groupby(level)['promotion'].agg('sum').reset_index()
+            tmp.columns = [level, 'promo_in_test_' + level]
+            tmp_df = tmp_df.merge(tmp, how = 'left', on = level)
+    else:
+        tmp_df = pd.DataFrame({'itemID':                     items.itemID,
+                               'target':                     np.nan,
+                               'promo_in_test':              np.nan,
+                               'mean_price_test':            items.simulationPrice,
+                               'manufacturer':               items.manufacturer,
+                               'category':                   items.category,
+                               'promo_in_test_manufacturer': np.nan,
+                               'promo_in_test_category':     np.nan})
+
+    for day_input in days_input:
+        k = str(day_input)
+        window = agg_orders[(agg_orders['day_of_year'] >= day_of_year - day_input + 1) &
+                            (agg_orders['day_of_year'] <= day_of_year)]
+        grouped = window.groupby('itemID')
+        tmp_df['order_sum_last_' + k] = grouped['order'].agg('sum').reset_index()['order']
+        tmp_df['order_count_last_' + k] = grouped['order'].agg(lambda x: len(x[x > 0])).reset_index()['order']
+        tmp_df['promo_count_last_' + k] = grouped['promotion'].agg('sum').reset_index()['promotion']
+        tmp_df['mean_price_last_' + k] = grouped['salesPrice'].agg('mean').reset_index()['salesPrice']
+        for level in ['manufacturer', 'category']:
+            grouped = window.groupby(level)
+            tmp = grouped['order'].agg('sum').reset_index()
+            tmp.columns = [level, 'order_' + level + '_sum_last_' + k]
+            tmp['order_' + level + '_count_last_' + k] = grouped['order'].agg(lambda x: len(x[x > 0])).reset_index()['order']
+            tmp['promo_' + level + '_count_last_' + k] = grouped['promotion'].agg('sum').reset_index()['promotion']
+            tmp_df = tmp_df.merge(tmp, how = 'left', on = level)
+        tmp_df['order_all_sum_last_' + k] = window['order'].agg('sum')
+        tmp_df['order_all_count_last_' + k] = window['order'].agg(lambda x: len(x[x > 0]))
+        tmp_df['promo_all_count_last_' + k] = window['promotion'].agg('sum')
+        if day_input == max(days_input):
+            grouped = window[window['order'] > 0].groupby('itemID')
+            since = (day_of_year - grouped['day_of_year'].agg('max')).reindex(tmp_df.itemID)
+            tmp_df['days_since_last_order'] = since.fillna(day_input).values
+
+    tmp_df.insert(1, column = 'day_of_year', value = day_of_year)
+    return tmp_df.drop(columns = ['manufacturer', 'category'])
+
+
+if __name__ == '__main__':
+    n_items = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    grid, items = synthetic(n_items)
+    agg_orders = grid.to_long().merge(items[['itemID', 'manufacturer', 'category']], how = 'left')
+    days = feature_days(grid)
+
+    time_start = time.perf_counter()
+    looped = pd.concat([loop_day(agg_orders, items, day) for day in SAMPLE_DAYS])
+    loop_time = (time.perf_counter() - time_start) * len(days) / len(SAMPLE_DAYS)
+
+    time_start = time.perf_counter()
+    features = build_features(grid, items)
+    vectorized_time = time.perf_counter() - time_start
+
+    sample = features[features['day_of_year'].isin(SAMPLE_DAYS)]
+    key = ['day_of_year', 'itemID']
+    looped = looped.sort_values(key).reset_index(drop=True)
+    sample = sample.sort_values(key).reset_index(drop=True)
+    assert list(looped.columns) == list(sample.columns)
+    assert np.allclose(looped.to_numpy(dtype='float'), sample.to_numpy(dtype='float'), equal_nan=True)
+
+    print('{} items x {} feature days, {} columns'.format(n_items, len(days), features.shape[1]))
+    print('loop:       {:10.1f} s (extrapolated from {} days)'.format(loop_time, len(SAMPLE_DAYS)))
+    print('vectorized: {:10.1f} s'.format(vectorized_time))
+    print('speed-up:   {:10.0f}x'.format(loop_time / vectorized_time))
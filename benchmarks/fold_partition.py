@@ -0,0 +1,95 @@
+"""
+Fold partitioning: the notebook's per-fold lists of row labels and iloc
+copies of the feature frame versus contiguous row ranges of the day-sorted
+float32 matrix written by training.share_arrays.
+
+Time and memory allocated are summed over the 20 folds, for the partitioning
+alone (no training). Both must select the same rows.
+
+Run from the repository root: python benchmarks/fold_partition.py [n_items] [n_features]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from training import NUM_FOLDS, TEST_DAYS, _load_shared, fold_rows, fold_windows, share_arrays
+
+N_DAYS = 166
+
+
+def synthetic(n_items, n_features, seed=0):
+    rng = np.random.default_rng(seed)
+    day_of_year = np.repeat(np.arange(36, N_DAYS + 1), n_items)
+    features = ['f{}'.format(i) for i in range(n_features - 1)] + ['simulationPrice']
+    X = pd.DataFrame(rng.normal(size = (len(day_of_year), n_features)), columns = features)
+    X.insert(0, 'day_of_year', day_of_year)
+    X.insert(0, 'itemID', np.tile(np.arange(1, n_items + 1), N_DAYS - 35))
+    y = pd.Series(rng.poisson(2, len(X)).astype('float'))
+    return X, y, X[X['day_of_year'] == N_DAYS], features
+
+
+def loop_partition(X, y, X_test, features):
+    # The notebook's partitioning, without the training
+    train_idx, valid_idx, sizes = [], [], []
+    for fold, (t_start, t_end, v_start, v_end) in enumerate(fold_windows(X['day_of_year'].max(), NUM_FOLDS, TEST_DAYS)):
+        train_idx.append(list(X[(X.day_of_year >= t_start) & (X.day_of_year <= t_end)].index))
+        valid_idx.append(list(X[(X.day_of_year >= v_start) & (X.day_of_year <= v_end)].index))
+        X_train, y_train = X.iloc[train_idx[fold]][features], y.iloc[train_idx[fold]]
+        X_valid, y_valid = X.iloc[valid_idx[fold]][features], y.iloc[valid_idx[fold]]
+        X_test = X_test[features]
+        sizes.append((X_train.shape, X_valid.shape, float(X_valid.iloc[0, 0])))
+    return sizes
+
+
+def slice_partition(directory, features):
+    data = _load_shared(directory)
+    sizes = []
+    for window in fold_windows(int(data['day_of_year'][-1]), NUM_FOLDS, TEST_DAYS):
+        train_rows, valid_rows = fold_rows(data['day_of_year'], window)
+        X_train, y_train = data['X'][train_rows], data['y'][train_rows]
+        X_valid, y_valid = data['X'][valid_rows], data['y'][valid_rows]
+        sizes.append((X_train.shape, X_valid.shape, float(X_valid[0, 0])))
+    return sizes
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    time_start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - time_start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 2 ** 20
+
+
+def main(n_items=2000, n_features=200):
+    X, y, X_test, features = synthetic(n_items, n_features)
+
+    loop_sizes, t_loop, mem_loop = measure(loop_partition, X, y, X_test, features)
+    with tempfile.TemporaryDirectory() as directory:
+        time_start = time.perf_counter()
+        share_arrays(directory, X, y, X_test, features)
+        t_share = time.perf_counter() - time_start
+        slice_sizes, t_slice, mem_slice = measure(slice_partition, directory, features)
+
+    for (train_a, valid_a, first_a), (train_b, valid_b, first_b) in zip(loop_sizes, slice_sizes):
+        assert train_a == train_b and valid_a == valid_b
+        assert np.float32(first_a) == np.float32(first_b)
+
+    print('{} folds, {} rows x {} features'.format(NUM_FOLDS, len(X), len(features)))
+    print('{:<32}{:>10}{:>14}'.format('partitioning', 'seconds', 'peak MiB'))
+    print('{:<32}{:>10.2f}{:>14.1f}'.format('label lists + iloc copies', t_loop, mem_loop))
+    print('{:<32}{:>10.2f}{:>14}'.format('share_arrays (once)', t_share, '-'))
+    print('{:<32}{:>10.4f}{:>14.1f}'.format('row ranges of shared matrix', t_slice, mem_slice))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
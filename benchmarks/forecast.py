@@ -0,0 +1,82 @@
+"""
+Batch scoring: items scored one at a time through the saved boosters versus
+Forecaster scoring the whole test matrix in batches.
+
+Twenty regressors and a classifier are trained on synthetic features and
+saved as the notebook saves them. Both ways must give the same forecasts.
+
+Run from the repository root: python benchmarks/forecast.py [n_items] [n_features] [n_trees]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from forecast import Forecaster
+from training import NUM_FOLDS, postprocess_preds
+
+
+def synthetic(n_items, n_features, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size = (n_items, n_features)).astype('float32')
+    y = np.maximum(X[:, :5].sum(axis = 1) + rng.normal(size = n_items), 0) ** 2
+    df = pd.DataFrame(X, columns = ['f{}'.format(i) for i in range(n_features)])
+    df.insert(0, 'day_of_year', 166)
+    df.insert(0, 'itemID', np.arange(1, n_items + 1))
+    return df, y
+
+
+def save_models(directory, df, y, n_trees):
+    X = df.drop(columns = ['itemID', 'day_of_year'])
+    params = {'n_estimators': n_trees, 'verbosity': -1}
+    classifier = lgb.LGBMClassifier(**params).fit(X, (y > 0).astype('float'))
+    classifier.booster_.save_model(os.path.join(directory, 'clf.txt'))
+    for fold in range(NUM_FOLDS):
+        rows = np.random.default_rng(fold).random(len(X)) < 0.8
+        regressor = lgb.LGBMRegressor(random_state = fold, **params).fit(X[rows], np.sqrt(y[rows]))
+        regressor.booster_.save_model(os.path.join(directory, 'reg_fold_{}.txt'.format(fold + 1)))
+
+
+def item_loop(forecaster, X):
+    # one item at a time, the way a per-request scorer would
+    preds = []
+    for row in X:
+        row = row[None, :]
+        pred = sum(postprocess_preds(regressor.predict(row) ** 2) / len(forecaster.regressors)
+                   for regressor in forecaster.regressors)
+        preds.append(pred * np.round(forecaster.classifier.predict(row)))
+    return np.concatenate(preds)
+
+
+def main(n_items=10463, n_features=300, n_trees=200):
+    df, y = synthetic(n_items, n_features)
+    with tempfile.TemporaryDirectory() as directory:
+        save_models(directory, df, y, n_trees)
+        forecaster = Forecaster.load(directory)
+
+    X = forecaster.matrix(df)
+    sample = min(500, n_items)
+    time_start = time.perf_counter()
+    loop_preds = item_loop(forecaster, X[:sample])
+    t_loop = time.perf_counter() - time_start
+
+    time_start = time.perf_counter()
+    forecast = forecaster.score(df)
+    t_batch = time.perf_counter() - time_start
+    assert np.array_equal(forecast['Pred'].to_numpy()[:sample], loop_preds)
+
+    print('{} items, {} regressors of {} trees, {} features'.format(n_items, NUM_FOLDS, n_trees, n_features))
+    print('{:<28}{:>14}'.format('', 'items/s'))
+    print('{:<28}{:>14.0f}'.format('one item at a time', sample / t_loop))
+    print('{:<28}{:>14.0f}'.format('Forecaster.score', n_items / t_batch))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:4]])
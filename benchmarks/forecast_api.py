@@ -0,0 +1,142 @@
+"""
+Load test of the forecast API: concurrent clients requesting single items
+over keep-alive connections, reporting latency percentiles and throughput.
+
+Without a URL, twenty regressors and a classifier are trained on synthetic
+features, written with a feature store, and served by a threaded local
+server, micro-batched with and without a wait window and scoring every
+request on its own.
+With a URL, the running server is load-tested instead.
+
+Run from the repository root:
+    python benchmarks/forecast_api.py [--url http://host:port] [--items N] [--requests N]
+"""
+
+import argparse
+import http.client
+import os
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flask
+import lightgbm as lgb
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from forecast import FeatureStore, Forecaster
+from forecast_service import ForecastService, register
+from training import NUM_FOLDS
+
+
+def save_models(directory, n_items, n_features, n_trees, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size = (n_items, n_features)).astype('float32')
+    y = np.maximum(X[:, :5].sum(axis = 1) + rng.normal(size = n_items), 0) ** 2
+    features = ['f{}'.format(i) for i in range(n_features)]
+    params = {'n_estimators': n_trees, 'verbosity': -1}
+
+    lgb.LGBMClassifier(**params).fit(pd.DataFrame(X, columns = features), (y > 0).astype('float')) \
+        .booster_.save_model(os.path.join(directory, 'clf.txt'))
+    for fold in range(NUM_FOLDS):
+        rows = np.random.default_rng(fold).random(n_items) < 0.8
+        lgb.LGBMRegressor(random_state = fold, **params).fit(pd.DataFrame(X[rows], columns = features),
+                                                             np.sqrt(y[rows])) \
+            .booster_.save_model(os.path.join(directory, 'reg_fold_{}.txt'.format(fold + 1)))
+
+    df = pd.DataFrame(X, columns = features)
+    df.insert(0, 'simulationPrice', rng.uniform(1, 50, n_items))
+    df.insert(0, 'day_of_year', 166)
+    df.insert(0, 'itemID', np.arange(1, n_items + 1))
+    FeatureStore.write(os.path.join(directory, 'features'), df, Forecaster.load(directory))
+
+
+def client(url, item_ids, latencies):
+    target = urlparse(url)
+    connection = http.client.HTTPConnection(target.hostname, target.port)
+    for item in item_ids:
+        time_start = time.perf_counter()
+        connection.request('GET', '{}?itemID={}'.format(target.path, item))
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - time_start)
+        if response.status != 200:
+            raise RuntimeError('{} answered {}'.format(url, response.status))
+    connection.close()
+
+
+def load_test(url, n_items, n_requests, concurrency, seed=0):
+    rng = np.random.default_rng(seed)
+    latencies = [[] for _ in range(concurrency)]
+    threads = [threading.Thread(target = client,
+                                args = (url, rng.integers(1, n_items + 1, n_requests // concurrency), latencies[i]))
+               for i in range(concurrency)]
+    time_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - time_start
+    latencies = 1000 * np.concatenate(latencies)
+    return {'concurrency': concurrency, 'requests/s': len(latencies) / elapsed,
+            'p50 ms': np.percentile(latencies, 50), 'p99 ms': np.percentile(latencies, 99)}
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def serve(service):
+    server = flask.Flask(__name__)
+    register(server, service)
+    http_server = make_server('127.0.0.1', 0, server, threaded = True, request_handler = QuietHandler)
+    threading.Thread(target = http_server.serve_forever, daemon = True).start()
+    return http_server, 'http://127.0.0.1:{}/api/forecast'.format(http_server.server_port)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', help = 'forecast endpoint of a running server')
+    parser.add_argument('--items', type = int, default = 10463)
+    parser.add_argument('--requests', type = int, default = 2000)
+    parser.add_argument('--features', type = int, default = 300)
+    parser.add_argument('--trees', type = int, default = 200)
+    args = parser.parse_args()
+    levels = [1, 4, 16]
+
+    if args.url:
+        rows = [load_test(args.url, args.items, args.requests, level) for level in levels]
+        print(pd.DataFrame(rows).round(2).to_string(index = False))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        save_models(directory, args.items, args.features, args.trees)
+        rows = []
+        for name, max_batch, max_wait in [('micro-batched, 0.5 ms window', 256, 0.0005),
+                                          ('micro-batched, no window', 256, 0),
+                                          ('one request per predict', 1, 0)]:
+            service = ForecastService(directory, os.path.join(directory, 'features'),
+                                      max_batch = max_batch, max_wait = max_wait)
+            service.warm()
+            http_server, url = serve(service)
+            for level in levels:
+                rows.append(dict(load_test(url, args.items, args.requests, level), mode = name,
+                                 rows_per_batch = service.batcher.requests / max(service.batcher.batches, 1)))
+                service.batcher.batches = service.batcher.requests = 0
+            http_server.shutdown()
+
+    print('{} items, {} regressors of {} trees, {} features, {} requests per level'.format(
+        args.items, NUM_FOLDS, args.trees, args.features, args.requests))
+    print(pd.DataFrame(rows)[['mode', 'concurrency', 'requests/s', 'p50 ms', 'p99 ms', 'rows_per_batch']]
+          .round(2).to_string(index = False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Callback responses under concurrent load: Flask-Compress as before, versus
+CallbackHTTPCache, for clients that do and do not revalidate.
+
+Several threads post item and rollup chart callbacks to a local server,
+choosing among a fixed set of selections so that the figure cache is warm,
+as it is for the popular items of a running dashboard. Reported per mode
+are the requests per second, the latency percentiles and the mean bytes on
+the wire per response.
+
+- flask-compress: the app's callbacks, gzipped per request by Flask-Compress.
+- http cache: compressed by CallbackHTTPCache, Brotli when accepted.
+- http cache, revalidated: clients resend the ETag of their last response
+  to the same request.
+
+Run from the repository root: python benchmarks/http_cache.py [threads] [requests per thread]
+"""
+
+import http.client
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['FIGURE_CACHE_DIR'] = tempfile.mkdtemp()
+
+import app
+
+N_SELECTIONS = 40
+
+
+def callback_body(output, inputs):
+    # the body dash-renderer posts for a callback with a single output
+    component, prop = output.split('.')
+    return json.dumps({
+        'output': output,
+        'outputs': {'id': component, 'property': prop},
+        'inputs': [{'id': i.split('.')[0], 'property': i.split('.')[1], 'value': value} for i, value in inputs],
+        'changedPropIds': [inputs[0][0]],
+    }).encode()
+
+
+def bodies(seed=0):
+    rng = np.random.default_rng(seed)
+    items = [int(i) for i in rng.choice(app.item_list, N_SELECTIONS // 2)]
+    manufacturers = [int(m) for m in rng.choice(app.rollup_cube.groups['manufacturer'], N_SELECTIONS // 2)]
+    return ([callback_body('item-month-chart.figure', [('item-id-dropdown.value', i)]) for i in items]
+            + [callback_body('rollup-daily-chart.figure', [('rollup-level-dropdown.value', 'manufacturer'),
+                                                           ('rollup-group-dropdown.value', m),
+                                                           ('rollup-window-dropdown.value', 7)])
+               for m in manufacturers])
+
+
+def client(port, requests, n_requests, accept_encoding, revalidate, seed, results):
+    rng = np.random.default_rng(seed)
+    etags = {}
+    for index in rng.integers(0, len(requests), n_requests):
+        headers = {'Content-Type': 'application/json', 'Accept-Encoding': accept_encoding}
+        if revalidate and index in etags:
+            headers['If-None-Match'] = etags[index]
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        start = time.perf_counter()
+        connection.request('POST', '/_dash-update-component', body=requests[index], headers=headers)
+        response = connection.getresponse()
+        size = len(response.read())
+        results.append((time.perf_counter() - start, size, response.status))
+        if response.getheader('ETag'):
+            etags[index] = response.getheader('ETag')
+        connection.close()
+
+
+def load(port, requests, n_threads, n_requests, accept_encoding, revalidate=False):
+    results = []
+    threads = [threading.Thread(target=client, args=(port, requests, n_requests, accept_encoding, revalidate,
+                                                     seed, results))
+               for seed in range(n_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latency = 1000 * np.array([result[0] for result in results])
+    statuses = {status for _, _, status in results}
+    return (len(results) / elapsed, np.percentile(latency, 50), np.percentile(latency, 95),
+            np.mean([result[1] for result in results]) / 1024, statuses)
+
+
+def main(n_threads=8, n_requests=100):
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app.server, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+    requests = bodies()
+
+    # warm the figure cache, so that every mode serves the same cached figures
+    load(port, requests, 1, 4 * len(requests), 'identity')
+    hooks = app.server.after_request_funcs[None]
+
+    print('{} threads x {} requests over {} selections'.format(n_threads, n_requests, len(requests)))
+    print('{:<44}{:>10}{:>10}{:>10}{:>12}  {}'.format('', 'req/s', 'p50 ms', 'p95 ms', 'KiB/resp', 'status'))
+    for accept_encoding in ['identity', 'gzip', 'gzip, deflate, br']:
+        hooks.remove(app.callback_http.after_request)
+        row = load(port, requests, n_threads, n_requests, accept_encoding)
+        hooks.append(app.callback_http.after_request)
+        print('{:<44}{:>10.1f}{:>10.2f}{:>10.2f}{:>12.1f}  {}'.format(
+            'flask-compress ({})'.format(accept_encoding), *row))
+        for name, revalidate in [('http cache', False), ('http cache, revalidated', True)]:
+            row = load(port, requests, n_threads, n_requests, accept_encoding, revalidate)
+            print('{:<44}{:>10.1f}{:>10.2f}{:>10.2f}{:>12.1f}  {}'.format(
+                '{} ({})'.format(name, accept_encoding), *row))
+
+    print()
+    print('http cache:', app.callback_http.stats())
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
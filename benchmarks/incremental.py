@@ -0,0 +1,72 @@
+"""
+Appending one day of orders: a full rebuild (densify every order, label the
+promotions of the whole series, build the rows of every day) versus
+IncrementalFeatures.append_day, for histories of growing length.
+
+The rebuild grows with the history, the append does not. The two rows per
+item the append builds must equal those of the rebuild.
+
+Run from the repository root: python benchmarks/incremental.py [n_items]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from features import DAYS_TARGET, build_features
+from grid import DenseGrid
+from incremental import IncrementalFeatures
+from promotions import detect_promotions
+
+
+def synthetic(n_items, n_days, seed=0):
+    rng = np.random.default_rng(seed)
+    items = pd.DataFrame({'itemID': np.arange(1, n_items + 1),
+                          'manufacturer': rng.integers(0, 200, n_items),
+                          'category': rng.integers(0, 8, n_items),
+                          'simulationPrice': rng.uniform(5, 50, n_items)})
+    # about one sale in five item-days, with rare large orders
+    sold = rng.random((n_items, n_days)) < 0.2
+    item_codes, day_codes = np.nonzero(sold)
+    orders = pd.DataFrame({'itemID': item_codes + 1, 'day_of_year': day_codes + 1,
+                           'order': rng.poisson(3, len(item_codes)) + 40 * (rng.random(len(item_codes)) < 0.02)})
+    orders_price = pd.DataFrame({'itemID': orders['itemID'], 'day_of_year': orders['day_of_year'],
+                                 'salesPrice': rng.uniform(5, 50, len(item_codes))})
+    return items, orders, orders_price
+
+
+def rebuild(items, orders, orders_price, last):
+    grid = DenseGrid.from_orders(orders[orders['day_of_year'] <= last],
+                                 orders_price[orders_price['day_of_year'] <= last], items)
+    grid.promotion = detect_promotions(grid.orders)
+    return grid, build_features(grid, items)
+
+
+def main(n_items=2000):
+    print('{} items, seconds to add one day'.format(n_items))
+    print('{:>8}{:>14}{:>14}'.format('days', 'rebuild', 'append_day'))
+    for n_days in [60, 120, 240, 480]:
+        items, orders, orders_price = synthetic(n_items, n_days + 1)
+        state = IncrementalFeatures(rebuild(items, orders, orders_price, n_days)[0], items)
+
+        time_start = time.perf_counter()
+        grid, table = rebuild(items, orders, orders_price, n_days + 1)
+        t_rebuild = time.perf_counter() - time_start
+
+        time_start = time.perf_counter()
+        rows = state.append_day(orders, orders_price)
+        t_append = time.perf_counter() - time_start
+
+        days = [n_days + 1 - DAYS_TARGET, n_days + 1]
+        expected = table[table['day_of_year'].isin(days)].reset_index(drop=True)
+        pd.testing.assert_frame_equal(rows, expected, check_dtype=False)
+        print('{:>8}{:>14.3f}{:>14.3f}'.format(n_days, t_rebuild, t_append))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,86 @@
+"""
+Ingestion of the raw transactions: the notebook's read_csv, to_datetime and
+groupby cells versus stream_orders, timed and with peak traced memory.
+
+A synthetic orders.csv in the DMC format (time|transactID|itemID|order|salesPrice)
+is written to a temporary directory. Both ways must give the same orders
+and, up to float rounding, the same mean prices.
+
+Run from the repository root: python benchmarks/ingest.py [n_transactions] [n_items]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import stream_orders
+
+N_DAYS = 180
+
+
+def write_orders(path, n_transactions, n_items, seed=0):
+    rng = np.random.default_rng(seed)
+    seconds = np.sort(rng.integers(0, N_DAYS * 86400, n_transactions))
+    # a few items sell most, as in the DMC data
+    popularity = 1 / np.arange(10, n_items + 10)
+    items = rng.choice(n_items, n_transactions, p = popularity / popularity.sum()) + 1
+    orders = pd.DataFrame({'time':       (pd.Timestamp('2018-01-01') + pd.to_timedelta(seconds, unit = 's'))
+                                         .strftime('%Y-%m-%d %H:%M:%S'),
+                           'transactID': np.arange(n_transactions),
+                           'itemID':     items,
+                           'order':      rng.integers(1, 5, n_transactions),
+                           'salesPrice': (rng.uniform(0.3, 60, n_items + 1)[items]
+                                          * rng.uniform(0.9, 1.1, n_transactions)).round(2)})
+    orders.to_csv(path, sep = '|', index = False)
+
+
+def cells(path, item_ids):
+    # The notebook's cells: read everything, convert the time twice, group
+    orders = pd.read_csv(path, sep = '|')
+    orders['time'] = pd.to_datetime(orders['time'].astype('str'))
+    orders['time'] = pd.to_datetime(orders['time'].astype('str'))
+    orders['day_of_year'] = orders['time'].dt.dayofyear
+    orders_price = orders.groupby(['itemID', 'day_of_year'])['salesPrice'].agg('mean').reset_index()
+    orders = orders.groupby(['itemID', 'day_of_year'])['order'].agg('sum').reset_index()
+    return orders, orders_price
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    time_start = time.perf_counter()
+    out = func(*args)
+    elapsed = time.perf_counter() - time_start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, elapsed, peak / 2 ** 20
+
+
+def main(n_transactions=2000000, n_items=10463):
+    item_ids = np.arange(1, n_items + 1)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'orders.csv')
+        write_orders(path, n_transactions, n_items)
+        size = os.path.getsize(path) / 2 ** 20
+        (orders, orders_price), t_cells, m_cells = measure(cells, path, item_ids)
+        (stream, stream_price), t_stream, m_stream = measure(stream_orders, path, item_ids)
+
+    pd.testing.assert_frame_equal(stream, orders, check_dtype = False)
+    pd.testing.assert_frame_equal(stream_price, orders_price, check_dtype = False, rtol = 1e-12)
+    truncated = (np.trunc(stream_price['salesPrice']) != np.trunc(orders_price['salesPrice'])).sum()
+
+    print('{} transactions ({:.0f} MiB), {} items, {} item days'.format(n_transactions, size, n_items, len(orders)))
+    print('{:<24}{:>10}{:>16}'.format('', 'seconds', 'peak MiB'))
+    print('{:<24}{:>10.2f}{:>16.1f}'.format('notebook cells', t_cells, m_cells))
+    print('{:<24}{:>10.2f}{:>16.1f}'.format('stream_orders', t_stream, m_stream))
+    print('daily prices differing after truncation: {}'.format(truncated))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
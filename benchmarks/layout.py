@@ -0,0 +1,84 @@
+"""
+Layout requests: Dash's serializer, compressed per request by
+Flask-Compress as the app served the layout before, versus the StaticLayout
+the app serves now, over HTTP on a local server.
+
+For each Accept-Encoding, the time to first byte, the time to the last
+byte and the bytes on the wire are measured, and for the StaticLayout also
+a reload that revalidates its ETag. The logo, now a static asset, was
+inlined in the layout as a data URI; its size is printed separately.
+
+Run from the repository root: python benchmarks/layout.py [requests]
+"""
+
+import base64
+import http.client
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['FIGURE_CACHE_DIR'] = tempfile.mkdtemp()
+
+import app
+
+DYNAMIC_ROUTE = '/_benchmark-dynamic-layout'
+
+
+def fetch(port, path, headers):
+    """
+    :param port: Port of the local server
+    :param path: Requested path
+    :param headers: Request headers
+    :return: Status, seconds to the first byte, seconds to the last byte, body bytes and response headers
+    """
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    start = time.perf_counter()
+    connection.request('GET', path, headers=headers)
+    response = connection.getresponse()
+    first_byte = time.perf_counter() - start
+    body = response.read()
+    last_byte = time.perf_counter() - start
+    connection.close()
+    return response.status, first_byte, last_byte, len(body), response.headers
+
+
+def measure(port, path, headers, repeat):
+    runs = [fetch(port, path, headers) for _ in range(repeat)]
+    status, _, _, size, response_headers = runs[-1]
+    return (status, 1000 * sum(run[1] for run in runs) / repeat, 1000 * sum(run[2] for run in runs) / repeat,
+            size, response_headers)
+
+
+def main(repeat=20):
+    # the layout as Dash served it, through Flask-Compress
+    app.server.add_url_rule(DYNAMIC_ROUTE, view_func=app.app.serve_layout, endpoint=DYNAMIC_ROUTE)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app.server, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    print('{:<34}{:>8}{:>12}{:>12}{:>12}'.format('', 'status', 'TTFB ms', 'total ms', 'KiB'))
+    for encoding in ['identity', 'gzip', 'br', 'gzip, deflate, br']:
+        headers = {'Accept-Encoding': encoding}
+        for name, path in [('dash', DYNAMIC_ROUTE), ('static', '/_dash-layout')]:
+            status, ttfb, total, size, response_headers = measure(port, path, headers, repeat)
+            print('{:<34}{:>8}{:>12.2f}{:>12.2f}{:>12.1f}'.format(
+                '{} ({})'.format(name, encoding), status, ttfb, total, size / 1024))
+        headers['If-None-Match'] = response_headers['ETag']
+        status, ttfb, total, size, _ = measure(port, '/_dash-layout', headers, repeat)
+        print('{:<34}{:>8}{:>12.2f}{:>12.2f}{:>12.1f}'.format('static, revalidated', status, ttfb, total, size / 1024))
+
+    with open(os.path.join('assets', 'ecological.png'), 'rb') as f:
+        logo = len('data:image/png;base64,') + len(base64.b64encode(f.read()))
+    print('logo data URI no longer in the layout: {:.1f} KiB'.format(logo / 1024))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
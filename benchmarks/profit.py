@@ -0,0 +1,62 @@
+"""
+Overall profit of result.csv: the notebook's per-item loop versus metrics.profit.
+
+Run from the repository root: python benchmarks/profit.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_store
+from metrics import profit
+
+
+def loop_profit(result, items):
+    # The notebook's loop, with the item price taken as a scalar
+    profits = []
+    for i in items['itemID']:
+        promotion_price = items[items['itemID'] == i]['simulationPrice'].values[0]
+        truth = result[result['itemID'] == i]['Truth'].values
+        pred = result[result['itemID'] == i]['Pred'].values
+        pred = np.where(pred > 0, pred, 0)
+        pred = np.round(pred).astype('int')
+        sale = np.minimum(truth, pred)
+
+        overstock = pred - truth
+        overstock[overstock < 0] = 0
+
+        profits.append((sale * promotion_price - overstock * promotion_price * 0.6).sum())
+    return np.array(profits)
+
+
+def vectorized_profit(result, items):
+    price = items.set_index('itemID')['simulationPrice'].reindex(result['itemID']).values
+    item_ids, item_codes = np.unique(result['itemID'].values, return_inverse=True)
+    return profit(result['Truth'].values, result['Pred'].values, price, item_codes=item_codes)
+
+
+if __name__ == '__main__':
+    result = data_store.read_csv('result')
+    items = data_store.read_csv('infos')[['itemID', 'simulationPrice']]
+    items = items[items['itemID'].isin(result['itemID'].unique())]
+    print('{} items x {} rows'.format(len(items), len(result)))
+
+    time_start = time.perf_counter()
+    loop = loop_profit(result, items)
+    loop_time = time.perf_counter() - time_start
+
+    runs = 20
+    time_start = time.perf_counter()
+    for _ in range(runs):
+        vectorized = vectorized_profit(result, items)
+    vectorized_time = (time.perf_counter() - time_start) / runs
+
+    assert np.allclose(loop, vectorized)
+    print('loop:       {:10.3f} s   total profit {:.2f}'.format(loop_time, loop.sum()))
+    print('vectorized: {:10.3f} s   total profit {:.2f}'.format(vectorized_time, vectorized.sum()))
+    print('speed-up:   {:10.0f}x'.format(loop_time / vectorized_time))
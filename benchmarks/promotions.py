@@ -0,0 +1,70 @@
+"""
+Promotion labelling: the notebook's per-item find_peaks loop versus promotions.py.
+
+The loop re-filters the full long-format frame for every item, so it is timed
+on a sample of items and extrapolated to all items; its labels are checked
+against the batched ones on that sample.
+
+Run from the repository root: python benchmarks/promotions.py [n_items ...]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.signal import find_peaks
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from promotions import label_promotions
+
+N_DAYS = 180
+SAMPLE = 50
+
+
+def synthetic_orders(n_items, seed=0):
+    rng = np.random.default_rng(seed)
+    rate = rng.uniform(0.1, 3, size=(n_items, 1))
+    orders = rng.poisson(rate, size=(n_items, N_DAYS)) * rng.integers(0, 4, size=(n_items, N_DAYS))
+    return pd.DataFrame({'itemID':      np.repeat(np.arange(1, n_items + 1), N_DAYS),
+                         'day_of_year': np.tile(np.arange(1, N_DAYS + 1), n_items),
+                         'order':       orders.ravel()})
+
+
+def loop_promotions(agg_orders, item_ids):
+    # The notebook's cell, restricted to item_ids
+    agg_orders['promotion'] = 0.0
+    for itemID in item_ids:
+        promo    = np.zeros(len(agg_orders[agg_orders['itemID'] == itemID]))
+        avg      = agg_orders[(agg_orders['itemID'] == itemID)]['order'].median()
+        std      = agg_orders[(agg_orders['itemID'] == itemID)]['order'].std()
+        peaks, _ = find_peaks(np.append(agg_orders[agg_orders['itemID'] == itemID]['order'].values, avg),
+                              prominence = max(5, std),
+                              height     = avg + 2*std)
+        promo[peaks] = 1
+        agg_orders.loc[agg_orders['itemID'] == itemID, 'promotion'] = promo
+    return agg_orders['promotion'].values
+
+
+if __name__ == '__main__':
+    counts = [int(n) for n in sys.argv[1:]] or [10000, 100000]
+    print('{:>8}{:>16}{:>16}{:>10}'.format('items', 'loop (s)', 'batched (s)', 'speed-up'))
+    for n_items in counts:
+        agg_orders = synthetic_orders(n_items)
+
+        time_start = time.perf_counter()
+        batched = label_promotions(agg_orders)
+        batched_time = time.perf_counter() - time_start
+
+        sample = np.arange(1, SAMPLE + 1)
+        time_start = time.perf_counter()
+        looped = loop_promotions(agg_orders, sample)
+        loop_time = (time.perf_counter() - time_start) * n_items / SAMPLE
+
+        rows = agg_orders['itemID'].isin(sample).values
+        assert np.array_equal(looped[rows], batched[rows])
+
+        print('{:>8}{:>15.1f}*{:>16.3f}{:>9.0f}x'.format(n_items, loop_time, batched_time, loop_time / batched_time))
+    print('* extrapolated from {} items'.format(SAMPLE))
@@ -0,0 +1,70 @@
+"""
+Stage cache: the notebook's to_pickle / read_pickle of a compacted feature
+frame versus StageCache writing and loading it column by column, read into
+memory or memory-mapped, and the cost of hashing the inputs of a stage.
+
+Run from the repository root: python benchmarks/stage_cache.py [n_rows] [n_features]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stage_cache import StageCache, fingerprint
+
+
+def synthetic(n_rows, n_features, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.normal(size=(n_rows, n_features)).astype('float32'),
+                      columns=['f{}'.format(i) for i in range(n_features)])
+    df.insert(0, 'manufacturer', pd.Categorical(rng.integers(0, 200, n_rows)))
+    df.insert(0, 'order_sum_last_35', rng.poisson(3, n_rows).astype('int16'))
+    df.insert(0, 'day_of_year', rng.integers(1, 167, n_rows).astype('int16'))
+    df.insert(0, 'itemID', rng.integers(1, 10464, n_rows).astype('int16'))
+    return df
+
+
+def timed(func, *args, **kwargs):
+    time_start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - time_start
+
+
+def main(n_rows=500000, n_features=300):
+    df = synthetic(n_rows, n_features)
+    print('{} rows x {} columns, {:.0f} MiB'.format(n_rows, df.shape[1], df.memory_usage().sum() / 2 ** 20))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'feat_orders.pkl')
+        _, t_pickle_write = timed(df.to_pickle, path)
+        loaded, t_pickle_read = timed(pd.read_pickle, path)
+        pd.testing.assert_frame_equal(loaded, df)
+
+        cache = StageCache(os.path.join(directory, 'cache'))
+        _, t_put = timed(cache.put, 'feat_orders', df, key='benchmark')
+        loaded, t_get = timed(cache.get, 'feat_orders', 'benchmark')
+        pd.testing.assert_frame_equal(loaded, df)
+        cache.mmap = True
+        loaded, t_mmap = timed(cache.get, 'feat_orders', 'benchmark')
+        pd.testing.assert_frame_equal(loaded.copy(), df)
+        del loaded
+
+    _, t_hash = timed(fingerprint, df)
+
+    print('{:<36}{:>10}'.format('', 'seconds'))
+    print('{:<36}{:>10.2f}'.format('to_pickle', t_pickle_write))
+    print('{:<36}{:>10.2f}'.format('read_pickle', t_pickle_read))
+    print('{:<36}{:>10.2f}'.format('StageCache.put', t_put))
+    print('{:<36}{:>10.2f}'.format('StageCache.get', t_get))
+    print('{:<36}{:>10.2f}'.format('StageCache.get, memory-mapped', t_mmap))
+    print('{:<36}{:>10.2f}'.format('fingerprint of the frame', t_hash))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
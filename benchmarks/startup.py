@@ -0,0 +1,51 @@
+"""
+Cold-start time and memory of the dashboard, CSV parsing versus the data store.
+
+Each mode imports app in a fresh interpreter and reports the import time,
+RSS and PSS (proportional set size, which splits shared pages between the
+processes mapping them) of that process.
+
+Run from the repository root after `python data_store.py`:
+python benchmarks/startup.py
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import time
+time_start = time.time()
+import app
+elapsed = time.time() - time_start
+status = dict(line.split(':', 1) for line in open('/proc/self/status'))
+rollup = dict(line.split(':', 1) for line in open('/proc/self/smaps_rollup').readlines()[1:])
+print(elapsed, int(status['VmRSS'].split()[0]), int(rollup['Pss'].split()[0]))
+"""
+
+
+def probe(store_dir):
+    """
+    :param store_dir: Value of DATA_STORE_DIR for the child process
+    :return: Tuple of import seconds, RSS kB and PSS kB
+    """
+    env = dict(os.environ, DATA_STORE_DIR=store_dir)
+    out = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+                         check=True, capture_output=True, text=True).stdout.split()
+    return float(out[0]), int(out[1]), int(out[2])
+
+
+if __name__ == '__main__':
+    runs = 3
+    with tempfile.TemporaryDirectory() as empty_dir:
+        modes = [('csv', empty_dir), ('store', os.path.join(ROOT, 'data', 'store'))]
+        print('{:<8}{:>12}{:>12}{:>12}'.format('mode', 'import (s)', 'RSS (MB)', 'PSS (MB)'))
+        for mode, store_dir in modes:
+            results = [probe(store_dir) for _ in range(runs)]
+            elapsed = min(r[0] for r in results)
+            rss = sum(r[1] for r in results) / runs / 1024
+            pss = sum(r[2] for r in results) / runs / 1024
+            print('{:<8}{:>12.2f}{:>12.1f}{:>12.1f}'.format(mode, elapsed, rss, pss))
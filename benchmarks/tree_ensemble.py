@@ -0,0 +1,89 @@
+"""
+Compiled inference: the 21 boosters of the two-stage model walked together
+by a CompiledEnsemble versus 21 Booster.predict calls, for batches from a
+single item to the whole test matrix.
+
+Twenty regressors and a classifier are trained on synthetic features, some
+of them missing, the regressors with the notebook's asymmetric MSE
+objective. The compiled booster outputs must match Booster.predict within
+1e-9 and give the same forecasts.
+
+Run from the repository root: python benchmarks/tree_ensemble.py [n_items] [n_features] [n_trees]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from forecast import Forecaster
+from training import NUM_FOLDS, asymmetric_mse
+
+
+def save_models(directory, n_items, n_features, n_trees, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size = (n_items, n_features)).astype('float32')
+    y = np.maximum(X[:, :5].sum(axis = 1) + rng.normal(size = n_items), 0) ** 2
+    X[rng.random(X.shape) < 0.05] = np.nan
+    X = pd.DataFrame(X, columns = ['f{}'.format(i) for i in range(n_features)])
+    params = {'n_estimators': n_trees, 'verbosity': -1}
+
+    lgb.LGBMClassifier(**params).fit(X, (y > 0).astype('float')) \
+        .booster_.save_model(os.path.join(directory, 'clf.txt'))
+    for fold in range(NUM_FOLDS):
+        rows = np.random.default_rng(fold).random(n_items) < 0.8
+        lgb.LGBMRegressor(objective = asymmetric_mse, random_state = fold, **params).fit(X[rows], np.sqrt(y[rows])) \
+            .booster_.save_model(os.path.join(directory, 'reg_fold_{}.txt'.format(fold + 1)))
+    return np.ascontiguousarray(X.to_numpy())
+
+
+def rate(predict, X, batch_size, min_seconds=1.0):
+    # items/s of scoring X batch by batch, repeated for at least min_seconds
+    n_items, time_start = 0, time.perf_counter()
+    while True:
+        for start in range(0, len(X), batch_size):
+            predict(X[start:start + batch_size])
+        n_items += len(X)
+        elapsed = time.perf_counter() - time_start
+        if elapsed >= min_seconds:
+            return n_items / elapsed
+
+
+def main(n_items=10463, n_features=300, n_trees=200):
+    with tempfile.TemporaryDirectory() as directory:
+        X = save_models(directory, n_items, n_features, n_trees)
+        forecaster = Forecaster.load(directory)
+        compiled = Forecaster.load(directory)
+
+    time_start = time.perf_counter()
+    compiled.compile()
+    t_compile = time.perf_counter() - time_start
+
+    outputs = forecaster.booster_predictions(X, threads = 1)
+    difference = np.abs(compiled.booster_predictions(X) - outputs).max()
+    assert difference < 1e-9, difference
+    assert np.array_equal(compiled.predict(X), forecaster.predict(X, threads = 1))
+
+    print('{} items, {} regressors and a classifier of {} trees ({} in all, {} levels deep), {} features'.format(
+        n_items, NUM_FOLDS, n_trees, compiled.compiled.n_trees, compiled.compiled.depth, n_features))
+    print('compiled in {:.2f}s, largest difference to Booster.predict {:.1e}'.format(t_compile, difference))
+    rows = []
+    for batch_size in [1, 16, 256, n_items]:
+        sample = X[:max(min(n_items, 50 * batch_size), batch_size)]
+        rows.append({'rows per call': batch_size,
+                     '21 x Booster.predict items/s': rate(
+                         lambda batch: forecaster.booster_predictions(batch, threads = 1), sample, batch_size),
+                     'compiled items/s': rate(compiled.compiled.predict, sample, batch_size)})
+    rows = pd.DataFrame(rows)
+    rows['speedup'] = rows['compiled items/s'] / rows['21 x Booster.predict items/s']
+    print(rows.round(2).to_string(index = False))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:4]])
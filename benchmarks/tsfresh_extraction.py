@@ -0,0 +1,83 @@
+"""
+tsfresh features: the notebook's per-day extract_features loop versus the
+chunked driver of tsfresh_features, and the driver resuming from its
+checkpoints. Features of both are checked to be equal.
+
+Run from the repository root: python benchmarks/tsfresh_extraction.py [n_items] [n_jobs]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from tsfresh import extract_features
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grid import DenseGrid
+from tsfresh_features import FC_PARAMETERS, extract_window_features, profile_calculators
+
+N_DAYS = 180
+WINDOW = 35
+DAYS = [40, 80, 120, 160, 180]
+
+
+def synthetic(n_items, seed=0):
+    rng = np.random.default_rng(seed)
+    orders = rng.poisson(1, (n_items, N_DAYS)) * rng.integers(0, 3, (n_items, N_DAYS))
+    return DenseGrid(np.arange(1, n_items + 1), np.arange(1, N_DAYS + 1), orders, np.ones((n_items, N_DAYS)))
+
+
+def loop(agg_orders, n_jobs):
+    # The notebook's loop, one extract_features call per day
+    extracted = []
+    for day_of_year in DAYS:
+        tmp_df_input = agg_orders[(agg_orders['day_of_year'] >= day_of_year - WINDOW + 1) &
+                                  (agg_orders['day_of_year'] <= day_of_year)]
+        tmp_df_input = tmp_df_input[['day_of_year', 'itemID', 'order']]
+        extracted_features = extract_features(tmp_df_input, column_id='itemID', column_sort='day_of_year',
+                                              default_fc_parameters=FC_PARAMETERS,
+                                              n_jobs=n_jobs, disable_progressbar=True)
+        extracted_features['itemID'] = extracted_features.index
+        extracted_features['day_of_year'] = day_of_year
+        extracted.append(extracted_features)
+    return pd.concat(extracted, axis=0).reset_index(drop=True)
+
+
+def main(n_items=500, n_jobs=os.cpu_count()):
+    grid = synthetic(n_items)
+    agg_orders = grid.to_long()
+
+    time_start = time.perf_counter()
+    expected = loop(agg_orders, n_jobs)
+    t_loop = time.perf_counter() - time_start
+
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        time_start = time.perf_counter()
+        extracted = extract_window_features(grid, DAYS, WINDOW, FC_PARAMETERS, checkpoint_dir, n_jobs=n_jobs)
+        t_driver = time.perf_counter() - time_start
+
+        time_start = time.perf_counter()
+        extract_window_features(grid, DAYS, WINDOW, FC_PARAMETERS, checkpoint_dir, n_jobs=n_jobs)
+        t_resume = time.perf_counter() - time_start
+
+    merged = expected.merge(extracted, on=['itemID', 'day_of_year'], suffixes=('', '_driver'))
+    assert len(merged) == len(expected) == len(extracted)
+    for column in expected.columns.drop(['itemID', 'day_of_year']):
+        np.testing.assert_allclose(merged[column + '_driver'].to_numpy(dtype='float'),
+                                   merged[column].to_numpy(dtype='float'), rtol=1e-9, equal_nan=True)
+
+    print('{} items x {} days, {} features, {} workers'.format(n_items, len(DAYS), expected.shape[1] - 2, n_jobs))
+    print('{:<24}{:>10}'.format('stage', 'seconds'))
+    print('{:<24}{:>10.2f}'.format('per-day loop', t_loop))
+    print('{:<24}{:>10.2f}'.format('chunked driver', t_driver))
+    print('{:<24}{:>10.2f}'.format('resume (all cached)', t_resume))
+    print()
+    print(profile_calculators(grid, DAYS[-1], WINDOW, FC_PARAMETERS).head(8).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,72 @@
+"""
+Total memory of a gunicorn deployment, per-worker loading versus preload.
+
+Starts gunicorn with N workers in each mode, waits for every worker to
+serve the layout, and sums the PSS (proportional set size, which splits
+shared pages between the processes mapping them) of the master and workers.
+
+Run from the repository root: python benchmarks/workers_pss.py [N ...]
+"""
+
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 8765
+
+
+def pss_kb(pid):
+    with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+        for line in f:
+            if line.startswith('Pss:'):
+                return int(line.split()[1])
+    return 0
+
+
+def children(pid):
+    with open('/proc/{0}/task/{0}/children'.format(pid)) as f:
+        return [int(p) for p in f.read().split()]
+
+
+def measure(workers, preload):
+    """
+    :param workers: Number of gunicorn workers
+    :param preload: Use gunicorn.conf.py, which loads the data before fork
+    :return: Tuple of total PSS in kB and the number of processes summed
+    """
+    args = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', '127.0.0.1:{}'.format(PORT)]
+    # An empty config keeps gunicorn from picking up ./gunicorn.conf.py
+    args += ['-c', 'gunicorn.conf.py' if preload else '/dev/null', 'app:server']
+    proc = subprocess.Popen(args, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 300
+        while len(children(proc.pid)) < workers and time.time() < deadline:
+            time.sleep(0.5)
+
+        # Each worker must have imported the app and built a layout
+        served = 0
+        while served < 4 * workers and time.time() < deadline:
+            try:
+                urllib.request.urlopen('http://127.0.0.1:{}/_dash-layout'.format(PORT), timeout=60).read()
+                served += 1
+            except OSError:
+                time.sleep(0.5)
+        time.sleep(2)
+
+        pids = [proc.pid] + children(proc.pid)
+        return sum(pss_kb(pid) for pid in pids), len(pids)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == '__main__':
+    counts = [int(n) for n in sys.argv[1:]] or [1, 2, 4]
+    print('{:<10}{:<10}{:>16}{:>12}'.format('workers', 'mode', 'total PSS (MB)', 'processes'))
+    for workers in counts:
+        for mode, preload in [('per-worker', False), ('preload', True)]:
+            total, processes = measure(workers, preload)
+            print('{:<10}{:<10}{:>16.1f}{:>12}'.format(workers, mode, total / 1024, processes))
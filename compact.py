@@ -0,0 +1,169 @@
+"""
+Compact dtypes for the notebook's intermediate frames.
+
+Every column gets a kind from SCHEMA, by name:
+
+- id:       item and transaction ids, the smallest integer type, or category
+            when they are not numbers (the notebook casts them to str)
+- category: brand, manufacturer and category fields, pandas category
+- count:    days, orders, promotions and windowed sums and counts, the
+            smallest integer type, float32 when they hold missing values
+- keep:     left as is (simulationPrice and salesPrice, which profits and
+            the truncated daily prices are computed from)
+
+Other columns are features: floats become float32 and integers the smallest
+integer type. Compactor applies this to each frame and reports the memory of
+every frame before and after.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+SCHEMA = [
+    (r'^(itemID|transactID)$',                                   'id'),
+    (r'^(brand|manufacturer|category[123]?)$',                   'category'),
+    (r'^(day_of_year|order|promotion|promotion_\d+|target)$',    'count'),
+    (r'^(order|promo)_(\w+_)?(sum|count)_last_\d+$',             'count'),
+    (r'^(days_since_last_order|promo_in_test(_\w+)?)$',          'count'),
+    (r'^(simulationPrice|salesPrice)$',                          'keep'),
+]
+
+
+def column_kind(name, schema=SCHEMA):
+    '''
+    Kind of a column by its name.
+
+    Arguments:
+    - name (str): column name.
+    - schema (list): (regular expression, kind) pairs, the first match wins.
+
+    Returns:
+    - id, category, count, keep or feature
+    '''
+    for pattern, kind in schema:
+        if re.match(pattern, str(name)):
+            return kind
+    return 'feature'
+
+
+def smallest_int(values):
+    '''
+    Cast integral values to the smallest integer type holding them.
+
+    Arguments:
+    - values (Series): numeric values without missing values.
+
+    Returns:
+    - Series of int8, int16, int32 or int64
+    '''
+    return pd.to_numeric(values.astype('int64'), downcast = 'integer')
+
+
+def _integral(values):
+    if pd.api.types.is_integer_dtype(values) and not values.hasnans:
+        return True
+    if not pd.api.types.is_float_dtype(values):
+        return False
+    array = values.to_numpy()
+    return bool(np.isfinite(array).all() and np.array_equal(array, np.round(array)))
+
+
+def compact_column(values, kind):
+    '''
+    Downcast one column according to its kind.
+
+    Arguments:
+    - values (Series): the column.
+    - kind (str): id, category, count, keep or feature.
+
+    Returns:
+    - the downcast Series, or values itself when it is kept
+    '''
+    if kind == 'keep' or isinstance(values.dtype, pd.CategoricalDtype):
+        return values
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_datetime64_any_dtype(values):
+        return values
+
+    if kind == 'category':
+        return values.astype('category')
+
+    if not pd.api.types.is_numeric_dtype(values):
+        if kind != 'id':
+            return values
+        # ids cast to str are parsed back when they are all numbers
+        numbers = pd.to_numeric(values, errors = 'coerce')
+        if numbers.notna().all() and _integral(numbers):
+            return smallest_int(numbers)
+        return values.astype('category')
+
+    if _integral(values) and (kind == 'count' or pd.api.types.is_integer_dtype(values)):
+        return smallest_int(values)
+    if pd.api.types.is_float_dtype(values):
+        return values.astype('float32')
+    return values
+
+
+def compact(df, schema=SCHEMA):
+    '''
+    Downcast every column of a frame according to the schema.
+
+    Arguments:
+    - df (DataFrame): frame to compact.
+    - schema (list): (regular expression, kind) pairs.
+
+    Returns:
+    - compacted copy of df
+    '''
+    compacted = pd.concat([compact_column(df.iloc[:, i], column_kind(name, schema)) for i, name in enumerate(df.columns)],
+                          axis = 1)
+    compacted.columns = df.columns
+    return compacted
+
+
+def memory(df):
+    '''
+    Memory of a frame in MiB, counting the contents of object columns.
+    '''
+    return df.memory_usage(deep = True).sum() / 2 ** 20
+
+
+class Compactor:
+    '''
+    Compacts frames and keeps a report of their memory before and after.
+
+    Arguments:
+    - schema (list): (regular expression, kind) pairs.
+
+    Examples:
+
+    compactor  = Compactor()
+    agg_orders = compactor(agg_orders, 'agg_orders')
+    compactor.report()
+    '''
+
+    def __init__(self, schema=SCHEMA):
+        self.schema = schema
+        self.rows = []
+
+    def __call__(self, df, name):
+        before = memory(df)
+        df = compact(df, self.schema)
+        after = memory(df)
+        self.rows = [row for row in self.rows if row['frame'] != name]
+        self.rows.append({'frame': name, 'rows': len(df), 'columns': df.shape[1],
+                          'before_mib': before, 'after_mib': after, 'ratio': before / max(after, 1e-9)})
+        return df
+
+    def report(self):
+        '''
+        Returns:
+        - DataFrame with frame, rows, columns, memory before and after in MiB and their ratio,
+          with a total row
+        '''
+        report = pd.DataFrame(self.rows, columns = ['frame', 'rows', 'columns', 'before_mib', 'after_mib', 'ratio'])
+        total = {'frame': 'total', 'rows': report['rows'].sum(), 'columns': report['columns'].sum(),
+                 'before_mib': report['before_mib'].sum(), 'after_mib': report['after_mib'].sum()}
+        total['ratio'] = total['before_mib'] / max(total['after_mib'], 1e-9)
+        return pd.concat([report, pd.DataFrame([total])], ignore_index = True).round(2)
@@ -0,0 +1,210 @@
+"""
+Pre-aggregated day x group cube of the order grid.
+
+The feature loop and the dashboard both need window sums of orders,
+ordering days, promotions and prices per item, per manufacturer, per
+category and over all items. RollupCube rolls the item x day matrices up to
+every level once and keeps prefix sums over days, so that the sum of any
+window of any group is the difference of two cumulative columns, whatever
+the window length and however many items the group holds.
+"""
+
+import numpy as np
+import pandas as pd
+
+ROLLUP_LEVELS = ['manufacturer', 'category']
+
+
+def prefix(values):
+    """
+    Cumulative sums along days with a leading zero column.
+
+    Arguments:
+    - values (numpy array): group x day matrix.
+
+    Returns:
+    - group x (day + 1) matrix, so that the sum over positions [a, b] is cum[:, b + 1] - cum[:, a]
+    """
+    cum = np.zeros((values.shape[0], values.shape[1] + 1), dtype=np.result_type(values.dtype, 'int64'))
+    np.cumsum(values, axis=1, out=cum[:, 1:])
+    return cum
+
+
+def roll_up(values, codes, n_groups):
+    """
+    Sum the rows of a matrix per group.
+
+    Arguments:
+    - values (numpy array): item x day matrix.
+    - codes (numpy array): group code of every item, 0 to n_groups - 1.
+    - n_groups (int): number of groups.
+
+    Returns:
+    - group x day matrix of totals
+    """
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    dtype = np.result_type(values.dtype, 'int64')
+    totals = np.zeros((n_groups, values.shape[1]), dtype=dtype)
+    totals[sorted_codes[starts]] = np.add.reduceat(values[order].astype(dtype, copy=False), starts, axis=0)
+    return totals
+
+
+class RollupCube:
+    """
+    Prefix sums over days of item x day measures, per item and rolled up per group.
+
+    Levels are 'item' (one group per item), the item attributes given in
+    `levels` and 'all' (one group of every item).
+
+    Arguments:
+    - days (numpy array): consecutive days of year, one per column of the measures.
+    - measures (dict): item x day matrix of every measure, e.g. order or salesPrice.
+    - attributes (DataFrame): group label of every item in each of the levels' columns, rows in measure order.
+    - levels (list): attribute columns rolled up to.
+    - items (bool): keep the item level.
+    """
+
+    def __init__(self, days, measures, attributes, levels=ROLLUP_LEVELS, items=True):
+        days = np.asarray(days)
+        if len(days) and not np.array_equal(days, np.arange(days[0], days[0] + len(days))):
+            raise ValueError('days must be consecutive')
+        self.days = days
+        self.measures = list(measures)
+        n_items = len(attributes)
+
+        self.codes, self.groups = {}, {}
+        if items:
+            self.codes['item'], self.groups['item'] = np.arange(n_items), np.arange(n_items)
+        for level in levels:
+            codes, groups = pd.factorize(attributes[level], sort=True)
+            if (codes < 0).any():
+                raise ValueError('items without a {}'.format(level))
+            self.codes[level], self.groups[level] = codes, np.asarray(groups)
+        self.codes['all'], self.groups['all'] = np.zeros(n_items, dtype='int64'), np.array(['all'])
+
+        self.sizes = {level: np.bincount(codes, minlength=len(self.groups[level]))
+                      for level, codes in self.codes.items()}
+        self.cum = {}
+        for name, values in measures.items():
+            for level, codes in self.codes.items():
+                if level == 'item':
+                    self.cum[level, name] = prefix(values)
+                elif level == 'all':
+                    self.cum[level, name] = prefix(values.sum(axis=0, keepdims=True))
+                else:
+                    self.cum[level, name] = prefix(roll_up(values, codes, len(self.groups[level])))
+
+    @classmethod
+    def from_grid(cls, grid, items, levels=ROLLUP_LEVELS):
+        """
+        Cube of a DenseGrid: order, order_count (ordering days), promotion and salesPrice.
+
+        Arguments:
+        - grid (DenseGrid): the order grid, with or without promotion labels.
+        - items (DataFrame): itemID and the levels' columns of every item.
+        - levels (list): item attributes rolled up to.
+
+        Returns:
+        - RollupCube with the item level
+        """
+        measures = {'order': grid.orders, 'order_count': grid.orders > 0, 'salesPrice': grid.prices}
+        if grid.promotion is not None:
+            measures['promotion'] = grid.promotion
+        attributes = items.set_index('itemID').reindex(grid.item_ids)
+        return cls(grid.days, measures, attributes, levels)
+
+    @classmethod
+    def from_long(cls, agg_orders, items, levels=ROLLUP_LEVELS):
+        """
+        Group-level cube of a long-format frame, as the dashboard tables hold it.
+
+        Arguments:
+        - agg_orders (DataFrame): itemID, day_of_year, order and optionally salesPrice and
+          promotion; item days absent from it count as 0.
+        - items (DataFrame): itemID and the levels' columns of every item.
+        - levels (list): item attributes rolled up to.
+
+        Returns:
+        - RollupCube without the item level
+        """
+        attributes = items.drop_duplicates('itemID').set_index('itemID')
+        item_codes = attributes.index.get_indexer(agg_orders['itemID'])
+        if (item_codes < 0).any():
+            raise ValueError('agg_orders hold items missing from items')
+        day_values = agg_orders['day_of_year'].to_numpy()
+        days = np.arange(day_values.min(), day_values.max() + 1)
+        cells = item_codes * len(days) + (day_values - days[0])
+
+        def dense(values):
+            matrix = np.zeros(len(attributes) * len(days), dtype=np.result_type(values.dtype, 'int64'))
+            np.add.at(matrix, cells, values)
+            return matrix.reshape(len(attributes), len(days))
+
+        order = agg_orders['order'].to_numpy()
+        measures = {'order': dense(order), 'order_count': dense(order > 0)}
+        for name in ['salesPrice', 'promotion']:
+            if name in agg_orders:
+                measures[name] = dense(np.nan_to_num(agg_orders[name].to_numpy(dtype='float')))
+        return cls(days, measures, attributes, levels, items=False)
+
+    def window(self, level, measure, first, last):
+        """
+        Sums of a measure over day windows, for every group of a level.
+
+        Arguments:
+        - level (str): item, all or a rolled-up attribute.
+        - measure (str): name of the measure.
+        - first (numpy array): first day of every window.
+        - last (numpy array): last day of every window, windows are clipped to the cube's days.
+
+        Returns:
+        - group x window matrix of sums, and the number of days in every window
+        """
+        a, b = self._bounds(first, last)
+        cum = self.cum[level, measure]
+        return cum[:, b] - cum[:, a], b - a
+
+    def _bounds(self, first, last):
+        # positions [a, b) of the prefix sums of windows [first, last], clipped to the cube's days
+        n_days = len(self.days)
+        return (np.clip(np.asarray(first) - self.days[0], 0, n_days),
+                np.clip(np.asarray(last) - self.days[0] + 1, 0, n_days))
+
+    def item_window(self, level, measure, first, last):
+        """
+        Window sums of every item's group, as features broadcast them to the items.
+
+        Returns:
+        - item x window matrix of sums, and the number of days in every window
+        """
+        sums, length = self.window(level, measure, first, last)
+        return (sums if level == 'item' else sums[self.codes[level]]), length
+
+    def item_sizes(self, level):
+        """
+        Returns:
+        - number of items in the group of every item
+        """
+        return self.sizes[level][self.codes[level]]
+
+    def series(self, level, group, measure, window=1):
+        """
+        Sums of a measure for one group over the window ending on every day.
+
+        Arguments:
+        - level (str): item, all or a rolled-up attribute.
+        - group: label of the group, e.g. a manufacturer.
+        - measure (str): name of the measure.
+        - window (int): days summed, 1 for daily values.
+
+        Returns:
+        - numpy array of sums and numpy array of window lengths, one per day, or None for an unknown group
+        """
+        row = np.flatnonzero(self.groups[level] == group)
+        if not len(row):
+            return None
+        a, b = self._bounds(self.days - window + 1, self.days)
+        cum = self.cum[level, measure][row[0]]
+        return cum[b] - cum[a], b - a
@@ -0,0 +1,241 @@
+"""
+Columnar binary store for the dashboard tables.
+
+Running `python data_store.py` converts the CSV inputs once into one .npy
+file per column under data/store. At startup the app memory-maps these files
+instead of parsing the CSVs, so gunicorn workers share the same pages through
+the OS page cache. A table whose CSV changed since the last conversion is
+read from the CSV until the store is rebuilt.
+
+load_tables() loads every table once per process and hands out frozen,
+read-only copies. Under gunicorn (see gunicorn.conf.py) this happens in the
+master before the workers are forked, so the workers share one copy.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = 'data'
+STORE_DIR = os.environ.get('DATA_STORE_DIR', os.path.join(DATA_DIR, 'store'))
+MANIFEST = 'manifest.json'
+
+# table name -> (csv file, read_csv options)
+TABLES = {
+    'infos': ('infos.csv', {'sep': '|'}),
+    'items': ('items.csv', {'sep': '|'}),
+    'orders_day': ('orders_day.csv', {}),
+    'orders_month': ('orders_month.csv', {}),
+    'agg_orders_day': ('agg_orders_day.csv', {}),
+    'agg_orders_month': ('agg_orders_month.csv', {}),
+    'result': ('result.csv', {}),
+    'item_metrics': ('item_metrics.csv', {}),
+}
+
+# Derived tables, built by metrics.py; skipped by load_tables when absent
+OPTIONAL_TABLES = {'item_metrics'}
+
+
+def read_csv(name):
+    """
+    Parse a table from its CSV, dropping the unnamed index column pandas wrote with it.
+
+    :param name: Table name, a key of TABLES
+    :return: The table as a DataFrame
+    """
+    file_name, options = TABLES[name]
+    df = pd.read_csv(os.path.join(DATA_DIR, file_name), **options)
+    return df.loc[:, ~df.columns.str.startswith('Unnamed:')]
+
+
+def _source_stamp(name):
+    stat = os.stat(os.path.join(DATA_DIR, TABLES[name][0]))
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _read_manifest():
+    try:
+        with open(os.path.join(STORE_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def is_fresh(name, manifest=None):
+    """
+    :param name: Table name
+    :param manifest: Parsed manifest, read from disk if not given
+    :return: True if the store holds the table and its CSV has not changed since
+    """
+    if manifest is None:
+        manifest = _read_manifest()
+    entry = manifest.get(name)
+    if entry is None:
+        return False
+    try:
+        return entry['source'] == _source_stamp(name)
+    except OSError:
+        # CSV removed after conversion: the store is the only copy left
+        return True
+
+
+def write_table(name, df):
+    """
+    Write a table to the store, one .npy file per column.
+
+    String columns become fixed-width unicode arrays so that they can be
+    memory-mapped; missing strings are stored as '' and restored on load.
+
+    :param name: Table name
+    :param df: The table
+    :return: Manifest entry of the table
+    """
+    table_dir = os.path.join(STORE_DIR, name)
+    os.makedirs(table_dir, exist_ok=True)
+
+    columns = []
+    for i, col in enumerate(df.columns):
+        values = df[col]
+        nullable = False
+        if not pd.api.types.is_numeric_dtype(values.dtype):
+            nullable = bool(values.isnull().any())
+            values = values.fillna('').astype(str).to_numpy(dtype='U')
+        else:
+            values = values.to_numpy()
+
+        file_name = '{}.npy'.format(i)
+        tmp_path = os.path.join(table_dir, file_name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.save(f, values)
+        os.replace(tmp_path, os.path.join(table_dir, file_name))
+        columns.append({'name': col, 'file': file_name, 'nullable': nullable})
+
+    return {'rows': len(df), 'columns': columns}
+
+
+def read_table(name, entry):
+    """
+    Memory-map a table from the store.
+
+    :param name: Table name
+    :param entry: Manifest entry of the table
+    :return: DataFrame backed by read-only memory maps where the dtype allows it
+    """
+    data = {}
+    for column in entry['columns']:
+        values = np.load(os.path.join(STORE_DIR, name, column['file']), mmap_mode='r')
+        if values.dtype.kind == 'U':
+            values = pd.Series(values, dtype=object)
+            if column['nullable']:
+                values = values.replace('', np.nan)
+        data[column['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def load_table(name):
+    """
+    Load a table, from the store if it is up to date and from its CSV otherwise.
+
+    :param name: Table name
+    :return: The table as a DataFrame
+    """
+    manifest = _read_manifest()
+    if is_fresh(name, manifest):
+        return read_table(name, manifest[name])
+    return read_csv(name)
+
+
+def freeze(df):
+    """
+    Prepare a table for sharing between forked workers.
+
+    String columns become categoricals, so that the rows hold integer codes
+    rather than references to Python objects whose refcounts every read would
+    touch, and numeric columns are marked read-only.
+
+    :param df: The table
+    :return: The frozen table
+    """
+    data = {}
+    for col in df.columns:
+        values = df[col]
+        if not pd.api.types.is_numeric_dtype(values.dtype):
+            values = values.astype('category')
+        else:
+            values = values.to_numpy()
+            values.flags.writeable = False
+        data[col] = values
+    return pd.DataFrame(data, copy=False)
+
+
+_tables = None
+
+
+def data_version():
+    """
+    :return: Short hash identifying the current input data, changing whenever a CSV is replaced
+    """
+    manifest = _read_manifest()
+    stamps = {}
+    for name in TABLES:
+        try:
+            stamps[name] = _source_stamp(name)
+        except OSError:
+            stamps[name] = manifest.get(name, {}).get('source')
+    return hashlib.sha1(json.dumps(stamps, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def load_tables():
+    """
+    Load and freeze every table, once per process.
+
+    :return: Read-only mapping of table name to frozen DataFrame
+    """
+    global _tables
+    if _tables is None:
+        manifest = _read_manifest()
+        names = [name for name in TABLES if name not in OPTIONAL_TABLES or is_fresh(name, manifest)
+                 or os.path.exists(os.path.join(DATA_DIR, TABLES[name][0]))]
+        _tables = MappingProxyType({name: freeze(load_table(name)) for name in names})
+    return _tables
+
+
+def convert(force=False):
+    """
+    Convert every CSV table whose store copy is missing or stale.
+
+    :param force: Rebuild all tables even if they are up to date
+    :return: Names of the tables that were written
+    """
+    manifest = _read_manifest()
+    written = []
+    for name in TABLES:
+        if not os.path.exists(os.path.join(DATA_DIR, TABLES[name][0])):
+            continue
+        if not force and is_fresh(name, manifest):
+            continue
+        stamp = _source_stamp(name)
+        entry = write_table(name, read_csv(name))
+        entry['source'] = stamp
+        manifest[name] = entry
+        written.append(name)
+
+    if written:
+        tmp_path = os.path.join(STORE_DIR, MANIFEST + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, os.path.join(STORE_DIR, MANIFEST))
+    return written
+
+
+if __name__ == '__main__':
+    time_start = time.time()
+    written = convert(force='--force' in sys.argv[1:])
+    print('Converted {} table(s) to {} in {:.2f}s: {}'.format(
+        len(written), STORE_DIR, time.time() - time_start, ', '.join(written) or 'all up to date'))
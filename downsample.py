@@ -0,0 +1,136 @@
+"""
+Windowed, downsampled daily series for the dashboard charts.
+
+The daily charts used to ship every day of the history and show the first
+61 of them. They now load the days in view, plus a margin on each side so
+that a short pan has data before the next load arrives, and redraw on every
+zoom or pan from the chart's relayoutData. When the window holds more days
+than a chart can show, the server reduces it to at most MAX_POINTS points:
+the price lines with Largest-Triangle-Three-Buckets, which keeps their shape,
+and the order bars with the minimum and maximum of every bucket, which keeps
+their peaks. The payload of a chart is bounded whatever the history length.
+"""
+
+import math
+
+import numpy as np
+
+MAX_POINTS = 400
+DEFAULT_VIEW_DAYS = 61
+WINDOW_MARGIN = 0.5
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets selection of points.
+
+    :param x: Sorted x values
+    :param y: y values, without NaN
+    :param n_out: Number of points kept, at least 3
+    :return: Indices of the kept points, first and last included
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x, y = np.asarray(x, dtype='float'), np.asarray(y, dtype='float')
+
+    # n_out - 2 buckets over the inner points; the last one is followed by the last point
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    ends = np.r_[edges[2:], n]
+    keep = np.empty(n_out, dtype='int64')
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        mean_x, mean_y = x[stop:ends[i]].mean(), y[stop:ends[i]].mean()
+        area = np.abs((x[a] - mean_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (mean_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def min_max(y, n_buckets):
+    """
+    Minimum and maximum of every bucket of points.
+
+    :param y: y values, without NaN
+    :param n_buckets: Number of equal buckets
+    :return: Sorted indices of the kept points, at most 2 * n_buckets
+    """
+    n = len(y)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+    y = np.asarray(y)
+    edges = np.linspace(0, n, n_buckets + 1).astype(int)
+    keep = [(start + np.argmin(y[start:stop]), start + np.argmax(y[start:stop]))
+            for start, stop in zip(edges[:-1], edges[1:])]
+    return np.unique(np.array(keep, dtype='int64'))
+
+
+def downsample(x, y, max_points=MAX_POINTS, method='lttb'):
+    """
+    Reduce a series to at most max_points points, skipping missing values.
+
+    :param x: Sorted x values
+    :param y: y values
+    :param max_points: Largest number of points returned
+    :param method: 'lttb' for lines or 'min_max' for bars
+    :return: The kept x and y values
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    if len(y) <= max_points:
+        return x, y
+    present = ~np.isnan(y.astype('float'))
+    x, y = x[present], y[present]
+    if method == 'lttb':
+        keep = lttb(x, y, max_points)
+    elif method == 'min_max':
+        keep = min_max(y, max_points // 2)
+    else:
+        raise ValueError('unknown downsampling method {}'.format(method))
+    return x[keep], y[keep]
+
+
+def view_days(relayout_data, days, default_days=DEFAULT_VIEW_DAYS):
+    """
+    Days in view of a daily chart after a zoom or pan.
+
+    :param relayout_data: relayoutData of the chart, None before any interaction
+    :param days: Days of the series
+    :param default_days: Days shown before any interaction, from the first day
+    :return: (first, last) day in view, or None when the event left the x axis as it was
+    """
+    if len(days) == 0:
+        return 0, 0
+    first_day, last_day = int(np.min(days)), int(np.max(days))
+    if not relayout_data:
+        return first_day, min(first_day + default_days - 1, last_day)
+    if relayout_data.get('xaxis.autorange'):
+        return first_day, last_day
+    if 'xaxis.range' in relayout_data:
+        low, high = relayout_data['xaxis.range']
+    elif 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        low, high = relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    else:
+        return None
+    # views far past the data are cut to a default view's length beyond it
+    low_day, high_day = first_day - default_days, last_day + default_days
+    first = min(max(math.ceil(float(low)), low_day), high_day)
+    last = min(max(math.floor(float(high)), first), high_day)
+    return first, last
+
+
+def window(days, first, last, margin=WINDOW_MARGIN):
+    """
+    Rows of a series to load for a view.
+
+    :param days: Sorted days of the series
+    :param first: First day in view
+    :param last: Last day in view
+    :param margin: Days loaded on each side, as a fraction of the days in view
+    :return: Slice of the rows from first - margin to last + margin days
+    """
+    extra = math.ceil(margin * (last - first + 1))
+    start = np.searchsorted(days, first - extra, side='left')
+    stop = np.searchsorted(days, last + extra, side='right')
+    return slice(int(start), int(stop))
@@ -0,0 +1,170 @@
+"""
+Sliding-window features of the daily order grid.
+
+The notebook built one block of feature rows per day_of_year, re-filtering
+agg_orders for the target window and every lookback window and running a
+groupby for each. Here every window of every day comes out of prefix sums
+over the dense item x day grid: a window sum is the difference of two
+cumulative columns, and manufacturer, category and all-item aggregates come
+the same way from the grid rolled up to those levels (see cube.py). Column
+names and meanings are the same as the loop's, tsfresh features excepted.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cube import RollupCube
+
+DAYS_INPUT = [1, 7, 14, 21, 28, 35]
+DAYS_TARGET = 14
+
+
+def feature_days(grid, days_target=DAYS_TARGET):
+    """
+    Days a feature block is built for: every day whose target window is complete,
+    followed by the last day, which is left unlabeled.
+
+    Arguments:
+    - grid (DenseGrid): the order grid.
+    - days_target (int): length of the target window.
+
+    Returns:
+    - numpy array of days of year
+    """
+    day_last = grid.days[-1] - days_target + 1
+    return np.r_[np.arange(grid.days[0], day_last), grid.days[-1]]
+
+
+def build_features(grid, items, days_input=DAYS_INPUT, days_target=DAYS_TARGET, days=None, cube=None):
+    """
+    Build target and lag features for every item on every requested day.
+
+    Arguments:
+    - grid (DenseGrid): order grid with promotion labels.
+    - items (DataFrame): itemID, manufacturer, category and simulationPrice of every item.
+    - days_input (list): lengths of the lookback windows.
+    - days_target (int): length of the target window.
+    - days (numpy array): days to build features for, feature_days(grid) by default.
+    - cube (RollupCube): cube of grid and items, built from them by default.
+
+    Returns:
+    - DataFrame with one row per day and item, ordered by day then item
+    """
+    if days is None:
+        days = feature_days(grid, days_target)
+    days = np.asarray(days)
+    n_items, n_days = grid.shape
+    day_min, day_max = grid.days[0], grid.days[-1]
+
+    items = items.set_index('itemID').reindex(grid.item_ids)
+    if cube is None:
+        cube = RollupCube.from_grid(grid, items.reset_index())
+    window = cube.item_window
+
+    columns = {}
+
+    ### VALIDATION: TARGET, PROMOTIONS, PRICES
+
+    labeled = days < day_max
+    test_first, test_last = days + 1, days + days_target
+    target, target_len = window('item', 'order', test_first, test_last)
+    promo_test, _ = window('item', 'promotion', test_first, test_last)
+    price_test, _ = window('item', 'salesPrice', test_first, test_last)
+    target_len = np.maximum(target_len, 1)
+
+    def test_column(values, unlabeled=np.nan):
+        return np.where(labeled, values, unlabeled)
+
+    columns['target'] = test_column(target)
+    columns['promo_in_test'] = test_column(promo_test)
+    columns['mean_price_test'] = test_column(price_test / target_len,
+                                             items['simulationPrice'].to_numpy()[:, None])
+    for level in ['manufacturer', 'category']:
+        price_level, _ = window(level, 'salesPrice', test_first, test_last)
+        columns['mean_price_test_' + level] = test_column(price_level / (cube.item_sizes(level)[:, None] * target_len))
+    for level in ['manufacturer', 'category']:
+        columns['promo_in_test_' + level] = test_column(window(level, 'promotion', test_first, test_last)[0])
+
+    ### TRAINING: LAG-BASED FEATURES
+
+    for day_input in days_input:
+        first, last = days - day_input + 1, days
+        order_sum, length = window('item', 'order', first, last)
+        price_sum, _ = window('item', 'salesPrice', first, last)
+        k = str(day_input)
+
+        # frequency, promo and price
+        columns['order_sum_last_' + k] = order_sum
+        columns['order_count_last_' + k] = window('item', 'order_count', first, last)[0]
+        columns['promo_count_last_' + k] = window('item', 'promotion', first, last)[0]
+        columns['mean_price_last_' + k] = price_sum / np.maximum(length, 1)
+
+        # frequency, promo per manufacturer and category, and per all items
+        for level in ['manufacturer', 'category', 'all']:
+            columns['order_' + level + '_sum_last_' + k] = window(level, 'order', first, last)[0]
+            columns['order_' + level + '_count_last_' + k] = window(level, 'order_count', first, last)[0]
+            columns['promo_' + level + '_count_last_' + k] = window(level, 'promotion', first, last)[0]
+
+        # recency
+        if day_input == max(days_input):
+            last_order = np.maximum.accumulate(np.where(grid.orders > 0, grid.days, 0), axis=1)
+            last_order = last_order[:, np.clip(days - day_min, 0, n_days - 1)]
+            since = days - last_order
+            columns['days_since_last_order'] = np.where((last_order > 0) & (since < day_input), since, day_input)
+
+    ### FINAL PREPARATIONS
+
+    df = pd.DataFrame({'itemID': np.tile(grid.item_ids, len(days)),
+                       'day_of_year': np.repeat(days, n_items)})
+    for name, values in columns.items():
+        df[name] = np.asarray(values).T.ravel()
+    return df
+
+
+def price_ratios(df, days_input=DAYS_INPUT):
+    """
+    Add ratios of the test window's mean prices to the mean price of every lookback window.
+
+    Arguments:
+    - df (DataFrame): feature rows with mean_price_test(_manufacturer, _category) and mean_price_last_*.
+    - days_input (list): lengths of the lookback windows.
+
+    Returns:
+    - df, with ratio_*, ratio_manufacturer_* and ratio_category_* columns added
+    """
+    for var in ['mean_price_last_' + str(day_input) for day_input in days_input]:
+        df['ratio_'              + str(var)] = df['mean_price_test']              / df[var]
+        df['ratio_manufacturer_' + str(var)] = df['mean_price_test_manufacturer'] / df[var]
+        df['ratio_category_'     + str(var)] = df['mean_price_test_category']     / df[var]
+    return df
+
+
+def test_features(df_test, days_input=DAYS_INPUT):
+    """
+    Recompute the test window features of unlabeled rows from the announced promotions.
+
+    The test window lies in the future, so promotions come from the items'
+    promotion_* dates instead of the detected peaks, and the mean prices per
+    manufacturer and category are taken over the test rows themselves.
+
+    Arguments:
+    - df_test (DataFrame): the last day's feature rows merged with the items.
+    - days_input (list): lengths of the lookback windows.
+
+    Returns:
+    - df_test, with promo_in_test, mean_price_test and price ratio features replaced
+    """
+    promo_vars = df_test.filter(like = 'promotion_').columns
+    df_test['promo_in_test'] = len(promo_vars) - df_test[promo_vars].isnull().sum(axis = 1)
+
+    # detailed item category
+    category = (df_test['category1'].astype(str) + df_test['category2'].astype(str) +
+                df_test['category3'].astype(str)).astype(int)
+
+    # future promo and price per manufacturer, category
+    for level, key in [('manufacturer', df_test['manufacturer']), ('category', category)]:
+        groups = df_test.groupby(key, observed = True)
+        df_test['promo_in_test_' + level] = groups['promo_in_test'].transform('sum')
+        df_test['mean_price_test_' + level] = groups['mean_price_test'].transform('mean')
+
+    return price_ratios(df_test, days_input)
@@ -0,0 +1,195 @@
+"""
+Server-side cache of serialized callback figures.
+
+Figures only depend on the selected item or manufacturer, on the input data
+and on the code drawing them, so a callback's output is stored as JSON under
+(callback name, arguments, version), the version naming both the data and
+the code. A repeat view is answered from the cache without building any
+Plotly objects. Entries live in a bounded in-process LRU and, optionally, in
+a directory that all gunicorn workers on the host share, where they outlive
+the app until a deploy changes the code version.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+import plotly
+from plotly.utils import PlotlyJSONEncoder
+
+
+def code_version(*module_names):
+    """
+    :param module_names: Names of the imported modules drawing the cached figures
+    :return: Short hash of their source files and the Plotly version, changing whenever the figure code does
+    """
+    digest = hashlib.sha1(plotly.__version__.encode())
+    for name in module_names:
+        with open(sys.modules[name].__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+class FigureCache:
+    """
+    Bounded LRU cache of JSON-serialized callback outputs.
+
+    :param version: Identifier of the input data and the figure code, part of every key
+    :param maxsize: Maximum number of entries held in memory
+    :param directory: Shared on-disk backend, or None for memory only
+    :param disk_maxsize: Maximum number of entries kept in the directory
+    """
+
+    def __init__(self, version, maxsize=256, directory=None, disk_maxsize=4096):
+        self.version = version
+        self.maxsize = maxsize
+        self.directory = directory
+        self.disk_maxsize = disk_maxsize
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _key(self, name, args):
+        return json.dumps([name, self.version, args], cls=PlotlyJSONEncoder)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def get(self, name, args):
+        """
+        :param name: Callback name
+        :param args: Callback arguments
+        :return: The cached JSON, or None on a miss
+        """
+        key = self._key(name, args)
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return payload
+
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                with open(path) as f:
+                    payload = f.read()
+                os.utime(path)
+            except OSError:
+                payload = None
+            if payload is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._remember(key, payload)
+                return payload
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, name, args, value):
+        """
+        Serialize and store a callback output.
+
+        :param name: Callback name
+        :param args: Callback arguments
+        :param value: Callback output, figures or tuples of figures
+        :return: The stored JSON
+        """
+        key = self._key(name, args)
+        payload = json.dumps(value, cls=PlotlyJSONEncoder)
+        self._remember(key, payload)
+
+        if self.directory is not None:
+            self._write_disk(key, payload)
+        return payload
+
+    def _write_disk(self, key, payload):
+        # best effort: the entry is served from memory whatever happens on disk
+        try:
+            # a temp file of its own per write, as threads and workers may store the same key at once
+            fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(payload)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        try:
+            self._evict_disk()
+        except OSError:
+            pass
+
+    def _remember(self, key, payload):
+        with self._lock:
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _evict_disk(self):
+        entries = [e for e in os.scandir(self.directory) if e.name.endswith('.json')]
+        if len(entries) <= self.disk_maxsize:
+            return
+        stamped = []
+        for entry in entries:
+            # entries another worker has just evicted are skipped
+            try:
+                stamped.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                pass
+        stamped.sort()
+        for _, path in stamped[:len(stamped) - self.disk_maxsize]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def cached(self, name):
+        """
+        Decorator caching a callback's output under its name and arguments.
+
+        :param name: Callback name used in the key
+        :return: The decorator
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args):
+                payload = self.get(name, args)
+                if payload is None:
+                    payload = self.set(name, args, func(*args))
+                return json.loads(payload)
+            return wrapper
+        return decorator
+
+    def stats(self):
+        """
+        :return: Dict of hit, miss and eviction counters of this process
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'maxsize': self.maxsize,
+                'version': self.version,
+            }
@@ -0,0 +1,261 @@
+"""
+Batch scoring of every item from the saved two-stage model.
+
+The notebook saves the first stage classifier as clf.txt and the regressor
+of every fold as reg_fold_{i}.txt. Forecaster loads them and scores the test
+feature rows the way cross_validate does: every regressor's prediction is
+squared back from the sqrt target, postprocessed and divided by the number
+of folds, the folds are summed, and the sum is multiplied by the rounded
+classifier prediction. The test matrix is built once as float32 and scored
+in batches of rows, each booster using all cores.
+
+Forecaster.compile() switches to a CompiledEnsemble (see tree_ensemble.py),
+which walks the trees of all the boosters together in NumPy instead of
+calling Booster.predict once per booster. It gives the same forecasts and is
+about as fast for single items, but LightGBM is several times faster on
+batches (see benchmarks/tree_ensemble.py), so it is not the default.
+
+Running `python forecast.py [model_dir] [output]` scores the test rows of
+the notebook's stage cache and writes itemID, day_of_year and Pred of every
+item to data/forecast.csv. It also writes the rows to the feature store in
+data/features, the memory-mapped matrix the forecast API scores from (see
+forecast_service.py).
+
+cross_validate multiplies every fold by that fold's classifier, while the
+notebook only saves the last fold's, so forecasts can differ from the
+notebook's preds_test where the fold classifiers disagree.
+"""
+
+import glob
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from training import model_columns, postprocess_preds
+from tree_ensemble import CompiledEnsemble
+
+CLASSIFIER_FILE = 'clf.txt'
+REGRESSOR_FILES = 'reg_fold_*.txt'
+FORECAST_FILE = os.path.join('data', 'forecast.csv')
+FEATURE_STORE_DIR = os.path.join('data', 'features')
+
+
+class Forecaster:
+    '''
+    Two-stage model of the saved boosters.
+
+    Arguments:
+    - regressors (list): lgb.Booster of every fold.
+    - classifier (lgb.Booster): first stage classifier, or None for a one-stage model.
+    - target_transform (bool): the regressors predict the square root of the target.
+
+    Examples:
+
+    forecaster = Forecaster.load('.')
+    forecast   = forecaster.score(df_test)
+    '''
+
+    def __init__(self, regressors, classifier=None, target_transform=True):
+        if not regressors:
+            raise ValueError('no regressors to score with')
+        self.regressors = regressors
+        self.classifier = classifier
+        self.target_transform = target_transform
+        self.compiled = None
+
+    @classmethod
+    def load(cls, model_dir='.', target_transform=True):
+        '''
+        Load the boosters the notebook saved.
+
+        Arguments:
+        - model_dir (str): directory holding clf.txt and reg_fold_{i}.txt.
+        - target_transform (bool): the regressors predict the square root of the target.
+
+        Returns:
+        - Forecaster, regressors in fold order
+        '''
+        # imported here, so that LightGBM's OpenMP runtime is only loaded by the processes that score
+        import lightgbm as lgb
+
+        paths = glob.glob(os.path.join(model_dir, REGRESSOR_FILES))
+        paths = sorted(paths, key = lambda path: int(re.findall(r'\d+', os.path.basename(path))[-1]))
+        regressors = [lgb.Booster(model_file = path) for path in paths]
+        classifier_path = os.path.join(model_dir, CLASSIFIER_FILE)
+        classifier = lgb.Booster(model_file = classifier_path) if os.path.exists(classifier_path) else None
+        return cls(regressors, classifier, target_transform)
+
+    @property
+    def features(self):
+        return self.regressors[0].feature_name()
+
+    @property
+    def boosters(self):
+        return self.regressors + ([self.classifier] if self.classifier is not None else [])
+
+    def compile(self):
+        '''
+        Score with the trees of all the boosters flattened into one CompiledEnsemble.
+
+        Returns:
+        - the Forecaster
+        '''
+        self.compiled = CompiledEnsemble(self.boosters)
+        return self
+
+    def booster_predictions(self, X, threads=None):
+        '''
+        Arguments:
+        - X (numpy array): feature rows.
+        - threads (int): threads of every booster, all cores by default; unused when compiled.
+
+        Returns:
+        - numpy array with one column per regressor, then the classifier's
+        '''
+        if self.compiled is not None:
+            return self.compiled.predict(X)
+        threads = threads or multiprocessing.cpu_count()
+        return np.column_stack([booster.predict(X, num_threads = threads) for booster in self.boosters])
+
+    def matrix(self, df):
+        '''
+        Feature matrix of a frame, in the column order of the model.
+
+        Arguments:
+        - df (DataFrame): feature rows, column names as before or after model_columns.
+
+        Returns:
+        - C-contiguous float32 numpy array
+        '''
+        df = df.set_axis(model_columns(df.columns), axis = 1)
+        missing = [feature for feature in self.features if feature not in df.columns]
+        if missing:
+            raise ValueError('feature rows lack {} model features: {}'.format(len(missing), missing[:5]))
+        return np.ascontiguousarray(df[self.features].to_numpy(dtype = 'float32'))
+
+    def predict(self, X, batch_size=100000, threads=None):
+        '''
+        Forecast of every row.
+
+        Arguments:
+        - X (numpy array): feature matrix from matrix().
+        - batch_size (int): rows scored at a time.
+        - threads (int): threads of every booster, all cores by default.
+
+        Returns:
+        - numpy array of forecasts
+        '''
+        preds = np.zeros(len(X))
+        for start in range(0, len(X), batch_size):
+            outputs = self.booster_predictions(X[start:start + batch_size], threads)
+            fold_sum = np.zeros(len(outputs))
+            for fold in range(len(self.regressors)):
+                pred = outputs[:, fold]
+                if self.target_transform:
+                    pred = pred ** 2
+                fold_sum += postprocess_preds(pred) / len(self.regressors)
+            if self.classifier is not None:
+                fold_sum *= np.round(outputs[:, -1])
+            preds[start:start + batch_size] = fold_sum
+        return preds
+
+    def score(self, df, **kwargs):
+        '''
+        Forecast of every item, with the scoring rate.
+
+        Arguments:
+        - df (DataFrame): test feature rows with itemID and day_of_year.
+        - kwargs: batch_size and threads of predict.
+
+        Returns:
+        - DataFrame with itemID, day_of_year and Pred
+        '''
+        time_start = time.time()
+        X = self.matrix(df)
+        preds = self.predict(X, **kwargs)
+        elapsed = time.time() - time_start
+        print('Scored {} items with {} regressors in {:.2f}s ({:.0f} items/s)'.format(
+            len(X), len(self.regressors), elapsed, len(X) / max(elapsed, 1e-9)))
+        return pd.DataFrame({'itemID':      df['itemID'].to_numpy(),
+                             'day_of_year': df['day_of_year'].to_numpy(),
+                             'Pred':        preds})
+
+
+class FeatureStore:
+    '''
+    Test feature rows of every item, memory-mapped as a float32 matrix in the
+    model's feature order, so that workers share one copy through the page cache.
+
+    Arguments:
+    - directory (str): directory written by FeatureStore.write.
+    '''
+
+    ARRAYS = ['X', 'item_ids', 'day_of_year', 'price']
+
+    def __init__(self, directory=FEATURE_STORE_DIR):
+        with open(os.path.join(directory, 'features.json')) as f:
+            self.features = json.load(f)['features']
+        for name in self.ARRAYS:
+            setattr(self, name, np.load(os.path.join(directory, name + '.npy'), mmap_mode = 'r'))
+        self._rows = dict(zip(self.item_ids.tolist(), range(len(self.item_ids))))
+
+    @classmethod
+    def write(cls, directory, df, forecaster):
+        '''
+        Write the feature rows of a frame, arrays first and the manifest last.
+
+        Arguments:
+        - directory (str): directory to write to.
+        - df (DataFrame): test feature rows with itemID, day_of_year and simulationPrice.
+        - forecaster (Forecaster): model whose features are stored.
+
+        Returns:
+        - FeatureStore of the written directory
+        '''
+        os.makedirs(directory, exist_ok = True)
+        arrays = {'X':           forecaster.matrix(df),
+                  'item_ids':    df['itemID'].to_numpy(dtype = 'int64'),
+                  'day_of_year': df['day_of_year'].to_numpy(dtype = 'int64'),
+                  'price':       df['simulationPrice'].to_numpy(dtype = 'float')}
+        for name, values in arrays.items():
+            tmp_path = os.path.join(directory, name + '.npy.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.save(f, values)
+            os.replace(tmp_path, os.path.join(directory, name + '.npy'))
+
+        tmp_path = os.path.join(directory, 'features.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'features': forecaster.features}, f)
+        os.replace(tmp_path, os.path.join(directory, 'features.json'))
+        return cls(directory)
+
+    def rows(self, item_ids):
+        '''
+        Arguments:
+        - item_ids (list): requested items.
+
+        Returns:
+        - numpy array of the rows of the stored items, and the list of items not stored
+        '''
+        rows = [self._rows.get(item, -1) for item in item_ids]
+        unknown = [item for item, row in zip(item_ids, rows) if row < 0]
+        return np.array([row for row in rows if row >= 0], dtype = 'int64'), unknown
+
+
+if __name__ == '__main__':
+    from stage_cache import StageCache
+
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else '.'
+    output = sys.argv[2] if len(sys.argv) > 2 else FORECAST_FILE
+    df_test = StageCache().latest('train_test')[1]
+    forecaster = Forecaster.load(model_dir)
+    forecast = forecaster.score(df_test)
+    forecast.to_csv(output, index = False)
+    FeatureStore.write(FEATURE_STORE_DIR, df_test, forecaster)
+    print('Wrote {} forecasts to {} and their features to {}'.format(len(forecast), output, FEATURE_STORE_DIR))
@@ -0,0 +1,209 @@
+"""
+Forecast API: the 14-day demand forecast and expected profit of items.
+
+GET /api/forecast?itemID=1&itemID=2 (or itemID=1,2) and POST /api/forecast
+with {"itemID": [1, 2]} score the requested items from the feature store
+written by forecast.py, with the boosters the notebook saved.
+
+Every worker process loads the boosters once, after the fork (see
+gunicorn.conf.py), and memory-maps the feature store, which the workers share
+through the page cache. A worker's request threads hand their rows to one
+MicroBatcher thread, which scores the rows of all requests that arrived
+while it was busy with the previous batch in a single predict call.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import flask
+import numpy as np
+
+from forecast import FEATURE_STORE_DIR, FeatureStore, Forecaster
+from metrics import profit
+
+
+class MicroBatcher:
+    """
+    Scores the rows of concurrent requests together in one background thread.
+
+    :param predict: Function scoring a feature matrix
+    :param max_batch: Maximum number of rows per predict call
+    :param max_wait: Seconds a batch waits for more requests after its first one, 0 to take only the waiting ones
+    """
+
+    def __init__(self, predict, max_batch=256, max_wait=0):
+        self.predict = predict
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, X):
+        """
+        :param X: Feature rows of one request
+        :return: Future of their forecasts
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='forecast-batcher', daemon=True)
+                self._thread.start()
+        future = Future()
+        self._queue.put((X, future))
+        return future
+
+    def _collect(self):
+        # the first request is waited for, the others join it for up to max_wait seconds
+        pending = [self._queue.get()]
+        rows = len(pending[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while rows < self.max_batch:
+            try:
+                request = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            pending.append(request)
+            rows += len(request[0])
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            try:
+                preds = self.predict(np.concatenate([X for X, _ in pending]))
+            except Exception as error:
+                for _, future in pending:
+                    future.set_exception(error)
+                continue
+            self.batches += 1
+            self.requests += len(pending)
+            start = 0
+            for X, future in pending:
+                future.set_result(preds[start:start + len(X)])
+                start += len(X)
+
+
+class ForecastService:
+    """
+    Boosters, feature store and micro-batcher of one worker process, loaded on first use.
+
+    :param model_dir: Directory holding clf.txt and reg_fold_{i}.txt
+    :param store_dir: Directory of the feature store written by forecast.py
+    :param max_batch: Maximum number of rows per predict call
+    :param max_wait: Seconds a batch waits for more requests after its first one, 0 to take only the waiting ones
+    :param compiled: Score with the boosters compiled into one CompiledEnsemble (see tree_ensemble.py),
+                     or with Booster.predict when they cannot be compiled, the reason kept in compile_error
+    """
+
+    def __init__(self, model_dir='.', store_dir=FEATURE_STORE_DIR, max_batch=256, max_wait=0, compiled=False):
+        self.model_dir = model_dir
+        self.store_dir = store_dir
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.compiled = compiled
+        self.compile_error = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self.forecaster = Forecaster.load(self.model_dir)
+                if self.compiled:
+                    try:
+                        self.forecaster.compile()
+                    except ValueError as error:
+                        # boosters the CompiledEnsemble does not handle are scored by LightGBM
+                        self.compile_error = error
+                self.store = FeatureStore(self.store_dir)
+                if self.store.features != self.forecaster.features:
+                    raise ValueError('the feature store does not match the models, rerun forecast.py')
+                # small batches: one thread per booster beats starting a pool of them
+                self.batcher = MicroBatcher(lambda X: self.forecaster.predict(X, threads=1),
+                                            self.max_batch, self.max_wait)
+                self._pid = os.getpid()
+        return self
+
+    def warm(self):
+        """
+        Load the models and score one item, so that the first request is served warm.
+        """
+        self._load()
+        if len(self.store.item_ids):
+            self.forecast([int(self.store.item_ids[0])])
+
+    def forecast(self, item_ids):
+        """
+        :param item_ids: Requested items
+        :return: One dict per stored item with itemID, day_of_year, forecast (units over the
+                 target window) and expected_profit (DMC profit if the demand matches the
+                 forecast), and the list of items not in the store
+        """
+        self._load()
+        rows, unknown = self.store.rows(item_ids)
+        if not len(rows):
+            return [], unknown
+
+        preds = self.batcher.submit(self.store.X[rows]).result()
+        price = self.store.price[rows]
+        expected = profit(preds, preds, price, item_codes=np.arange(len(rows)), minlength=len(rows))
+        forecasts = [{'itemID': item, 'day_of_year': day, 'forecast': pred, 'expected_profit': gain}
+                     for item, day, pred, gain in zip(self.store.item_ids[rows].tolist(),
+                                                      self.store.day_of_year[rows].tolist(),
+                                                      preds.tolist(), expected.tolist())]
+        return forecasts, unknown
+
+
+def _item_id(value):
+    # integers, or their digits in a query string; 1.5 or true are not items
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError('itemID must be integers')
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError('itemID must be integers') from None
+
+
+def _requested_items(request):
+    if request.method == 'POST':
+        body = request.get_json(silent=True)
+        if body is None:
+            body = {}
+        if not isinstance(body, dict):
+            raise ValueError('the request body must be a JSON object')
+        values = body.get('itemID', [])
+        values = values if isinstance(values, list) else [values]
+    else:
+        values = [value for arg in request.args.getlist('itemID') for value in arg.split(',')]
+    return [_item_id(value) for value in values]
+
+
+def register(server, service, rule='/api/forecast'):
+    """
+    Add the forecast endpoint to a Flask server.
+
+    :param server: Flask server, e.g. app.server
+    :param service: ForecastService answering the requests
+    :param rule: URL of the endpoint
+    """
+
+    @server.route(rule, methods=['GET', 'POST'], endpoint='forecast_api')
+    def forecast_api():
+        try:
+            item_ids = _requested_items(flask.request)
+        except ValueError as error:
+            return flask.jsonify({'error': str(error)}), 400
+        if not item_ids:
+            return flask.jsonify({'error': 'no itemID given'}), 400
+
+        try:
+            forecasts, unknown = service.forecast(item_ids)
+        except (OSError, ValueError) as error:
+            return flask.jsonify({'error': 'forecasts unavailable: {}'.format(error)}), 503
+        status = 200 if forecasts else 404
+        return flask.jsonify({'forecasts': forecasts, 'unknown': unknown}), status
@@ -0,0 +1,126 @@
+"""
+Dense item x day order grid.
+
+The notebook's agg_orders frame holds every item on every day in long
+format. DenseGrid keeps the same data as item x day matrices, the layout the
+batched pipeline stages (promotion labelling, window features) work on, and
+converts back to the long frame when a stage needs it.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class DenseGrid:
+    """
+    Item x day matrices of orders, prices and promotions.
+
+    :param item_ids: Item of every row
+    :param days: Consecutive days of year, one per column
+    :param orders: Item x day matrix of orders
+    :param prices: Item x day matrix of sales prices
+    :param promotion: Item x day matrix of 0/1 promotion labels, or None
+    """
+
+    def __init__(self, item_ids, days, orders, prices, promotion=None):
+        days = np.asarray(days)
+        if len(days) and not np.array_equal(days, np.arange(days[0], days[0] + len(days))):
+            raise ValueError('days must be consecutive')
+        self.item_ids = np.asarray(item_ids)
+        self.days = days
+        self.orders = orders
+        self.prices = prices
+        self.promotion = promotion
+
+    @property
+    def shape(self):
+        return self.orders.shape
+
+    @classmethod
+    def from_long(cls, agg_orders):
+        """
+        Build the grid from a long-format frame.
+
+        :param agg_orders: One row per item and day with itemID, day_of_year, order,
+                           salesPrice and optionally promotion
+        :return: The DenseGrid, items in order of first appearance
+        """
+        item_codes, item_ids = agg_orders['itemID'].factorize()
+        days, day_codes = np.unique(agg_orders['day_of_year'].to_numpy(), return_inverse=True)
+        if len(agg_orders) != len(item_ids) * len(days):
+            raise ValueError('agg_orders must hold every item on every day')
+
+        def dense(column, dtype):
+            values = np.zeros((len(item_ids), len(days)), dtype=dtype)
+            values[item_codes, day_codes] = agg_orders[column].to_numpy()
+            return values
+
+        promotion = dense('promotion', 'int8') if 'promotion' in agg_orders else None
+        return cls(np.asarray(item_ids), days, dense('order', 'int64'), dense('salesPrice', 'float'), promotion)
+
+    @classmethod
+    def from_orders(cls, orders, orders_price, items):
+        """
+        Densify sparse daily orders and prices into the grid.
+
+        Every (itemID, day_of_year) pair is scattered straight into preallocated
+        matrices by its item and day codes. Items that were never sold and days
+        without transactions get zero orders. Missing prices are filled forward,
+        then backward within the item, then with its simulation price.
+
+        :param orders: Summed orders, one row per sold item and day with itemID,
+                       day_of_year and order
+        :param orders_price: Mean sales price, one row per sold item and day with
+                             itemID, day_of_year and salesPrice
+        :param items: itemID and simulationPrice of every item
+        :return: The DenseGrid, items sorted by itemID
+        """
+        item_ids = np.unique(items['itemID'].to_numpy())
+        first = 1
+        last = max(orders['day_of_year'].max(), orders_price['day_of_year'].max())
+        days = np.arange(first, last + 1)
+        n_items, n_days = len(item_ids), len(days)
+
+        def cells(df):
+            item_codes = np.searchsorted(item_ids, df['itemID'].to_numpy())
+            if len(df) and (item_codes.max() >= n_items or np.any(item_ids[item_codes] != df['itemID'].to_numpy())):
+                raise ValueError('orders hold items missing from items')
+            return item_codes * n_days + (df['day_of_year'].to_numpy() - first)
+
+        dense_orders = np.bincount(cells(orders), weights=orders['order'].to_numpy(),
+                                   minlength=n_items * n_days).astype('int64').reshape(n_items, n_days)
+
+        # prices are truncated to whole units, and zero counts as missing,
+        # as in the notebook's astype(int) over the unstacked price grid
+        prices = np.full(n_items * n_days, np.nan)
+        prices[cells(orders_price)] = np.trunc(orders_price['salesPrice'].to_numpy())
+        prices = prices.reshape(n_items, n_days)
+        prices[prices == 0] = np.nan
+
+        # fill forward, then backward, then with the simulation price
+        valid = ~np.isnan(prices)
+        rows = np.arange(n_items)[:, None]
+        cols = np.arange(n_days)
+        forward = np.maximum.accumulate(np.where(valid, cols, 0), axis=1)
+        prices = np.where(valid[rows, forward], prices[rows, forward], np.nan)
+        valid = ~np.isnan(prices)
+        backward = np.minimum.accumulate(np.where(valid, cols, n_days - 1)[:, ::-1], axis=1)[:, ::-1]
+        prices = prices[rows, backward]
+        simulation = items.set_index('itemID')['simulationPrice'].reindex(item_ids).to_numpy(dtype='float')
+        prices = np.where(np.isnan(prices), simulation[:, None], prices)
+
+        return cls(item_ids, days, dense_orders, prices)
+
+    def to_long(self):
+        """
+        :return: Long-format frame with itemID, day_of_year, order, salesPrice and
+                 promotion if labelled, sorted by item then day
+        """
+        n_items, n_days = self.shape
+        df = pd.DataFrame({'itemID':      np.repeat(self.item_ids, n_days),
+                           'day_of_year': np.tile(self.days, n_items),
+                           'order':       self.orders.ravel(),
+                           'salesPrice':  self.prices.ravel()})
+        if self.promotion is not None:
+            df['promotion'] = self.promotion.ravel()
+        return df
@@ -0,0 +1,44 @@
+"""
+Gunicorn settings for the dashboard.
+
+The tables and the app are loaded once in the master process, before the
+workers are forked, so every worker shares the same copy-on-write pages
+instead of parsing and holding the data itself.
+
+Every worker runs several request threads, so that concurrent forecast API
+requests can be scored together (see forecast_service.py), and loads the
+forecast boosters itself after the fork.
+"""
+
+import gc
+import os
+
+import data_store
+
+preload_app = True
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+
+def on_starting(server):
+    # Already done by the preloaded app import; kept so the data is loaded
+    # before fork even if preload_app is switched off
+    data_store.load_tables()
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the collector's reach, so that
+    # collections in the workers do not write to the shared pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # LightGBM, and with it its OpenMP runtime, is first imported here in the worker:
+    # forecast.py only imports it when the boosters are loaded
+    import app
+    try:
+        app.forecast_service.warm()
+    except (OSError, ValueError) as error:
+        worker.log.warning('Forecast API not warmed: %s', error)
+    if app.forecast_service.compile_error is not None:
+        worker.log.warning('Forecast boosters not compiled, scored by LightGBM: %s',
+                           app.forecast_service.compile_error)
@@ -0,0 +1,139 @@
+"""
+Compression and HTTP caching of the dashboard's callback responses.
+
+Callback responses carry whole Plotly figures, layout dictionaries included.
+CallbackHTTPCache compresses every callback response with Brotli or gzip,
+whichever the request accepts. Callbacks marked @deterministic, whose output
+only depends on their inputs and the data, also get a strong ETag derived
+from the response. A client that resends the ETag in If-None-Match is
+answered with 304 Not Modified, as these POST requests are queries without
+side effects. Browsers and standard proxies do not store or reuse responses
+to POST, so the responses are marked no-cache like the layout's, and only
+clients that keep the ETag themselves save the body. Their compressed bodies
+are kept in a bounded LRU under the ETag, so a repeated output is not
+compressed again. Other callbacks are compressed and marked no-store.
+
+The responses are encoded here rather than by Flask-Compress, which leaves
+responses that already have a Content-Encoding alone.
+"""
+
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+
+import flask
+
+from static_layout import brotli, compress
+
+CALLBACK_ROUTE = '_dash-update-component'
+MIN_SIZE = 500
+
+# compression levels per request: under a millisecond for a figure, Brotli about 10% smaller than gzip
+LEVELS = {'br': 6, 'gzip': 6}
+
+
+def deterministic(func):
+    """
+    Decorator marking a callback whose output only depends on its inputs and the data.
+
+    :param func: The callback
+    :return: The callback, flagging the request it serves as cacheable
+    """
+    @functools.wraps(func)
+    def wrapper(*args):
+        if flask.has_request_context():
+            flask.g.deterministic_callback = True
+        return func(*args)
+    return wrapper
+
+
+class CallbackHTTPCache:
+    """
+    After-request hook compressing callback responses and tagging the deterministic ones.
+
+    :param maxsize: Maximum number of compressed bodies held
+    :param min_size: Responses smaller than this many bytes are sent uncompressed
+    """
+
+    def __init__(self, maxsize=512, min_size=MIN_SIZE):
+        self.maxsize = maxsize
+        self.min_size = min_size
+        self.encodings = [encoding for encoding in LEVELS if encoding != 'br' or brotli is not None]
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._bodies = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, app):
+        """
+        :param app: The Dash app whose callback responses are handled
+        """
+        self.endpoint = app.config.routes_pathname_prefix + CALLBACK_ROUTE
+        app.server.after_request(self.after_request)
+
+    def _compressed(self, key, body, encoding):
+        with self._lock:
+            compressed = self._bodies.get(key)
+            if compressed is not None:
+                self._bodies.move_to_end(key)
+                self.hits += 1
+                return compressed
+            self.misses += 1
+        compressed = compress(body, encoding, LEVELS[encoding])
+        with self._lock:
+            self._bodies[key] = compressed
+            while len(self._bodies) > self.maxsize:
+                self._bodies.popitem(last=False)
+        return compressed
+
+    def after_request(self, response):
+        """
+        :param response: Response of any request
+        :return: The response, compressed and tagged if it is a callback's
+        """
+        request = flask.request
+        if (request.endpoint != self.endpoint or response.status_code != 200
+                or response.direct_passthrough or 'Content-Encoding' in response.headers):
+            return response
+
+        body = response.get_data()
+        encoding = request.accept_encodings.best_match(self.encodings) if len(body) >= self.min_size else None
+        response.vary.add('Accept-Encoding')
+
+        if not flask.g.get('deterministic_callback'):
+            response.headers['Cache-Control'] = 'no-store'
+            if encoding is not None:
+                response.set_data(compress(body, encoding, LEVELS[encoding]))
+                response.headers['Content-Encoding'] = encoding
+            return response
+
+        digest = hashlib.sha1(body).hexdigest()[:20]
+        etag = digest if encoding is None else '{}-{}'.format(digest, encoding)
+        response.set_etag(etag)
+        # POST responses are not reused from caches, only revalidated by clients that resend the ETag
+        response.headers['Cache-Control'] = 'no-cache'
+        if request.if_none_match.contains(etag):
+            with self._lock:
+                self.not_modified += 1
+            response.status_code = 304
+            response.set_data(b'')
+            return response
+        if encoding is not None:
+            response.set_data(self._compressed(etag, body, encoding))
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    def stats(self):
+        """
+        :return: Dict of compressed body hits, misses and 304 responses of this process
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'entries': len(self._bodies),
+                'maxsize': self.maxsize,
+            }
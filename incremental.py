@@ -0,0 +1,221 @@
+"""
+Incremental daily update of the feature table.
+
+A full build densifies all orders, labels promotions over every item's whole
+series and builds feature rows for every day. When one more day of orders
+arrives only two rows per item change: the day days_target before it gets
+its complete target window and becomes a labeled training row, and the new
+day replaces the previous last day as the unlabeled test row.
+
+IncrementalFeatures keeps what those rows need: the last
+max(days_input) + days_target days of the grid, plus `margin` days of
+context for the promotion peaks, and the running statistics (OrderStats)
+the promotion rule takes from the whole series. Appending a day scatters it
+into the window, relabels the window's promotions against the full-history
+thresholds and builds the two rows with features.build_features, so its cost
+does not depend on how many days came before.
+
+The rows are those of a full build, except that a peak whose prominence is
+only settled more than `margin` days before the window is judged on the
+retained days. Rows written earlier are not revisited; new items need a full
+build.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from features import DAYS_INPUT, DAYS_TARGET, build_features, price_ratios, test_features
+from grid import DenseGrid
+from promotions import OrderStats, detect_promotions
+from tsfresh_features import extract_window_features
+
+ITEM_COLUMNS = ['manufacturer', 'category', 'simulationPrice']
+
+
+class IncrementalFeatures:
+    """
+    Rolling state of the order grid for appending days to the feature table.
+
+    Arguments:
+    - grid (DenseGrid): order grid of every day so far, with promotion labels.
+    - items (DataFrame): itemID, manufacturer, category and simulationPrice of every item.
+    - days_input (list): lengths of the lookback windows.
+    - days_target (int): length of the target window.
+    - margin (int): days kept before the feature windows as context for the promotion peaks.
+    - stats (OrderStats): statistics of the whole series, computed from grid by default.
+    """
+
+    def __init__(self, grid, items, days_input=DAYS_INPUT, days_target=DAYS_TARGET, margin=28, stats=None):
+        self.days_input = list(days_input)
+        self.days_target = days_target
+        self.margin = margin
+        keep = max(days_input) + days_target + margin
+        self.window = DenseGrid(grid.item_ids, grid.days[-keep:], np.array(grid.orders[:, -keep:]),
+                                np.array(grid.prices[:, -keep:]), np.array(grid.promotion[:, -keep:]))
+        self.items = items.set_index('itemID').reindex(grid.item_ids)[ITEM_COLUMNS].reset_index()
+        self.stats = stats if stats is not None else OrderStats.from_orders(grid.orders)
+        # items with a sales price so far; the first price of an item fills its earlier days
+        self.priced = grid.orders.sum(axis=1) > 0
+
+    @property
+    def last_day(self):
+        return int(self.window.days[-1])
+
+    def _day_column(self, orders, orders_price, day):
+        item_ids = self.window.item_ids
+        order = np.argsort(item_ids)
+
+        def codes(df):
+            df = df[df['day_of_year'] == day]
+            pos = np.searchsorted(item_ids, df['itemID'].to_numpy(), sorter=order).clip(0, len(item_ids) - 1)
+            found = item_ids[order[pos]] == df['itemID'].to_numpy()
+            if not found.all():
+                raise ValueError('orders hold items missing from the state, which needs a full build')
+            return order[pos], df
+
+        rows, df = codes(orders)
+        day_orders = np.bincount(rows, weights=df['order'].to_numpy(), minlength=len(item_ids)).astype('int64')
+
+        # prices are truncated to whole units and zero counts as missing, as in DenseGrid.from_orders
+        rows, df = codes(orders_price)
+        day_prices = np.full(len(item_ids), np.nan)
+        day_prices[rows] = np.trunc(df['salesPrice'].to_numpy())
+        day_prices[day_prices == 0] = np.nan
+        return day_orders, day_prices
+
+    def append_day(self, orders, orders_price, fc_parameters=None, checkpoint_dir=None):
+        """
+        Add the next day of orders and build the feature rows it changes.
+
+        Arguments:
+        - orders (DataFrame): summed orders, one row per sold item and day with itemID,
+          day_of_year and order; rows of other days are ignored.
+        - orders_price (DataFrame): mean sales price, one row per sold item and day with
+          itemID, day_of_year and salesPrice.
+        - fc_parameters (dict): tsfresh calculators, to add their features to the rows.
+        - checkpoint_dir (str): checkpoint directory of the tsfresh extraction, required with fc_parameters;
+          a directory of its own, as the checkpoints of earlier days are removed from it.
+
+        Returns:
+        - DataFrame with the feature rows of the newly labeled day and of the new last day
+        """
+        if fc_parameters is not None and checkpoint_dir is None:
+            raise ValueError('the tsfresh features need a checkpoint_dir')
+        day = self.last_day + 1
+        day_orders, day_prices = self._day_column(orders, orders_price, day)
+
+        # the first price of an item fills its retained days backward, a missing
+        # price is carried forward from the previous day
+        window = self.window
+        priced = ~np.isnan(day_prices)
+        first = priced & ~self.priced
+        window.prices[first] = day_prices[first][:, None]
+        day_prices = np.where(priced, day_prices, window.prices[:, -1])
+        self.priced |= priced
+
+        # roll the window by one day
+        window.days = np.r_[window.days[1:], day]
+        window.orders = np.hstack([window.orders[:, 1:], day_orders[:, None]])
+        window.prices = np.hstack([window.prices[:, 1:], day_prices[:, None]])
+
+        # promotions of the retained days against the thresholds of the whole series
+        self.stats.add(day_orders)
+        window.promotion = detect_promotions(window.orders, self.stats.median(), self.stats.std())
+
+        days = [day - self.days_target, day]
+        rows = build_features(window, self.items, self.days_input, self.days_target, days=days)
+        if fc_parameters is not None:
+            extracted = extract_window_features(window, days, max(self.days_input), fc_parameters,
+                                                checkpoint_dir, n_jobs=1, prune=True)
+            rows = rows.merge(extracted, how='left', on=['itemID', 'day_of_year'])
+        return rows
+
+    def update(self, df_train, df_test, orders, orders_price, items, **kwargs):
+        """
+        Append the next day to the prepared training and test frames.
+
+        The new rows get the notebook's later steps: the price ratios, the item
+        attributes and, for the unlabeled row, the test window features.
+
+        Arguments:
+        - df_train (DataFrame): labeled rows up to the current last day.
+        - df_test (DataFrame): unlabeled rows of the current last day.
+        - orders (DataFrame): summed orders of the new day, as for append_day.
+        - orders_price (DataFrame): mean sales price of the new day, as for append_day.
+        - items (DataFrame): the prepared items, with promotion_* and category1-3.
+        - kwargs: passed to append_day.
+
+        Returns:
+        - df_train with the newly labeled rows, and the unlabeled rows of the new day
+        """
+        day = self.last_day + 1
+        rows = price_ratios(self.append_day(orders, orders_price, **kwargs), self.days_input)
+        rows = pd.merge(rows, items, on = 'itemID', how = 'left')
+
+        labeled = rows[rows['day_of_year'] < day]
+        df_train = pd.concat([df_train, labeled[df_train.columns]], ignore_index = True)
+        unlabeled = test_features(rows[rows['day_of_year'] == day].copy(), self.days_input)
+        return df_train, unlabeled[df_test.columns].reset_index(drop = True)
+
+    def save(self, path):
+        """
+        Write the state to an .npz file, atomically.
+
+        Arguments:
+        - path (str): file to write.
+        """
+        large_items = np.array(sorted(self.stats.large), dtype='int64')
+        large = [np.asarray(self.stats.large[item], dtype='int64') for item in large_items]
+        arrays = {
+            'item_ids':     self.window.item_ids,
+            'days':         self.window.days,
+            'orders':       self.window.orders,
+            'prices':       self.window.prices,
+            'promotion':    self.window.promotion,
+            'priced':       self.priced,
+            'params':       np.array([self.days_target, self.margin] + self.days_input),
+            'n_days':       np.array(self.stats.n_days),
+            'total':        self.stats.total,
+            'squares':      self.stats.squares,
+            'hist':         self.stats.hist,
+            'large_items':  large_items,
+            'large_sizes':  np.array([len(values) for values in large], dtype='int64'),
+            'large_values': np.concatenate(large) if large else np.zeros(0, dtype='int64'),
+        }
+        for column in ITEM_COLUMNS:
+            arrays['item_' + column] = self.items[column].to_numpy()
+
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a state written by save.
+
+        Arguments:
+        - path (str): file written by save.
+
+        Returns:
+        - IncrementalFeatures
+        """
+        with np.load(path, allow_pickle=True) as data:
+            state = cls.__new__(cls)
+            params = data['params'].tolist()
+            state.days_target, state.margin, state.days_input = params[0], params[1], params[2:]
+            state.window = DenseGrid(data['item_ids'], data['days'], data['orders'], data['prices'], data['promotion'])
+            state.items = pd.DataFrame({'itemID': data['item_ids'],
+                                        **{column: data['item_' + column] for column in ITEM_COLUMNS}})
+            state.priced = data['priced']
+
+            stats = OrderStats(len(data['item_ids']), data['hist'].shape[1])
+            stats.n_days = int(data['n_days'])
+            stats.total, stats.squares, stats.hist = data['total'], data['squares'], data['hist']
+            values = np.split(data['large_values'], np.cumsum(data['large_sizes'])[:-1])
+            stats.large = {int(item): part.tolist() for item, part in zip(data['large_items'], values)}
+            state.stats = stats
+        return state
@@ -0,0 +1,145 @@
+"""
+Streaming ingestion of the raw transactions in orders.csv.
+
+The notebook read the whole transaction file, parsed its time column twice
+and grouped it to item/day. stream_orders reads the file in chunks instead,
+parses every chunk's timestamps with a fixed format and adds its orders and
+sales prices into an OrderAccumulator: preallocated item x day matrices of
+order sums, price sums and counts. Memory is bounded by items x days and the
+chunk size, not by the number of transactions.
+
+The result is the notebook's pair of grouped frames: orders with the summed
+orders and orders_price with the mean sales price of every item and day that
+has transactions, which DenseGrid.from_orders densifies. Prices are summed in
+extended precision where the platform has it, and the sum is rounded to a
+double before dividing, as pandas' compensated groupby mean does, so that the
+means truncate to the same daily prices however the rows are chunked.
+
+Examples:
+
+orders, orders_price = stream_orders('orders.csv', items['itemID'])
+"""
+
+import numpy as np
+import pandas as pd
+
+ORDER_COLUMNS = ['time', 'itemID', 'order', 'salesPrice']
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+DAYS_OF_YEAR = 366
+CHUNK_SIZE = 250000
+
+
+def day_of_year(times, time_format=TIME_FORMAT):
+    '''
+    Day of year of timestamps.
+
+    Arguments:
+    - times (Series): timestamps as strings.
+    - time_format (str): strftime format of every timestamp.
+
+    Returns:
+    - numpy array of days of year, 1 to 366
+    '''
+    return pd.to_datetime(times, format = time_format).dt.dayofyear.to_numpy()
+
+
+class OrderAccumulator:
+    '''
+    Order sums, sales price sums and counts of every item and day of year.
+
+    Arguments:
+    - item_ids (array-like): every item the transactions may hold.
+    - n_days (int): days of year held, 366 for a whole year.
+    '''
+
+    def __init__(self, item_ids, n_days=DAYS_OF_YEAR):
+        self.item_ids = np.unique(np.asarray(item_ids))
+        self.n_days = n_days
+        shape = (len(self.item_ids), n_days)
+        self.transactions = np.zeros(shape, dtype = 'int32')
+        self.order_sum = np.zeros(shape, dtype = 'int64')
+        self.price_sum = np.zeros(shape, dtype = 'longdouble')
+        self.price_count = np.zeros(shape, dtype = 'int32')
+
+    @property
+    def nbytes(self):
+        return self.transactions.nbytes + self.order_sum.nbytes + self.price_sum.nbytes + self.price_count.nbytes
+
+    def add(self, item_ids, days, order, sales_price):
+        '''
+        Add transactions.
+
+        Arguments:
+        - item_ids (numpy array): item of every transaction.
+        - days (numpy array): day of year of every transaction.
+        - order (numpy array): units ordered, missing values count as 0.
+        - sales_price (numpy array): sales price, missing values are skipped by the mean.
+        '''
+        item_codes = np.searchsorted(self.item_ids, item_ids)
+        if len(item_codes) and (item_codes.max() >= len(self.item_ids)
+                                or np.any(self.item_ids[item_codes] != item_ids)):
+            raise ValueError('orders hold items missing from items')
+        if len(days) and (days.min() < 1 or days.max() > self.n_days):
+            raise ValueError('days of year must be within 1 and {}'.format(self.n_days))
+
+        # scattered straight into the matrices, without temporaries of their size
+        cells = item_codes * self.n_days + (days - 1)
+        priced = ~np.isnan(sales_price)
+        np.add.at(self.transactions.reshape(-1), cells, np.ones(len(cells), dtype = 'int32'))
+        np.add.at(self.order_sum.reshape(-1), cells, np.rint(np.nan_to_num(order)).astype('int64'))
+        np.add.at(self.price_sum.reshape(-1), cells[priced], sales_price[priced].astype('longdouble'))
+        np.add.at(self.price_count.reshape(-1), cells[priced], np.ones(priced.sum(), dtype = 'int32'))
+
+    def add_chunk(self, chunk, time_format=TIME_FORMAT):
+        '''
+        Add a chunk of orders.csv.
+
+        Arguments:
+        - chunk (DataFrame): transactions with time, itemID, order and salesPrice.
+        - time_format (str): strftime format of the time column.
+        '''
+        self.add(chunk['itemID'].to_numpy(),
+                 day_of_year(chunk['time'], time_format),
+                 chunk['order'].to_numpy(dtype = 'float'),
+                 chunk['salesPrice'].to_numpy(dtype = 'float'))
+
+    def frames(self):
+        '''
+        Grouped orders and sales prices of every item and day with transactions.
+
+        Returns:
+        - orders (DataFrame): itemID, day_of_year and summed order.
+        - orders_price (DataFrame): itemID, day_of_year and mean salesPrice, NaN without prices.
+        '''
+        item_codes, days = np.nonzero(self.transactions)
+        keys = {'itemID': self.item_ids[item_codes], 'day_of_year': days + 1}
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            price = self.price_sum[item_codes, days].astype('float64') / self.price_count[item_codes, days]
+        orders = pd.DataFrame(dict(keys, order = self.order_sum[item_codes, days]))
+        orders_price = pd.DataFrame(dict(keys, salesPrice = price))
+        return orders, orders_price
+
+
+def stream_orders(path, item_ids, chunksize=CHUNK_SIZE, sep='|', time_format=TIME_FORMAT, n_days=DAYS_OF_YEAR):
+    '''
+    Grouped orders and sales prices of a transaction file, read in chunks.
+
+    Arguments:
+    - path (str): transaction file with time, itemID, order and salesPrice.
+    - item_ids (array-like): every item the transactions may hold, e.g. items['itemID'].
+    - chunksize (int): transactions read at a time.
+    - sep (str): field separator.
+    - time_format (str): strftime format of the time column.
+    - n_days (int): days of year held.
+
+    Returns:
+    - orders (DataFrame): itemID, day_of_year and summed order.
+    - orders_price (DataFrame): itemID, day_of_year and mean salesPrice.
+    '''
+    accumulator = OrderAccumulator(item_ids, n_days)
+    chunks = pd.read_csv(path, sep = sep, usecols = ORDER_COLUMNS, chunksize = chunksize,
+                         dtype = {'time': 'str', 'itemID': accumulator.item_ids.dtype,
+                                  'order': 'float', 'salesPrice': 'float'})
+    for chunk in chunks:
+        accumulator.add_chunk(chunk, time_format)
+    return accumulator.frames()
@@ -0,0 +1,74 @@
+"""
+Item-keyed column store for the dashboard callbacks.
+
+Each table is sorted once by its key column so that the rows of an item sit
+in one contiguous block. A lookup is then a dictionary hit for the block
+offsets followed by a slice of each column, instead of a boolean scan over
+the whole table on every dropdown change.
+"""
+
+import numpy as np
+
+
+class ItemIndex:
+    """
+    Contiguous per-key slices over the columns of a table.
+
+    :param df: Table with one or more rows per key
+    :param key: Name of the column to index on
+    """
+
+    def __init__(self, df, key='itemID'):
+        self.key = key
+        keys = df[key].to_numpy()
+        if np.all(keys[:-1] <= keys[1:]):
+            # Already grouped by key: keep views, e.g. of a memory-mapped table
+            self.columns = {col: df[col].to_numpy() for col in df.columns}
+        else:
+            order = np.argsort(keys, kind='stable')
+            self.columns = {col: df[col].to_numpy()[order] for col in df.columns}
+
+        keys = self.columns[key]
+        if len(keys) == 0:
+            self._offsets = {}
+            return
+
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        stops = np.r_[starts[1:], len(keys)]
+        self._offsets = dict(zip(keys[starts].tolist(), zip(starts.tolist(), stops.tolist())))
+
+    def __contains__(self, key):
+        return key in self._offsets
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def keys(self):
+        """
+        :return: The indexed keys in sorted order
+        """
+        return list(self._offsets)
+
+    def rows(self, key):
+        """
+        Look up the rows of a key.
+
+        :param key: The key to look up
+        :return: Dict of column name to a view of that key's rows, empty if the key is unknown
+        """
+        start, stop = self._offsets.get(key, (0, 0))
+        return {col: values[start:stop] for col, values in self.columns.items()}
+
+    def value(self, key, column, default=None):
+        """
+        Look up a single value of a key, for tables with one row per key.
+
+        :param key: The key to look up
+        :param column: Name of the column to read
+        :param default: Returned when the key is unknown
+        :return: The first value of the column for that key
+        """
+        start, stop = self._offsets.get(key, (0, 0))
+        if start == stop:
+            return default
+        return self.columns[column][start]
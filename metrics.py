@@ -0,0 +1,165 @@
+"""
+Forecast metrics per item, computed for all items in one vectorized pass.
+
+Running `python metrics.py` reads result.csv and the item prices and writes
+item_metrics.csv (one row per item) and metrics.json (overall totals) next
+to it. The dashboard serves its RMSE and profit cards from these.
+
+Profit follows the DMC 2020 task: predictions are clipped at zero and
+rounded, units_sold = min(truth, pred), units_overstock = max(pred - truth, 0)
+and profit = units_sold x price - units_overstock x price x 0.6.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import data_store
+
+OVERSTOCK_FEE = 0.6
+METRICS_FILE = 'item_metrics.csv'
+TOTALS_FILE = 'metrics.json'
+
+
+def units(y_true, y_pred):
+    """
+    Units sold and overstocked for aligned arrays of truth and predictions.
+
+    Arguments:
+    - y_true (numpy array): ground truth (correct) target values.
+    - y_pred (numpy array): estimated target values, clipped at zero and rounded here.
+
+    Returns:
+    - units_sold, units_overstock
+    """
+    y_true = np.asarray(y_true, dtype='float')
+    y_pred = np.round(np.where(np.asarray(y_pred) > 0, y_pred, 0))
+    return np.minimum(y_true, y_pred), np.maximum(y_pred - y_true, 0)
+
+
+def profit(y_true, y_pred, price, item_codes=None, minlength=0):
+    """
+    Computes profit according to DMC 2020 task, in one vectorized pass.
+
+    Arguments:
+    - y_true (numpy array or list): ground truth (correct) target values.
+    - y_pred (numpy array or list): estimated target values.
+    - price (numpy array, list or scalar): item prices, aligned with y_true.
+    - item_codes (numpy array, optional): integer code in [0, n_items) of the item of each row.
+    - minlength (int): minimum length of the per-item result.
+
+    Returns:
+    - total profit, or profit per item code when item_codes is given
+
+    Examples:
+
+    profit(y_true = np.array([5, 5, 5]),
+           y_pred = np.array([0, 0, 0]),
+           price  = np.array([1, 1, 1]))
+    """
+    units_sold, units_overstock = units(y_true, y_pred)
+    price = np.asarray(price, dtype='float')
+    row_profit = units_sold * price - units_overstock * price * OVERSTOCK_FEE
+    if item_codes is None:
+        return row_profit.sum()
+    return np.bincount(item_codes, weights=row_profit, minlength=minlength)
+
+
+def item_metrics(result, prices):
+    """
+    Compute forecast metrics for every item of a result table.
+
+    Arguments:
+    - result (DataFrame): one row per item and day with itemID, Truth and Pred.
+    - prices (DataFrame): one row per item with itemID and simulationPrice.
+
+    Returns:
+    - DataFrame with one row per item: itemID, days, sq_error, rmse,
+      units_sold, units_overstock, revenue, fee and profit
+    """
+    item_ids, codes = np.unique(result['itemID'].to_numpy(), return_inverse=True)
+    truth = result['Truth'].to_numpy(dtype='float')
+    pred = result['Pred'].to_numpy(dtype='float')
+
+    # price of every result row, NaN for items without a price
+    price_ids = prices['itemID'].to_numpy()
+    order = np.argsort(price_ids)
+    pos = np.searchsorted(price_ids, item_ids, sorter=order).clip(0, max(len(price_ids) - 1, 0))
+    item_price = np.full(len(item_ids), np.nan)
+    if len(price_ids):
+        found = price_ids[order[pos]] == item_ids
+        item_price[found] = prices['simulationPrice'].to_numpy(dtype='float')[order[pos[found]]]
+    price = item_price[codes]
+
+    units_sold, units_overstock = units(truth, pred)
+
+    def per_item(values):
+        return np.bincount(codes, weights=values, minlength=len(item_ids))
+
+    days = np.bincount(codes, minlength=len(item_ids))
+    sq_error = per_item((pred - truth) ** 2)
+    revenue = per_item(units_sold * price)
+    fee = per_item(units_overstock * price * OVERSTOCK_FEE)
+    item_profit = profit(truth, pred, price, item_codes=codes, minlength=len(item_ids))
+
+    return pd.DataFrame({
+        'itemID':          item_ids,
+        'days':            days,
+        'sq_error':        sq_error,
+        'rmse':            np.sqrt(sq_error / np.maximum(days, 1)),
+        'units_sold':      per_item(units_sold),
+        'units_overstock': per_item(units_overstock),
+        'revenue':         revenue,
+        'fee':             fee,
+        'profit':          item_profit,
+    })
+
+
+def overall(metrics):
+    """
+    Aggregate per-item metrics to totals over all items and days.
+
+    Arguments:
+    - metrics (DataFrame): output of item_metrics.
+
+    Returns:
+    - dict with items, rmse, units_sold, units_overstock, revenue, fee and profit
+    """
+    days = metrics['days'].sum()
+    return {
+        'items':           int(len(metrics)),
+        'rmse':            float(np.sqrt(metrics['sq_error'].sum() / max(days, 1))),
+        'units_sold':      float(metrics['units_sold'].sum()),
+        'units_overstock': float(metrics['units_overstock'].sum()),
+        'revenue':         float(metrics['revenue'].sum()),
+        'fee':             float(metrics['fee'].sum()),
+        'profit':          float(metrics['profit'].sum()),
+    }
+
+
+def write(metrics, data_dir=data_store.DATA_DIR):
+    """
+    Persist per-item metrics and their totals next to result.csv.
+
+    Arguments:
+    - metrics (DataFrame): output of item_metrics.
+    - data_dir (str): directory holding result.csv.
+
+    Returns:
+    - the totals written to metrics.json
+    """
+    totals = overall(metrics)
+    metrics.to_csv(os.path.join(data_dir, METRICS_FILE), index=False)
+    with open(os.path.join(data_dir, TOTALS_FILE), 'w') as f:
+        json.dump(totals, f, indent=1)
+    return totals
+
+
+if __name__ == '__main__':
+    result = data_store.read_csv('result')
+    prices = data_store.read_csv('infos')[['itemID', 'simulationPrice']]
+    totals = write(item_metrics(result, prices))
+    print('Wrote metrics for {} items: RMSE = {:.3f}, PROFIT = {:.2f}'.format(
+        totals['items'], totals['rmse'], totals['profit']))
@@ -0,0 +1,87 @@
+"""
+Prefix search behind the dashboard's item and manufacturer dropdowns.
+
+The dropdowns used to embed an option for every item in the page layout, so
+the first payload grew with the catalogue. They now start with a page of
+options and ask the server for more as the user types: a PrefixIndex keeps
+the search keys of all options in one sorted array, and the options matching
+a typed prefix are the contiguous range between two binary searches. Within
+the range, shorter keys come first, so typing 12 offers item 12 before item
+1200.
+"""
+
+import numpy as np
+import pandas as pd
+
+OPTIONS_LIMIT = 50
+
+
+class PrefixIndex:
+    """
+    Dropdown options found by a prefix of any of their search keys.
+
+    An option may have several keys, e.g. its item ID, manufacturer and brand.
+
+    :param keys: Search key of every entry
+    :param values: Option value of every entry
+    :param labels: Option label of every entry
+    """
+
+    def __init__(self, keys, values, labels):
+        keys = np.array([str(key).lower() for key in keys], dtype='str')
+        values, labels = np.asarray(values, dtype='object'), np.asarray(labels, dtype='object')
+        order = np.argsort(keys, kind='stable')
+        self.keys, self.values, self.labels = keys[order], values[order], labels[order]
+        # position of every entry when sorted by key length, then key
+        natural = np.lexsort((self.keys, np.char.str_len(self.keys)))
+        self.rank = np.empty(len(natural), dtype='int64')
+        self.rank[natural] = np.arange(len(natural))
+        self._labels = dict(zip(self.values.tolist(), self.labels.tolist()))
+
+    def __len__(self):
+        return len(self._labels)
+
+    def search(self, prefix, limit=OPTIONS_LIMIT):
+        """
+        :param prefix: Typed text, matched case-insensitively at the start of the keys
+        :param limit: Largest number of values returned
+        :return: Values of the matching options, shortest keys first, without repeats
+        """
+        prefix = (prefix or '').strip().lower()
+        start = np.searchsorted(self.keys, prefix, side='left')
+        stop = np.searchsorted(self.keys, prefix + chr(0x10FFFF), side='left')
+        rank = self.rank[start:stop]
+        found = np.arange(len(rank))
+        if len(rank) > limit:
+            found = np.argpartition(rank, limit)[:limit]
+        found = found[np.argsort(rank[found])]
+        return pd.unique(self.values[start + found]).tolist()
+
+    def options(self, search_value, selected=None, limit=OPTIONS_LIMIT):
+        """
+        :param search_value: Typed text, or None for the first options
+        :param selected: Current value of the dropdown, kept in the options so that it stays shown
+        :param limit: Largest number of matching options
+        :return: List of dropdown options
+        """
+        values = self.search(search_value, limit)
+        if selected in self._labels and selected not in values:
+            values.append(selected)
+        return [{'label': self._labels[value], 'value': value} for value in values]
+
+
+def item_search_index(items):
+    """
+    Item options labelled with their manufacturer and brand.
+
+    :param items: Table with itemID, manufacturer and brand
+    :return: PrefixIndex finding items by ID, 'manufacturer <id>' or 'brand <id>'
+    """
+    items = items.drop_duplicates('itemID')
+    item_ids = items['itemID'].tolist()
+    labels = ['{} (manufacturer {}, brand {})'.format(item_id, manufacturer, brand) for item_id, manufacturer, brand
+              in zip(item_ids, items['manufacturer'].tolist(), items['brand'].tolist())]
+    keys = (items['itemID'].astype(str).tolist()
+            + ['manufacturer {}'.format(manufacturer) for manufacturer in items['manufacturer'].tolist()]
+            + ['brand {}'.format(brand) for brand in items['brand'].tolist()])
+    return PrefixIndex(keys, item_ids * 3, labels * 3)
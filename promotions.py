@@ -0,0 +1,197 @@
+"""
+Promotion labelling of the daily order grid.
+
+A day is labelled as a promotion when its orders form a peak of the item's
+series, as found by
+
+    find_peaks(np.append(orders, median), prominence = max(5, std), height = median + 2*std)
+
+with the item's median and standard deviation. This module reproduces that
+rule for all items at once on a dense item x day matrix instead of calling
+find_peaks once per item.
+"""
+
+import numpy as np
+
+
+def detect_promotions(orders, avg=None, std=None):
+    """
+    Label promotion days of every item in one batched pass.
+
+    Arguments:
+    - orders (numpy array): item x day matrix of daily orders.
+    - avg (numpy array): median of every item's series, computed from orders by default;
+      given when orders holds only the last days of the series (see OrderStats).
+    - std (numpy array): standard deviation of every item's series, likewise.
+
+    Returns:
+    - int8 item x day matrix, 1 on promotion days and 0 elsewhere
+    """
+    orders = np.asarray(orders, dtype='float')
+    n_items, n_days = orders.shape
+    promo = np.zeros((n_items, n_days), dtype='int8')
+    if n_items == 0 or n_days == 0:
+        return promo
+
+    if avg is None:
+        avg = np.median(orders, axis=1)
+    if std is None:
+        std = np.std(orders, axis=1, ddof=1) if n_days > 1 else np.full(n_items, np.nan)
+    height = avg + 2 * std
+    prominence = np.fmax(5, std)
+
+    # append the median to enable marking the last day as a promotion
+    x = np.hstack([orders, avg[:, None]])
+    width = n_days + 1
+    flat = x.ravel()
+
+    # runs of equal values within a row: a run is a peak when both neighbours are
+    # lower, and the peak sits in its middle (plateaus as in find_peaks)
+    col = np.tile(np.arange(width), n_items)
+    starts = np.flatnonzero((col == 0) | np.r_[True, flat[1:] != flat[:-1]])
+    ends = np.r_[starts[1:], len(flat)] - 1
+    inner = (col[starts] > 0) & (col[ends] < width - 1)
+    starts, ends = starts[inner], ends[inner]
+    value = flat[starts]
+    is_peak = (flat[starts - 1] < value) & (flat[ends + 1] < value)
+    peaks = (starts[is_peak] + ends[is_peak]) // 2
+    rows = peaks // width
+
+    # minimal height of a peak
+    keep = flat[peaks] >= height[rows]
+    peaks, rows = peaks[keep], rows[keep]
+
+    # prominence: the peak has to rise at least max(5, std) above the lowest point
+    # on each side before the series climbs above the peak; walk all candidates
+    # outwards together and drop them as soon as a side is settled
+    value = flat[peaks]
+    target = prominence[rows]
+    keep = np.ones(len(peaks), dtype='bool')
+    for step in (-1, 1):
+        side_ok = np.zeros(len(peaks), dtype='bool')
+        idx = np.flatnonzero(keep)
+        pos = peaks[idx] % width
+        while len(idx):
+            pos = pos + step
+            inside = (pos >= 0) & (pos < width)
+            idx, pos = idx[inside], pos[inside]
+            neighbour = flat[rows[idx] * width + pos]
+            below = neighbour <= value[idx]
+            idx, pos, neighbour = idx[below], pos[below], neighbour[below]
+            reached = value[idx] - neighbour >= target[idx]
+            side_ok[idx[reached]] = True
+            idx, pos = idx[~reached], pos[~reached]
+        keep &= side_ok
+    peaks, rows = peaks[keep], rows[keep]
+
+    # the appended median is never a promotion day
+    cols = peaks % width
+    on_day = cols < n_days
+    promo[rows[on_day], cols[on_day]] = 1
+    return promo
+
+
+def label_promotions(agg_orders):
+    """
+    Promotion labels for a long-format order grid.
+
+    Arguments:
+    - agg_orders (DataFrame): one row per item and day with itemID, day_of_year and order.
+
+    Returns:
+    - numpy array of 0/1 labels aligned with the rows of agg_orders
+    """
+    item_codes, item_ids = agg_orders['itemID'].factorize()
+    days, day_codes = np.unique(agg_orders['day_of_year'].to_numpy(), return_inverse=True)
+    if len(agg_orders) != len(item_ids) * len(days):
+        raise ValueError('agg_orders must hold every item on every day')
+
+    orders = np.zeros((len(item_ids), len(days)))
+    orders[item_codes, day_codes] = agg_orders['order'].to_numpy()
+    return detect_promotions(orders)[item_codes, day_codes]
+
+
+class OrderStats:
+    """
+    Running median and standard deviation of every item's daily orders.
+
+    Daily orders are non-negative integers. Values below `dense` are counted in
+    an item x value histogram and the rare larger ones are kept sorted per item,
+    so adding a day costs the same however long the history is.
+
+    Arguments:
+    - n_items (int): number of items.
+    - dense (int): values counted in the histogram.
+    """
+
+    def __init__(self, n_items, dense=256):
+        self.n_days = 0
+        self.total = np.zeros(n_items, dtype='int64')
+        self.squares = np.zeros(n_items, dtype='int64')
+        self.hist = np.zeros((n_items, dense), dtype='int32')
+        self.large = {}
+
+    @classmethod
+    def from_orders(cls, orders, dense=256):
+        """
+        Statistics of an item x day matrix of daily orders.
+
+        Arguments:
+        - orders (numpy array): item x day matrix of daily orders.
+        - dense (int): values counted in the histogram.
+
+        Returns:
+        - OrderStats
+        """
+        stats = cls(orders.shape[0], dense)
+        stats.add(orders)
+        return stats
+
+    def add(self, orders):
+        """
+        Add days to the statistics.
+
+        Arguments:
+        - orders (numpy array): orders of every item, a vector for one day or an item x day matrix.
+        """
+        orders = np.asarray(orders, dtype='int64').reshape(len(self.total), -1)
+        n_items, dense = self.hist.shape
+        self.n_days += orders.shape[1]
+        self.total += orders.sum(axis=1)
+        self.squares += (orders ** 2).sum(axis=1)
+
+        small = orders < dense
+        rows = np.broadcast_to(np.arange(n_items)[:, None], orders.shape)
+        self.hist += np.bincount(rows[small] * dense + orders[small],
+                                 minlength=n_items * dense).reshape(n_items, dense).astype('int32')
+        for item, value in zip(rows[~small], orders[~small]):
+            self.large.setdefault(int(item), []).append(int(value))
+        for item in set(rows[~small].tolist()):
+            self.large[item].sort()
+
+    def _value_at(self, rank):
+        # value of the given rank (0-based) in every item's sorted series
+        cum = np.cumsum(self.hist, axis=1)
+        values = np.argmax(cum > rank, axis=1).astype('float')
+        for item, large in self.large.items():
+            if cum[item, -1] <= rank:
+                values[item] = large[rank - cum[item, -1]]
+        return values
+
+    def median(self):
+        """
+        Returns:
+        - median of every item's daily orders
+        """
+        return (self._value_at((self.n_days - 1) // 2) + self._value_at(self.n_days // 2)) / 2
+
+    def std(self):
+        """
+        Returns:
+        - standard deviation (ddof = 1) of every item's daily orders
+        """
+        n = self.n_days
+        if n < 2:
+            return np.full(len(self.total), np.nan)
+        var = (n * self.squares - self.total ** 2) / (n * (n - 1))
+        return np.sqrt(np.maximum(var, 0))
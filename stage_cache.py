@@ -0,0 +1,393 @@
+"""
+Content-addressed cache of the notebook's pipeline stages.
+
+The notebook wrote its intermediate frames and cross-validation results to
+hand-named pickle files, with nothing tying a file to the data and settings
+that produced it. Here every stage result is stored under a key hashed from
+the stage's input data and parameters (fingerprint). Running a stage whose
+key is already stored loads the result instead of computing it, and writing
+a new result of a stage evicts its older ones, which no longer match the
+inputs.
+
+Results are written column by column, as in data_store: every column of a
+frame and every array is an .npy file, and lists, tuples and dicts of them
+are described by a JSON manifest. Only values without a columnar form (such
+as fitted models) are pickled.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = os.path.join('prepared', 'cache')
+MANIFEST = 'manifest.json'
+
+
+def fingerprint(value, digest=None):
+    '''
+    Hash of a value's content: frames and arrays by their data, containers by
+    their items, functions by their name and other objects by their public attributes.
+
+    Arguments:
+    - value: value to hash.
+    - digest (hashlib object): digest to update, a new one by default.
+
+    Returns:
+    - 16 hex digits
+    '''
+    top = digest is None
+    if top:
+        digest = hashlib.sha1()
+
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        frame = value.to_frame() if isinstance(value, pd.Series) else value
+        digest.update(repr((type(value).__name__, [str(c) for c in frame.columns],
+                            [str(t) for t in frame.dtypes], frame.shape)).encode())
+        for values in [frame.index.to_series()] + [frame.iloc[:, i] for i in range(frame.shape[1])]:
+            if isinstance(values.dtype, np.dtype) and values.dtype != object:
+                digest.update(np.ascontiguousarray(values.to_numpy()).tobytes())
+            else:
+                digest.update(pd.util.hash_pandas_object(values, index=False).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray) and value.dtype != object:
+        digest.update(repr(('ndarray', str(value.dtype), value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        digest.update(b'dict')
+        for key in sorted(value, key=str):
+            fingerprint(key, digest)
+            fingerprint(value[key], digest)
+    elif isinstance(value, (list, tuple, np.ndarray)):
+        digest.update(repr((type(value).__name__, len(value))).encode())
+        for item in value:
+            fingerprint(item, digest)
+    elif hasattr(value, '__self__') and hasattr(value, '__func__'):
+        # bound method, such as an AsymmetricMSE objective
+        digest.update(value.__func__.__qualname__.encode())
+        fingerprint(value.__self__, digest)
+    elif callable(value) and hasattr(value, '__qualname__'):
+        digest.update('{}.{}'.format(value.__module__, value.__qualname__).encode())
+    elif hasattr(value, '__dict__'):
+        digest.update(type(value).__qualname__.encode())
+        fingerprint({k: v for k, v in vars(value).items() if not k.startswith('_')}, digest)
+    else:
+        digest.update(repr((type(value).__name__, value)).encode())
+
+    if top:
+        return digest.hexdigest()[:16]
+
+
+def _is_strings(values):
+    if values.dtype != object:
+        return pd.api.types.is_string_dtype(values.dtype)
+    return bool(values.map(lambda v: isinstance(v, str) or v is None or v != v).all())
+
+
+class _Writer:
+    # writes the values of one entry as numbered files and returns their JSON spec
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.count = 0
+
+    def _file(self, extension):
+        self.count += 1
+        return '{}.{}'.format(self.count, extension)
+
+    def array(self, values):
+        file_name = self._file('npy')
+        np.save(os.path.join(self.directory, file_name), values, allow_pickle=False)
+        return file_name
+
+    def pickled(self, value):
+        file_name = self._file('pkl')
+        with open(os.path.join(self.directory, file_name), 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return {'kind': 'pickle', 'file': file_name}
+
+    def column(self, values):
+        dtype = values.dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            return {'kind': 'category', 'codes': self.array(values.cat.codes.to_numpy()),
+                    'categories': self.column(pd.Series(values.cat.categories)), 'ordered': bool(dtype.ordered)}
+        if _is_strings(values):
+            return {'kind': 'string', 'dtype': str(dtype), 'values': self.array(values.fillna('').to_numpy(dtype='U')),
+                    'missing': self.array(values.isnull().to_numpy())}
+        if isinstance(dtype, np.dtype) and dtype != object:
+            return {'kind': 'array', 'file': self.array(values.to_numpy())}
+        return self.pickled(values.array)
+
+    def frame(self, df):
+        columns = [self.column(df.iloc[:, i]) for i in range(df.shape[1])]
+        index = df.index
+        if isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1:
+            index_spec = None
+        elif isinstance(index, pd.MultiIndex):
+            index_spec = self.pickled(index)
+        else:
+            index_spec = self.column(pd.Series(index.to_numpy(), name=index.name))
+        names = list(df.columns)
+        if not all(isinstance(name, str) for name in names):
+            names = self.pickled(names)
+        return {'kind': 'frame', 'names': names,
+                'columns': columns, 'index': index_spec, 'index_name': index.name, 'rows': len(df)}
+
+    def value(self, value):
+        if isinstance(value, pd.DataFrame):
+            return self.frame(value)
+        if isinstance(value, pd.Series):
+            return {'kind': 'series', 'name': value.name, 'frame': self.frame(value.to_frame('values'))}
+        if isinstance(value, np.ndarray) and value.dtype != object:
+            return {'kind': 'array', 'file': self.array(value)}
+        if isinstance(value, (list, tuple)):
+            return {'kind': type(value).__name__, 'items': [self.value(item) for item in value]}
+        if isinstance(value, dict) and all(isinstance(key, str) for key in value):
+            return {'kind': 'dict', 'items': [[key, self.value(item)] for key, item in value.items()]}
+        if isinstance(value, np.generic):
+            value = value.item()
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return {'kind': 'value', 'value': value}
+        return self.pickled(value)
+
+
+class _Reader:
+    # reads the values described by a spec back from the files of one entry
+
+    def __init__(self, directory, mmap):
+        self.directory = directory
+        self.mmap_mode = 'r' if mmap else None
+
+    def array(self, file_name):
+        return np.load(os.path.join(self.directory, file_name), mmap_mode=self.mmap_mode, allow_pickle=False)
+
+    def column(self, spec):
+        kind = spec['kind']
+        if kind == 'category':
+            categories = self.column(spec['categories'])
+            return pd.Categorical.from_codes(np.asarray(self.array(spec['codes'])), categories,
+                                             ordered=spec['ordered'])
+        if kind == 'string':
+            values = pd.Series(self.array(spec['values']), dtype=object)
+            values[np.asarray(self.array(spec['missing']))] = np.nan
+            return values.to_numpy() if spec['dtype'] == 'object' else values.astype(spec['dtype']).array
+        return self.value(spec)
+
+    def frame(self, spec):
+        data = {i: self.column(column) for i, column in enumerate(spec['columns'])}
+        index = None
+        if spec['index'] is not None:
+            index = self.column(spec['index'])
+            if not isinstance(index, pd.Index):
+                index = pd.Index(index, name=spec['index_name'])
+        df = pd.DataFrame(data, index=index, copy=False)
+        if not len(data):
+            df = pd.DataFrame(index=index if index is not None else pd.RangeIndex(spec['rows']))
+        for i, column in enumerate(spec['columns']):
+            # pandas infers str for strings, object columns stay object
+            if column['kind'] == 'string' and column['dtype'] == 'object':
+                df.isetitem(i, df.iloc[:, i].astype(object))
+        names = spec['names']
+        df.columns = self.value(names) if isinstance(names, dict) else names
+        return df
+
+    def value(self, spec):
+        kind = spec['kind']
+        if kind == 'frame':
+            return self.frame(spec)
+        if kind == 'series':
+            return self.frame(spec['frame'])['values'].rename(spec['name'])
+        if kind == 'array':
+            return self.array(spec['file'])
+        if kind in ('list', 'tuple'):
+            items = [self.value(item) for item in spec['items']]
+            return items if kind == 'list' else tuple(items)
+        if kind == 'dict':
+            return {key: self.value(item) for key, item in spec['items']}
+        if kind == 'value':
+            return spec['value']
+        with open(os.path.join(self.directory, spec['file']), 'rb') as f:
+            return pickle.load(f)
+
+
+class StageCache:
+    '''
+    Stage results stored by a hash of their inputs and parameters.
+
+    Arguments:
+    - directory (str): cache directory, one subdirectory per stage and one entry per key.
+    - keep (int): entries kept per stage; writing a result evicts the older ones.
+    - mmap (bool): memory-map the arrays of loaded results instead of reading them.
+
+    Examples:
+
+    cache  = StageCache()
+    orders = cache.stage('feat_orders', lambda: build_features(grid, items),
+                         inputs = [agg_orders, items], params = {'days_input': days_input})
+    '''
+
+    def __init__(self, directory=CACHE_DIR, keep=1, mmap=False):
+        self.directory = directory
+        self.keep = keep
+        self.mmap = mmap
+
+    def key(self, name, inputs=(), params=None):
+        '''
+        Arguments:
+        - name (str): stage name.
+        - inputs (list): data the stage reads.
+        - params (dict): settings of the stage.
+
+        Returns:
+        - key of the stage result
+        '''
+        digest = hashlib.sha1(name.encode())
+        fingerprint(list(inputs), digest)
+        fingerprint(params, digest)
+        return digest.hexdigest()[:16]
+
+    def _path(self, name, key):
+        return os.path.join(self.directory, name, key)
+
+    def has(self, name, key):
+        return os.path.exists(os.path.join(self._path(name, key), MANIFEST))
+
+    def put(self, name, value, inputs=(), params=None, key=None):
+        '''
+        Store a stage result and evict the stage's older results.
+
+        Arguments:
+        - name (str): stage name.
+        - value: result, a frame, series, array, scalar or list, tuple or dict of them.
+        - inputs (list): data the stage read.
+        - params (dict): settings of the stage.
+        - key (str): key of the result, computed from inputs and params by default.
+
+        Returns:
+        - value
+        '''
+        key = key or self.key(name, inputs, params)
+        path = self._path(name, key)
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        time_start = time.time()
+        spec = _Writer(tmp_path).value(value)
+        with open(os.path.join(tmp_path, MANIFEST), 'w') as f:
+            json.dump({'stage': name, 'key': key, 'created': time.time(), 'value': spec}, f)
+        # entries are written whole or not at all; a concurrent writer of the same key wins
+        shutil.rmtree(path, ignore_errors=True)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        print('cache: {} {} written in {:.1f}s'.format(name, key, time.time() - time_start))
+
+        self.evict(name)
+        return value
+
+    def get(self, name, key):
+        '''
+        Arguments:
+        - name (str): stage name.
+        - key (str): key of the result.
+
+        Returns:
+        - the stored result
+        '''
+        path = self._path(name, key)
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+        os.utime(os.path.join(path, MANIFEST))
+        return _Reader(path, self.mmap).value(manifest['value'])
+
+    def latest(self, name):
+        '''
+        Most recently written result of a stage, to resume after a restart
+        without recomputing the stage's inputs.
+
+        Arguments:
+        - name (str): stage name.
+
+        Returns:
+        - the stored result
+        '''
+        entries = self.entries(name)
+        if entries.empty:
+            raise KeyError('no cached result of stage {}'.format(name))
+        return self.get(name, entries['key'].iloc[-1])
+
+    def stage(self, name, compute, inputs=(), params=None):
+        '''
+        Load a stage result if its inputs and parameters are unchanged, otherwise
+        compute and store it.
+
+        Arguments:
+        - name (str): stage name.
+        - compute (function): computes the result without arguments.
+        - inputs (list): data the stage reads.
+        - params (dict): settings of the stage.
+
+        Returns:
+        - the stage result
+        '''
+        key = self.key(name, inputs, params)
+        if self.has(name, key):
+            print('cache: {} {} loaded'.format(name, key))
+            return self.get(name, key)
+        return self.put(name, compute(), key=key)
+
+    def entries(self, name=None):
+        '''
+        Arguments:
+        - name (str): stage name, every stage by default.
+
+        Returns:
+        - DataFrame with stage, key, size in MiB, creation and last use, oldest first
+        '''
+        rows = []
+        names = [name] if name else sorted(os.listdir(self.directory)) if os.path.isdir(self.directory) else []
+        for stage in names:
+            stage_dir = os.path.join(self.directory, stage)
+            if not os.path.isdir(stage_dir):
+                continue
+            for key in os.listdir(stage_dir):
+                path = os.path.join(stage_dir, key)
+                manifest = os.path.join(path, MANIFEST)
+                if key.endswith('.tmp') or not os.path.exists(manifest):
+                    continue
+                with open(manifest) as f:
+                    created = json.load(f)['created']
+                size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                rows.append({'stage': stage, 'key': key, 'mib': size / 2 ** 20,
+                             'created': created, 'used': os.path.getmtime(manifest)})
+        entries = pd.DataFrame(rows, columns=['stage', 'key', 'mib', 'created', 'used'])
+        return entries.sort_values('created').reset_index(drop=True)
+
+    def evict(self, name=None, max_mib=None):
+        '''
+        Remove stale results: all but the `keep` newest of every stage and, with
+        max_mib, the least recently used ones until the cache fits.
+
+        Arguments:
+        - name (str): stage name, every stage by default.
+        - max_mib (float): size limit of the cache in MiB.
+
+        Returns:
+        - number of removed results
+        '''
+        entries = self.entries(name)
+        newest = entries.groupby('stage').cumcount(ascending=False) < self.keep
+        stale, fresh = entries[~newest], entries[newest].sort_values('used')
+        if max_mib is not None:
+            # least recently used first, until the rest fits
+            before = fresh['mib'].sum() - (fresh['mib'].cumsum() - fresh['mib'])
+            stale = pd.concat([stale, fresh[before > max_mib]])
+        for stage, key in zip(stale['stage'], stale['key']):
+            shutil.rmtree(self._path(stage, key), ignore_errors=True)
+        return len(stale)
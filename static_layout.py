@@ -0,0 +1,192 @@
+"""
+Pre-rendered, pre-compressed layout of the dashboard.
+
+The layout holds no per-request state: its figures, dropdown pages and
+labels only change with the data. Dash nevertheless serialized it to JSON on
+every page load, and Flask-Compress gzipped the result again on the way
+out. StaticLayout renders it once per process, keeps gzip and Brotli copies
+next to the JSON, and serves whichever the browser accepts. Every encoding
+has its own strong ETag, derived from the JSON, so a reload of an unchanged
+page is answered with 304 Not Modified and no body.
+
+Running `python static_layout.py` renders the layout and writes the JSON and
+its copies compressed at the highest levels to data/layout. At startup the
+app uses these files when they hold the layout it has just built; otherwise,
+e.g. after the data or the app changed, it compresses in process at faster
+levels until the next build.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import time
+
+import flask
+from plotly.utils import PlotlyJSONEncoder
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from data_store import DATA_DIR
+
+LAYOUT_DIR = os.environ.get('STATIC_LAYOUT_DIR', os.path.join(DATA_DIR, 'layout'))
+LAYOUT_FILE = 'layout.json'
+MANIFEST = 'manifest.json'
+
+# file suffix of every encoding, and its compression levels at build time and at startup
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+BUILD_LEVELS = {'br': 11, 'gzip': 9}
+STARTUP_LEVELS = {'br': 5, 'gzip': 6}
+
+
+def render(layout):
+    """
+    :param layout: The app's layout
+    :return: The layout as Dash serves it, JSON bytes
+    """
+    return json.dumps(layout, cls=PlotlyJSONEncoder).encode()
+
+
+def compress(payload, encoding, level):
+    """
+    :param payload: Bytes to compress
+    :param encoding: 'br' or 'gzip'
+    :param level: Compression level, Brotli quality for 'br'
+    :return: The compressed bytes
+    """
+    if encoding == 'br':
+        return brotli.compress(payload, quality=level)
+    return gzip.compress(payload, compresslevel=level, mtime=0)
+
+
+class StaticLayout:
+    """
+    The layout's JSON and its compressed copies, served with ETags.
+
+    :param payload: The layout's JSON bytes
+    :param encoded: Dict of encoding to compressed copy of the payload
+    """
+
+    def __init__(self, payload, encoded):
+        self.payload = payload
+        self.encoded = encoded
+        self.digest = hashlib.sha1(payload).hexdigest()[:20]
+
+    @classmethod
+    def prepare(cls, layout, directory=LAYOUT_DIR):
+        """
+        Render the layout and take its compressed copies from the last build when it matches.
+
+        :param layout: The app's layout
+        :param directory: Output of the build step
+        :return: The StaticLayout
+        """
+        payload = render(layout)
+        built = cls.load(directory)
+        if built is not None and built.payload == payload:
+            return built
+        encoded = {encoding: compress(payload, encoding, level) for encoding, level in STARTUP_LEVELS.items()
+                   if encoding != 'br' or brotli is not None}
+        return cls(payload, encoded)
+
+    @classmethod
+    def load(cls, directory=LAYOUT_DIR):
+        """
+        :param directory: Output of the build step
+        :return: The built StaticLayout, or None when there is no complete build
+        """
+        try:
+            with open(os.path.join(directory, MANIFEST)) as f:
+                manifest = json.load(f)
+            with open(os.path.join(directory, LAYOUT_FILE), 'rb') as f:
+                payload = f.read()
+            encoded = {}
+            for encoding in manifest['encodings']:
+                with open(os.path.join(directory, LAYOUT_FILE + ENCODINGS[encoding]), 'rb') as f:
+                    encoded[encoding] = f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+        layout = cls(payload, encoded)
+        return layout if layout.digest == manifest.get('digest') else None
+
+    def save(self, directory=LAYOUT_DIR):
+        """
+        Write the JSON, its compressed copies and a manifest.
+
+        :param directory: Output directory
+        """
+        os.makedirs(directory, exist_ok=True)
+        files = {LAYOUT_FILE: self.payload}
+        files.update({LAYOUT_FILE + ENCODINGS[encoding]: body for encoding, body in self.encoded.items()})
+        files[MANIFEST] = json.dumps({'digest': self.digest, 'encodings': sorted(self.encoded)}, indent=1).encode()
+        # manifest last, so that a partial build is never loaded
+        for file_name, body in files.items():
+            tmp_path = os.path.join(directory, file_name + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, os.path.join(directory, file_name))
+
+    def etag(self, encoding):
+        """
+        :param encoding: 'br', 'gzip' or None for the plain JSON
+        :return: Strong ETag of that representation, unquoted
+        """
+        return self.digest if encoding is None else '{}-{}'.format(self.digest, encoding)
+
+    def serve(self):
+        """
+        Flask view of the layout: the best encoding the request accepts, or 304 when its ETag matches
+        """
+        request = flask.request
+        accepted = [encoding for encoding in self.encoded if request.accept_encodings[encoding]]
+        encoding = min(accepted, key=lambda encoding: len(self.encoded[encoding]), default=None)
+        etag = self.etag(encoding)
+
+        if request.if_none_match.contains(etag):
+            response = flask.Response(status=304)
+        else:
+            response = flask.Response(self.encoded.get(encoding, self.payload), mimetype='application/json')
+            if encoding is not None:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Vary'] = 'Accept-Encoding'
+        # cached by the browser, revalidated on every page load
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    def register(self, app):
+        """
+        Serve this layout at the app's layout route instead of Dash's serializer.
+
+        :param app: The Dash app
+        """
+        app.server.view_functions[app.config.routes_pathname_prefix + '_dash-layout'] = self.serve
+
+
+def build(layout, directory=LAYOUT_DIR):
+    """
+    Render the layout and write it with copies compressed at the highest levels.
+
+    :param layout: The app's layout
+    :param directory: Output directory
+    :return: The StaticLayout
+    """
+    payload = render(layout)
+    encoded = {encoding: compress(payload, encoding, level) for encoding, level in BUILD_LEVELS.items()
+               if encoding != 'br' or brotli is not None}
+    static_layout = StaticLayout(payload, encoded)
+    static_layout.save(directory)
+    return static_layout
+
+
+if __name__ == '__main__':
+    time_start = time.time()
+    import app
+    static_layout = build(app.app.layout)
+    print('Rendered the layout to {} in {:.2f}s: {:.0f} KiB JSON, {}'.format(
+        LAYOUT_DIR, time.time() - time_start, len(static_layout.payload) / 1024,
+        ', '.join('{:.0f} KiB {}'.format(len(body) / 1024, encoding)
+                  for encoding, body in sorted(static_layout.encoded.items()))))
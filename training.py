@@ -0,0 +1,481 @@
+"""
+Cross-validation of the two-stage LightGBM demand model.
+
+The notebook trained its 20 folds one after another. Every fold is
+independent: it trains on a window of days and validates on the single day
+test_days + 1 after it. cross_validate runs the folds in a process pool,
+splitting the cores between concurrent folds and LightGBM threads.
+
+The features are written once, rows sorted by day_of_year, as a float32
+.npy matrix that every worker maps read-only, so they are shared through the
+page cache instead of being pickled to each process. A fold's training and
+validation days are then contiguous row ranges, and LightGBM gets views of
+the mapped matrix instead of per-fold copies of the feature frame. Results
+are collected in fold order and are the same as with the serial loop.
+"""
+
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from metrics import profit
+
+NUM_FOLDS = 20
+TEST_DAYS = 14
+# days of history the first feature day needs (the longest lookback window)
+LOOKBACK = 35
+
+SHARED = ['X', 'y', 'price', 'day_of_year', 'X_test']
+
+
+##### TRAINING AND VALIDATION LOSS
+class AsymmetricMSE:
+    '''
+    Asymmetric MSE objective and evaluation metric for LightGBM regressor.
+
+    Squared errors of underestimates (y_true > y_pred) are weighted by `under`,
+    those of overestimates by `over`. Gradient and hessian are computed in one
+    pass into buffers kept between boosting rounds, and returned as float32,
+    the type LightGBM copies them to.
+
+    Arguments:
+    - under (float): slope of underestimates.
+    - over (float): slope of overestimates.
+
+    Examples:
+
+    loss = AsymmetricMSE(under = 2, over = 0.72)
+    lgb.LGBMRegressor(objective = loss.objective).fit(X, y, eval_metric = loss.metric)
+    '''
+
+    def __init__(self, under=2.0, over=0.72):
+        self.under = under
+        self.over  = over
+        # over + mask * (under - over) gives the slopes exactly unless they are
+        # far apart, in which case they are written with a (slower) masked copy
+        self._step = under - over if over + (under - over) == under else None
+        self._buffers = {}
+
+    def __getstate__(self):
+        # buffers are not sent to worker processes
+        return {'under': self.under, 'over': self.over}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _error(self, y_true, y_pred):
+        n = len(y_pred)
+        if n not in self._buffers:
+            self._buffers[n] = {'error': np.empty(n), 'coef': np.empty(n), 'mask': np.empty(n, dtype = 'bool'),
+                                'grad': np.empty(n, dtype = 'float32'), 'hess': np.empty(n, dtype = 'float32')}
+        buffers = self._buffers[n]
+
+        # error = -residual, so that the gradient is coef * error without a negation
+        error = np.subtract(y_pred, y_true, out = buffers['error'], dtype = 'float')
+
+        # slope of every row
+        coef = buffers['coef']
+        mask = np.less(error, 0, out = buffers['mask'])
+        if self._step is not None:
+            np.multiply(mask, self._step, out = coef)
+            np.add(coef, self.over, out = coef)
+        else:
+            coef.fill(self.over)
+            np.copyto(coef, self.under, where = mask)
+        return error, coef, buffers
+
+    def objective(self, y_true, y_pred, weight=None):
+        '''
+        Asymmetric MSE objective for training LightGBM regressor.
+
+        LightGBM 4 passes the sample weights as the third argument; LightGBM 3
+        passes the (empty) query groups there and multiplies the weights in itself.
+
+        Arguments:
+        - y_true (numpy array or list): ground truth (correct) target values.
+        - y_pred (numpy array or list): estimated target values.
+        - weight (numpy array): sample weights, or None.
+
+        Returns:
+        - gradient matrix
+        - hessian matrix
+        '''
+        error, coef, buffers = self._error(y_true, y_pred)
+        if weight is not None:
+            np.multiply(coef, weight, out = coef)
+
+        grad = np.multiply(coef, error, out = buffers['grad'], casting = 'same_kind')
+        hess = buffers['hess']
+        np.copyto(hess, coef, casting = 'same_kind')
+
+        return grad, hess
+
+    def metric(self, y_true, y_pred):
+        '''
+        Asymmetric MSE evaluation metric for LightGBM regressor.
+
+        Arguments:
+        - y_true (numpy array or list): ground truth (correct) target values.
+        - y_pred (numpy array or list): estimated target values.
+
+        Returns:
+        - name of the metric
+        - value od the metric
+        - whether the metric is maximized
+        '''
+        error, coef, _ = self._error(y_true, y_pred)
+        np.square(error, out = error)
+
+        return 'asymmetric_mse_eval', np.dot(coef, error) / len(error), False
+
+
+# the notebook's loss: underestimates cost 2, overestimates 0.72 times the squared error
+asymmetric_loss     = AsymmetricMSE(under = 2.0, over = 0.72)
+asymmetric_mse      = asymmetric_loss.objective
+asymmetric_mse_eval = asymmetric_loss.metric
+
+
+##### POSTPROCESSING PREDICTIONS
+def postprocess_preds(y_pred):
+    '''
+    Processess demand predictions outputted by a model.
+
+    Arguments:
+    - y_pred (numpy array or list): estimated target values.
+
+    Returns:
+    - corrected y_pred
+
+    Examples:
+
+    postprocess_preds(y_pred = np.array([-2.10, 1.15, 10.78]))
+    '''
+
+    # demand can not be negative
+    y_pred = np.where(y_pred > 0, y_pred, 0)
+
+    # demand has to be integer
+    y_pred = np.round(y_pred).astype('int')
+
+    # return values
+    return y_pred
+
+
+##### COLUMN NAMES
+def model_columns(columns):
+    '''
+    Column names as the models are trained on: foreign symbols dropped and
+    duplicates numbered.
+
+    Arguments:
+    - columns (list): column names of a feature frame.
+
+    Returns:
+    - list of names
+
+    Examples:
+
+    model_columns(['price (€)', 'price'])
+    '''
+    seen = set()
+    names = []
+    for column in columns:
+        name = re.sub('[^A-Za-z0-9_]+', '', column)
+        fudge = 1
+        unique = name
+        while unique in seen:
+            fudge += 1
+            unique = '{}_{}'.format(name, fudge)
+        names.append(unique)
+        seen.add(unique)
+    return names
+
+
+def fold_windows(day_max, num_folds=NUM_FOLDS, test_days=TEST_DAYS):
+    '''
+    Training and validation days of every fold, latest validation day first.
+
+    Arguments:
+    - day_max (int): last day with a known target.
+    - num_folds (int): number of folds.
+    - test_days (int): length of the target window.
+
+    Returns:
+    - list of (t_start, t_end, v_start, v_end) tuples
+    '''
+    train_days = day_max - test_days + 1 - num_folds - LOOKBACK
+    windows = []
+    for fold in range(num_folds):
+        v_end   = day_max - fold
+        v_start = v_end
+        t_end   = v_start - (test_days + 1)
+        t_start = t_end   - (train_days - 1)
+        windows.append((t_start, t_end, v_start, v_end))
+    return windows
+
+
+def share_arrays(directory, X, y, X_test, features, block_rows=100000):
+    '''
+    Save the training data, rows sorted by day, as .npy files for workers to map read-only.
+
+    Arguments:
+    - directory (str): directory to write to.
+    - X (DataFrame): training rows with day_of_year, simulationPrice and the features.
+    - y (Series): target of every training row.
+    - X_test (DataFrame): test rows with the features.
+    - features (list): model features.
+    - block_rows (int): rows converted to float32 at a time.
+
+    Returns:
+    - positions of the rows of X in the order they were saved
+    '''
+    day_of_year = X['day_of_year'].to_numpy()
+    order = np.argsort(day_of_year, kind = 'stable')
+
+    # the feature matrix is filled in blocks of rows, so X[features] is never copied whole
+    columns = X.columns.get_indexer(features)
+    matrix = np.lib.format.open_memmap(os.path.join(directory, 'X.npy'), mode = 'w+',
+                                       dtype = 'float32', shape = (len(X), len(features)))
+    for start in range(0, len(X), block_rows):
+        rows = order[start:start + block_rows]
+        matrix[start:start + len(rows)] = X.iloc[rows, columns].to_numpy(dtype = 'float32')
+    matrix.flush()
+    del matrix
+
+    arrays = {'y':           y.to_numpy(dtype = 'float64')[order],
+              'price':       X['simulationPrice'].to_numpy(dtype = 'float64')[order],
+              'day_of_year': day_of_year[order],
+              'X_test':      X_test[features].to_numpy(dtype = 'float32')}
+    for name, values in arrays.items():
+        np.save(os.path.join(directory, name + '.npy'), values)
+    return order
+
+
+def fold_rows(day_of_year, window):
+    '''
+    Training and validation rows of a fold as contiguous ranges of day-sorted rows.
+
+    Arguments:
+    - day_of_year (numpy array): sorted day of every row.
+    - window (tuple): (t_start, t_end, v_start, v_end) of the fold.
+
+    Returns:
+    - slice of training rows, slice of validation rows
+    '''
+    t_start, t_end, v_start, v_end = window
+    bounds = np.searchsorted(day_of_year, [t_start, t_end + 1, v_start, v_end + 1])
+    return slice(bounds[0], bounds[1]), slice(bounds[2], bounds[3])
+
+
+_shared = {}
+
+
+def _load_shared(directory):
+    # a worker maps the arrays once and reuses them for all of its folds
+    if _shared.get('directory') != directory:
+        _shared.clear()
+        _shared.update({name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r') for name in SHARED})
+        _shared['directory'] = directory
+    return _shared
+
+
+def _fit_kwargs(stop_rounds, verbose):
+    import lightgbm as lgb
+    callbacks = [lgb.early_stopping(stop_rounds, verbose=False)]
+    if verbose:
+        callbacks.append(lgb.log_evaluation(verbose))
+    return {'callbacks': callbacks}
+
+
+def train_fold(directory, fold, window, features, lgb_params, lgb_classifier_params=None,
+               num_folds=NUM_FOLDS, target_transform=True, two_stage=True, stop_rounds=100, verbose=500,
+               eval_metric=asymmetric_mse_eval):
+    '''
+    Train and evaluate one fold on the shared arrays.
+
+    Arguments:
+    - directory (str): directory written by share_arrays.
+    - fold (int): fold number.
+    - window (tuple): (t_start, t_end, v_start, v_end) of the fold.
+    - features (list): model features, in the column order of the shared matrices.
+    - lgb_params (dict): parameters of the regressor.
+    - lgb_classifier_params (dict): parameters of the first stage classifier.
+    - num_folds (int): number of folds the test predictions are averaged over.
+    - target_transform (bool): train on the square root of the target.
+    - two_stage (bool): multiply predictions with a zero/non-zero classifier.
+    - stop_rounds (int): early stopping rounds.
+    - verbose (int): evaluation log period, 0 for none.
+    - eval_metric (callable): validation loss of the regressor.
+
+    Returns:
+    - dict with the fold's row ranges, predictions, metrics, importances and models
+    '''
+    # imported in the fold's process, not by the modules importing training
+    import lightgbm as lgb
+
+    data = _load_shared(directory)
+
+    # extract samples: views of the shared arrays, nothing is copied
+    train_rows, valid_rows = fold_rows(data['day_of_year'], window)
+    X_train, y_train = data['X'][train_rows], data['y'][train_rows]
+    X_valid, y_valid = data['X'][valid_rows], data['y'][valid_rows]
+    X_test = data['X_test']
+    price_train, price_valid = data['price'][train_rows], data['price'][valid_rows]
+
+    # target transformation
+    if target_transform:
+        y_train = np.sqrt(y_train)
+        y_valid = np.sqrt(y_valid)
+
+    # first stage model
+    clf_classifier = None
+    if two_stage:
+        y_train_binary = (y_train > 0).astype('float')
+        y_valid_binary = (y_valid > 0).astype('float')
+        clf_classifier = lgb.LGBMClassifier(**lgb_classifier_params)
+        clf_classifier = clf_classifier.fit(X_train, y_train_binary,
+                                            eval_set     = [(X_train, y_train_binary), (X_valid, y_valid_binary)],
+                                            eval_metric  = 'logloss',
+                                            feature_name = features,
+                                            **_fit_kwargs(stop_rounds, verbose))
+        preds_oof_fold_binary  = clf_classifier.predict(X_valid)
+        preds_test_fold_binary = clf_classifier.predict(X_test)
+
+    # training
+    clf = lgb.LGBMRegressor(**lgb_params)
+    clf = clf.fit(X_train, y_train,
+                  eval_set           = [(X_train, y_train), (X_valid, y_valid)],
+                  eval_metric        = eval_metric,
+                  sample_weight      = price_train,
+                  eval_sample_weight = [price_train, price_valid],
+                  feature_name       = features,
+                  **_fit_kwargs(stop_rounds, verbose))
+
+    # inference
+    if target_transform:
+        preds_oof_fold  = postprocess_preds(clf.predict(X_valid)**2)
+        reals_oof_fold  = y_valid**2
+        preds_test_fold = postprocess_preds(clf.predict(X_test)**2) / num_folds
+    else:
+        preds_oof_fold  = postprocess_preds(clf.predict(X_valid))
+        reals_oof_fold  = y_valid
+        preds_test_fold = postprocess_preds(clf.predict(X_test)) / num_folds
+
+    # multiply with first stage predictions
+    if two_stage:
+        preds_oof_fold  = preds_oof_fold  * np.round(preds_oof_fold_binary)
+        preds_test_fold = preds_test_fold * np.round(preds_test_fold_binary)
+
+    return {
+        'fold':           fold,
+        'train_rows':     train_rows,
+        'valid_rows':     valid_rows,
+        'preds_oof':      preds_oof_fold,
+        'reals_oof':      reals_oof_fold,
+        'prices_oof':     np.array(price_valid),
+        'preds_test':     preds_test_fold,
+        'oof_rmse':       np.sqrt(np.mean((reals_oof_fold - preds_oof_fold) ** 2)),
+        'oof_profit':     profit(reals_oof_fold, preds_oof_fold, price = price_valid),
+        'oracle_profit':  profit(reals_oof_fold, reals_oof_fold, price = price_valid),
+        'importance':     clf.feature_importances_,
+        'clf':            clf,
+        'clf_classifier': clf_classifier,
+    }
+
+
+def _train_fold(args):
+    return train_fold(*args[:-1], **args[-1])
+
+
+def cross_validate(X, y, X_test, features, lgb_params, lgb_classifier_params=None,
+                   num_folds=NUM_FOLDS, test_days=TEST_DAYS, n_workers=1, threads=None,
+                   shared_dir=None, **fold_options):
+    '''
+    Cross-validate the model over num_folds validation days, running folds concurrently.
+
+    Arguments:
+    - X (DataFrame): training rows with itemID, day_of_year, simulationPrice and the features.
+    - y (Series): target of every training row.
+    - X_test (DataFrame): test rows with the features.
+    - features (list): model features.
+    - lgb_params (dict): parameters of the regressor.
+    - lgb_classifier_params (dict): parameters of the first stage classifier.
+    - num_folds (int): number of folds.
+    - test_days (int): length of the target window.
+    - n_workers (int): number of folds trained at the same time; 1 trains them in this process.
+    - threads (int): LightGBM threads per fold, by default the cores divided by n_workers.
+    - shared_dir (str): directory for the shared arrays, a temporary one by default.
+    - fold_options: target_transform, two_stage, stop_rounds, verbose and eval_metric of train_fold.
+
+    Returns:
+    - dict with importances, preds_oof, reals_oof, prices_oof, preds_test, oof_rmse,
+      oof_profit, oracle_profit, clfs, clf_classifiers, train_idx and valid_idx
+      (arrays of row labels of X), everything in fold order
+    '''
+    if threads is None:
+        threads = max(1, multiprocessing.cpu_count() // n_workers)
+    lgb_params = dict(lgb_params, n_jobs = threads)
+    if lgb_classifier_params is not None:
+        lgb_classifier_params = dict(lgb_classifier_params, n_jobs = threads)
+
+    time_start = time.time()
+    windows = fold_windows(X['day_of_year'].max(), num_folds, test_days)
+
+    with tempfile.TemporaryDirectory(dir = shared_dir) as directory:
+        index = X.index.to_numpy()[share_arrays(directory, X, y, X_test, features)]
+        tasks = [(directory, fold, window, features, lgb_params, lgb_classifier_params,
+                  dict(fold_options, num_folds = num_folds)) for fold, window in enumerate(windows)]
+
+        # spawned workers keep LightGBM's OpenMP runtime out of forked children
+        pool = None
+        if n_workers > 1:
+            pool = ProcessPoolExecutor(max_workers = n_workers, mp_context = multiprocessing.get_context('spawn'))
+        try:
+            results = []
+            for result in (pool.map(_train_fold, tasks) if pool else map(_train_fold, tasks)):
+                t_start, t_end, v_start, v_end = windows[result['fold']]
+                print('-' * 65)
+                print(f'- train period days: {t_start} -- {t_end} (n = {len(index[result["train_rows"]])})')
+                print(f'- valid period days: {v_start} -- {v_end} (n = {len(index[result["valid_rows"]])})')
+                print('FOLD {:d}/{:d}: RMSE = {:.2f}, PROFIT = {:.0f}'.format(result['fold'] + 1,
+                                                                              num_folds,
+                                                                              result['oof_rmse'],
+                                                                              result['oof_profit']))
+                print('-' * 65)
+                results.append(result)
+        finally:
+            if pool:
+                pool.shutdown()
+
+    importances = pd.concat([pd.DataFrame({'Feature':    features,
+                                           'Importance': result['importance'],
+                                           'Fold':       result['fold'] + 1}) for result in results], axis = 0)
+    cv = {
+        'importances':     importances,
+        'preds_oof':       np.vstack([result['preds_oof'] for result in results]),
+        'reals_oof':       np.vstack([result['reals_oof'] for result in results]),
+        'prices_oof':      np.vstack([result['prices_oof'] for result in results]),
+        'preds_test':      np.sum([result['preds_test'] for result in results], axis = 0),
+        'clfs':            [result['clf'] for result in results],
+        'clf_classifiers': [result['clf_classifier'] for result in results],
+        'train_idx':       [index[result['train_rows']] for result in results],
+        'valid_idx':       [index[result['valid_rows']] for result in results],
+    }
+    for metric in ['oof_rmse', 'oof_profit', 'oracle_profit']:
+        cv[metric] = [result[metric] for result in results]
+
+    # print performance
+    print('')
+    print('-' * 65)
+    print('- AVERAGE RMSE:   {:.2f}'.format(np.mean(cv['oof_rmse'])))
+    print('- AVERAGE PROFIT: {:.0f} ({:.2f}%)'.format(np.mean(cv['oof_profit']),
+                                                     100 * np.mean(cv['oof_profit']) / np.mean(cv['oracle_profit'])))
+    print('- RUNNING TIME:   {:.2f} minutes'.format((time.time() - time_start) / 60))
+    print('-' * 65)
+    return cv
@@ -0,0 +1,268 @@
+"""
+Compiled inference of LightGBM boosters in NumPy.
+
+Forecaster.predict calls Booster.predict once per fold regressor and once
+for the classifier, and every call walks that booster's trees on its own.
+CompiledEnsemble flattens the trees of all the boosters into one set of node
+arrays (split feature, threshold, direction of missing values, children,
+leaf value) and walks all of them at once: every step moves each (row, tree)
+pair one level down with a few array gathers, so a batch takes as many NumPy
+passes as the deepest tree has levels, whatever the number of boosters.
+
+Splits follow LightGBM's numerical decision: values within 1e-35 of 0 are 0,
+NaN and 0 go the way the split learned for missing values (NaN counts as 0
+when the split learned none), and other values go left when they are <= the
+threshold. The raw score of a booster is the sum of its leaf values, so the
+outputs match Booster.predict up to float rounding. Categorical splits and
+linear trees are not compiled. Boosters trained with a custom objective, as
+the notebook's regressors are, output their raw score.
+
+Examples:
+
+ensemble = CompiledEnsemble(forecaster.regressors + [forecaster.classifier])
+outputs  = ensemble.predict(X)   # one column per booster
+"""
+
+import numpy as np
+
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+ZERO_THRESHOLD = 1e-35
+
+# bits of a split's decision_type in the model file
+CATEGORICAL_MASK = 1
+DEFAULT_LEFT_MASK = 2
+
+
+def _sigmoid(raw, parameter):
+    return 1 / (1 + np.exp(-parameter * raw))
+
+
+def output_transform(objective):
+    '''
+    Function from raw scores to the predictions of a booster's objective.
+
+    Arguments:
+    - objective (str): objective line of the booster, e.g. 'binary sigmoid:1'.
+
+    Returns:
+    - function of a numpy array
+    '''
+    name, *parameters = objective.split()
+    parameters = dict(parameter.split(':', 1) for parameter in parameters if ':' in parameter)
+    if name in ('binary', 'cross_entropy', 'xentropy'):
+        sigmoid = float(parameters.get('sigmoid', 1))
+        return lambda raw: _sigmoid(raw, sigmoid)
+    if name in ('poisson', 'gamma', 'tweedie'):
+        return np.exp
+    if name in ('regression', 'regression_l1', 'huber', 'fair', 'quantile', 'mape', 'custom', 'none'):
+        return lambda raw: raw
+    raise ValueError('objective {} is not compiled'.format(name))
+
+
+def parse_model(model_string):
+    '''
+    Header and trees of a LightGBM model file.
+
+    Arguments:
+    - model_string (str): Booster.model_to_string().
+
+    Returns:
+    - dict of the header lines, and a list with a dict of the lines of every tree
+    '''
+    blocks = model_string.split('end of trees')[0].split('\nTree=')
+    header, trees = {}, []
+    for i, block in enumerate(blocks):
+        lines = dict(line.split('=', 1) if '=' in line else (line, '') for line in block.splitlines() if line)
+        if i == 0:
+            header = lines
+        else:
+            trees.append(lines)
+    return header, trees
+
+
+class CompiledEnsemble:
+    '''
+    Trees of several single-output boosters as flat node arrays, scored together.
+
+    Every tree is a range of nodes, its splits first and its leaves after them;
+    a leaf is a node whose children are itself, so walking a tree further than
+    its depth keeps a row at its leaf.
+
+    Arguments:
+    - boosters (list): lgb.Booster objects with the same features.
+
+    Raises ValueError for boosters that cannot be compiled.
+    '''
+
+    def __init__(self, boosters):
+        if not boosters:
+            raise ValueError('no boosters to compile')
+        arrays = {name: [] for name in ['feature', 'threshold', 'decision', 'children', 'value', 'scale']}
+        roots, self.transforms, self.offsets = [], [], []
+        self.n_features, n_nodes = None, 0
+        for booster in boosters:
+            header, trees = parse_model(booster.model_to_string())
+            try:
+                if int(header['num_tree_per_iteration']) != 1:
+                    raise ValueError('only single-output boosters are compiled')
+                n_features = int(header['max_feature_idx']) + 1
+                if self.n_features not in (None, n_features):
+                    raise ValueError('the boosters have different features')
+                if not trees:
+                    raise ValueError('a booster has no trees')
+                self.n_features = n_features
+                # boosters trained with a custom objective have no objective line
+                self.transforms.append(output_transform(header.get('objective', 'custom')))
+                self.offsets.append(len(roots))
+                scale = 1 / len(trees) if 'average_output' in header else 1
+                for tree in trees:
+                    roots.append(n_nodes)
+                    n_nodes += self._add_tree(tree, n_nodes, scale, arrays)
+            except KeyError as error:
+                raise ValueError('a booster has no {} line in its model string'.format(error)) from error
+
+        # 32-bit node arrays: fewer cache misses in the gathers
+        self.feature = np.concatenate(arrays['feature']).astype('int32')
+        self.threshold = np.concatenate(arrays['threshold'])
+        # float32 inputs go left exactly when they are <= the threshold rounded down to float32
+        with np.errstate(over = 'ignore'):
+            threshold32 = self.threshold.astype('float32')
+        self.threshold32 = np.where(threshold32 > self.threshold,
+                                    np.nextafter(threshold32, np.float32(-np.inf)), threshold32)
+        # children of node i at 2 * i (left) and 2 * i + 1 (right)
+        self.children = np.concatenate(arrays['children']).astype('int32')
+        self.value = np.concatenate(arrays['value'])
+        self.tree_scale = np.concatenate(arrays['scale'])
+        self.roots = np.array(roots, dtype = 'int32')
+
+        # the way NaN and 0 inputs go at every split
+        decision = np.concatenate(arrays['decision'])
+        missing = (decision >> 2) & 3
+        default_right = decision & DEFAULT_LEFT_MASK == 0
+        zero_right = 0 > self.threshold
+        self.nan_right = np.where(missing == MISSING_NONE, zero_right, default_right)
+        self.zero_right = np.where(missing == MISSING_ZERO, default_right, zero_right)
+        self.zero_missing = bool((missing == MISSING_ZERO).any())
+
+        # trees walked shallowest first, so that level d only visits the trees deeper than d
+        depths = self._depths()
+        self.walk_order = np.argsort(depths, kind = 'stable')
+        self.tree_order = np.argsort(self.walk_order)
+        self.level_start = np.searchsorted(depths[self.walk_order], np.arange(depths.max()), side = 'right')
+
+    @staticmethod
+    def _add_tree(tree, base, scale, arrays):
+        n_leaves = int(tree['num_leaves'])
+        n_splits = n_leaves - 1
+        if int(tree.get('is_linear', 0)):
+            raise ValueError('linear trees are not compiled')
+
+        def numbers(key, dtype):
+            return np.array(tree[key].split(), dtype = dtype) if n_splits else np.zeros(0, dtype = dtype)
+
+        decision = numbers('decision_type', 'int8')
+        if (decision & CATEGORICAL_MASK).any():
+            raise ValueError('categorical splits are not compiled')
+        leaves = base + n_splits + np.arange(n_leaves)
+        # children in the model file: split index, or ~leaf index
+        left, right = numbers('left_child', 'intp'), numbers('right_child', 'intp')
+        left = np.where(left >= 0, base + left, base + n_splits + ~left)
+        right = np.where(right >= 0, base + right, base + n_splits + ~right)
+        arrays['feature'].append(np.concatenate([numbers('split_feature', 'intp'), np.zeros(n_leaves, 'intp')]))
+        arrays['threshold'].append(np.concatenate([numbers('threshold', 'float64'), np.zeros(n_leaves)]))
+        arrays['decision'].append(np.concatenate([decision, np.zeros(n_leaves, 'int8')]))
+        arrays['children'].append(np.stack([np.concatenate([left, leaves]),
+                                            np.concatenate([right, leaves])], axis = 1).ravel())
+        arrays['value'].append(np.concatenate([np.zeros(n_splits),
+                                               np.array(tree['leaf_value'].split(), dtype = 'float64')]))
+        arrays['scale'].append(np.array([scale]))
+        return n_splits + n_leaves
+
+    def _depths(self):
+        # all trees a level at a time, from the roots down
+        tree = np.arange(self.n_trees)
+        level, depths, depth = self.roots, np.zeros(self.n_trees, dtype = 'int64'), 0
+        while len(level):
+            inner = self.children[2 * level] != level
+            level, tree = level[inner], tree[inner]
+            if len(level):
+                depth += 1
+                depths[tree] = depth
+            level, tree = np.concatenate([self.children[2 * level], self.children[2 * level + 1]]), np.tile(tree, 2)
+        return depths
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def depth(self):
+        return len(self.level_start)
+
+    def leaves(self, X):
+        '''
+        Leaf reached in every tree.
+
+        Arguments:
+        - X (numpy array): feature rows.
+
+        Returns:
+        - numpy array of node indices, one row per row of X and one column per tree
+        '''
+        X = np.asarray(X)
+        if X.dtype != np.float32:
+            X = X.astype('float64')
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError('expected rows of {} features, got shape {}'.format(self.n_features, X.shape))
+        threshold = self.threshold32 if X.dtype == np.float32 else self.threshold
+        # LightGBM drops values this close to 0 from its input rows
+        X = np.where(np.abs(X, dtype = 'float64') <= ZERO_THRESHOLD, 0, X).ravel()
+        has_nan = np.isnan(X).any()
+        has_zero = self.zero_missing and (X == 0).any()
+        row_start = (np.arange(len(X) // self.n_features) * self.n_features)[:, None]
+
+        node = np.empty((len(row_start), self.n_trees), dtype = 'int32')
+        node[:] = self.roots[self.walk_order]
+        for start in self.level_start:
+            walked = node[:, start:]
+            value = X[row_start + self.feature[walked]]
+            right = value > threshold[walked]
+            if has_nan:
+                right = np.where(np.isnan(value), self.nan_right[walked], right)
+            if has_zero:
+                right = np.where(value == 0, self.zero_right[walked], right)
+            node[:, start:] = self.children[2 * walked + right]
+        return node[:, self.tree_order]
+
+    def raw_score(self, X, batch_size=256):
+        '''
+        Raw score of every booster, the sum of its leaf values.
+
+        Arguments:
+        - X (numpy array): feature rows.
+        - batch_size (int): rows walked at a time, keeping the node arrays in cache.
+
+        Returns:
+        - numpy array with one row per row of X and one column per booster
+        '''
+        scores = np.empty((len(X), len(self.offsets)))
+        for start in range(0, len(X), batch_size):
+            leaf_values = self.value[self.leaves(X[start:start + batch_size])] * self.tree_scale
+            scores[start:start + batch_size] = np.add.reduceat(leaf_values, self.offsets, axis = 1)
+        return scores
+
+    def predict(self, X, batch_size=256):
+        '''
+        Prediction of every booster, as Booster.predict returns it.
+
+        Arguments:
+        - X (numpy array): feature rows.
+        - batch_size (int): rows walked at a time.
+
+        Returns:
+        - numpy array with one row per row of X and one column per booster
+        '''
+        scores = self.raw_score(X, batch_size)
+        for column, transform in enumerate(self.transforms):
+            scores[:, column] = transform(scores[:, column])
+        return scores
@@ -0,0 +1,231 @@
+"""
+Chunked, resumable tsfresh extraction over the order grid.
+
+The notebook ran tsfresh.extract_features once per feature day on the last
+35 days of every item. Here the work is split into tasks of an item chunk
+times a block of days. Every (item, day) window of a task goes into a single
+extract_features call, tasks run in a process pool, and each result is saved
+to a checkpoint file named after a hash of its inputs. A rerun only computes
+tasks without a checkpoint: unfinished ones after an interruption, or the
+chunks and day blocks touched by new items or days. Chunks are ranges of
+item IDs (itemID // chunk_size), not positions, so a new item only changes
+the chunk of its own ID range.
+
+Checkpoints of earlier inputs are kept unless the call prunes them, which
+removes every checkpoint the call does not read: a directory shared by
+extractions of different days must not be pruned.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from tsfresh import extract_features
+
+# calculators of the notebook's feature extraction
+FC_PARAMETERS = {
+    'variance_larger_than_standard_deviation': None,
+    'has_duplicate_max': None,
+    'has_duplicate_min': None,
+    'has_duplicate': None,
+    'sum_values': None,
+    'abs_energy': None,
+    'mean_abs_change': None,
+    'mean_change': None,
+    'mean_second_derivative_central': None,
+    'median': None,
+    'mean': None,
+    'length': None,
+    'standard_deviation': None,
+    'variation_coefficient': None,
+    'variance': None,
+    'skewness': None,
+    'kurtosis': None,
+    'root_mean_square': None,
+    'absolute_sum_of_changes': None,
+    'longest_strike_below_mean': None,
+    'longest_strike_above_mean': None,
+    'count_above_mean': None,
+    'count_below_mean': None,
+    'last_location_of_maximum': None,
+    'first_location_of_maximum': None,
+    'last_location_of_minimum': None,
+    'first_location_of_minimum': None,
+    'percentage_of_reoccurring_values_to_all_values': None,
+    'percentage_of_reoccurring_datapoints_to_all_datapoints': None,
+    'sum_of_reoccurring_values': None,
+    'sum_of_reoccurring_data_points': None,
+    'ratio_value_number_to_time_series_length': None,
+    'sample_entropy': None,
+    'maximum': None,
+    'absolute_maximum': None,
+    'minimum': None,
+    'benford_correlation': None,
+    'time_reversal_asymmetry_statistic': [{'lag': 1}, {'lag': 2}, {'lag': 3}],
+    'c3': [{'lag': 1}, {'lag': 2}, {'lag': 3}],
+    'cid_ce': [{'normalize': True}, {'normalize': False}],
+    'quantile': [{'q': 0.1}, {'q': 0.2}, {'q': 0.3}, {'q': 0.4}, {'q': 0.6}, {'q': 0.7}, {'q': 0.8}, {'q': 0.9}],
+    'autocorrelation': [{'lag': 0}, {'lag': 1}, {'lag': 2}, {'lag': 3}, {'lag': 4}, {'lag': 5}, {'lag': 6}, {'lag': 7}, {'lag': 8}, {'lag': 9}],
+    'agg_autocorrelation': [{'f_agg': 'mean', 'maxlag': 40}, {'f_agg': 'median', 'maxlag': 40}, {'f_agg': 'var', 'maxlag': 40}],
+    'number_peaks': [{'n': 1}, {'n': 3}, {'n': 5}, {'n': 10}, {'n': 50}],
+    'fft_aggregated': [{'aggtype': 'centroid'}, {'aggtype': 'variance'}, {'aggtype': 'skew'}, {'aggtype': 'kurtosis'}]
+}
+
+# item-day windows get the id item_position * DAY_BASE + day_of_year
+DAY_BASE = 1000
+
+
+def window_frame(orders, days, window, first_day):
+    """
+    Long-format input for extract_features holding every (item, day) window.
+
+    Arguments:
+    - orders (numpy array): item x day matrix of orders of the chunk.
+    - days (list): days of year to build windows for.
+    - window (int): number of days up to and including each day.
+    - first_day (int): day of year of the first column of orders.
+
+    Returns:
+    - DataFrame with id, day_of_year and order
+    """
+    n_items = orders.shape[0]
+    frames = []
+    for day in days:
+        start = max(day - window + 1, first_day)
+        cols = np.arange(start, day + 1) - first_day
+        frames.append(pd.DataFrame({
+            'id':          np.repeat(np.arange(n_items) * DAY_BASE + day, len(cols)),
+            'day_of_year': np.tile(cols + first_day, n_items),
+            'order':       orders[:, cols].ravel(),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _extract(item_ids, orders, days, window, first_day, fc_parameters):
+    extracted = extract_features(window_frame(orders, days, window, first_day),
+                                 column_id='id', column_sort='day_of_year',
+                                 default_fc_parameters=fc_parameters,
+                                 n_jobs=0, disable_progressbar=True)
+    ids = extracted.index.to_numpy()
+    extracted.insert(0, 'day_of_year', ids % DAY_BASE)
+    extracted.insert(0, 'itemID', np.asarray(item_ids)[ids // DAY_BASE])
+    return extracted.reset_index(drop=True)
+
+
+def _run_task(task):
+    path, item_ids, orders, days, window, first_day, fc_parameters = task
+    time_start = time.time()
+    extracted = _extract(item_ids, orders, days, window, first_day, fc_parameters)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    extracted.to_pickle(tmp_path)
+    os.replace(tmp_path, path)
+    return path, time.time() - time_start
+
+
+def _task_key(item_ids, orders, days, window, fc_parameters):
+    digest = hashlib.sha1()
+    digest.update(json.dumps([[str(i) for i in item_ids], [int(d) for d in days], window,
+                              fc_parameters], sort_keys=True).encode())
+    digest.update(np.ascontiguousarray(orders).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def extract_window_features(grid, days, window, fc_parameters, checkpoint_dir,
+                            chunk_size=500, day_block=30, n_jobs=None, prune=False):
+    """
+    tsfresh features of the last `window` days of every item on every requested day.
+
+    Arguments:
+    - grid (DenseGrid): the order grid.
+    - days (list): days of year to extract features for.
+    - window (int): length of the lookback window.
+    - fc_parameters (dict): tsfresh calculator settings.
+    - checkpoint_dir (str): directory holding one result file per task.
+    - chunk_size (int): width of the item ID range of a task.
+    - day_block (int): tasks cover days (day - 1) // day_block alike.
+    - n_jobs (int): number of worker processes, all cores by default.
+    - prune (bool): remove the checkpoints in checkpoint_dir this call does not read.
+
+    Returns:
+    - DataFrame with itemID, day_of_year and the extracted features
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    days = np.asarray(days)
+    first_day = int(grid.days[0])
+
+    # rows of every item ID range
+    ranges = np.asarray(grid.item_ids) // chunk_size
+    chunks = [np.flatnonzero(ranges == chunk_range) for chunk_range in np.unique(ranges)]
+
+    paths, todo = [], []
+    for block in np.unique((days - 1) // day_block):
+        block_days = [int(d) for d in days[(days - 1) // day_block == block]]
+        # only the columns the block's windows read
+        cols = slice(max(min(block_days) - window + 1, first_day) - first_day, max(block_days) - first_day + 1)
+        for chunk in chunks:
+            item_ids = grid.item_ids[chunk]
+            orders = grid.orders[chunk, cols]
+            block_first = first_day + cols.start
+            key = _task_key(item_ids, orders, block_days, window, fc_parameters)
+            path = os.path.join(checkpoint_dir, 'chunk_{}.pkl'.format(key))
+            paths.append(path)
+            if not os.path.exists(path):
+                todo.append((path, item_ids, orders, block_days, window, block_first, fc_parameters))
+
+    print('tsfresh: {} of {} tasks to compute'.format(len(todo), len(paths)))
+    if todo:
+        time_start = time.time()
+        # a single worker runs the tasks in this process
+        pool = ProcessPoolExecutor(max_workers=n_jobs) if n_jobs != 1 else None
+        try:
+            results = pool.map(_run_task, todo) if pool else map(_run_task, todo)
+            for done, (path, elapsed) in enumerate(results, 1):
+                print('tsfresh: task {}/{} done in {:.1f}s ({:.0f}s total)'.format(
+                    done, len(todo), elapsed, time.time() - time_start))
+        finally:
+            if pool:
+                pool.shutdown()
+
+    if prune:
+        keep = set(paths)
+        for entry in os.scandir(checkpoint_dir):
+            if entry.name.startswith('chunk_') and entry.name.endswith('.pkl') and entry.path not in keep:
+                os.remove(entry.path)
+
+    return pd.concat([pd.read_pickle(path) for path in paths], ignore_index=True)
+
+
+def profile_calculators(grid, day, window, fc_parameters, sample=200, seed=23):
+    """
+    Time every tsfresh calculator on a sample of items, to find the ones worth pruning.
+
+    Arguments:
+    - grid (DenseGrid): the order grid.
+    - day (int): day of year whose windows are used.
+    - window (int): length of the lookback window.
+    - fc_parameters (dict): tsfresh calculator settings.
+    - sample (int): number of items timed.
+    - seed (int): seed of the item sample.
+
+    Returns:
+    - DataFrame with calculator, number of features, seconds and share of the total,
+      slowest first
+    """
+    rows = np.random.RandomState(seed).choice(grid.shape[0], min(sample, grid.shape[0]), replace=False)
+    frame = window_frame(grid.orders[rows], [day], window, int(grid.days[0]))
+
+    timings = []
+    for name, params in fc_parameters.items():
+        time_start = time.perf_counter()
+        extracted = extract_features(frame, column_id='id', column_sort='day_of_year',
+                                     default_fc_parameters={name: params},
+                                     n_jobs=0, disable_progressbar=True)
+        timings.append((name, extracted.shape[1], time.perf_counter() - time_start))
+
+    timings = pd.DataFrame(timings, columns=['calculator', 'features', 'seconds'])
+    timings['share'] = timings['seconds'] / timings['seconds'].sum()
+    return timings.sort_values('seconds', ascending=False).reset_index(drop=True)